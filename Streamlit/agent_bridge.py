@@ -1,11 +1,10 @@
 import sys
 import os
-from pathlib import Path
 import streamlit as st
 from dotenv import load_dotenv
 import pandas as pd
 import time
-import shutil
+import yaml
 
 # Add the absolute path to the rag_agent's source directory
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) 
@@ -16,60 +15,14 @@ sys.path.append(rag_agent_path)
 # Load environment variables from the rag_agent .env file
 load_dotenv(dotenv_path=rag_agent_env_path)
 
-# Import after path is set
-from rag_agent.crew import UB04ClaimBuilderCrew
-from output_handler import capture_output
-
-# Define which task types should be shown in the UI logs
-IMPORTANT_TASK_TYPES = [
-    "extract",
-    "analyze",
-    "generate",
-    "verify",
-    "review",
-    "complete"
-]
-
-# Define key milestone messages to highlight
-MILESTONE_MARKERS = [
-    "extracting patient data",
-    "analyzing claim",
-    "generating form",
-    "validating data",
-    "reviewing claim",
-    "completed"
-]
-
-class MinimalLogFilter:
-    """Filter class that only allows important logs to pass through."""
-    
-    def __init__(self, output_container):
-        self.output_container = output_container
-        self.milestones_shown = set()
-    
-    def write_milestone(self, message, emoji="✨"):
-        """Write an important milestone message to the output with emoji."""
-        if message not in self.milestones_shown:
-            self.output_container.write(f"{emoji} {message}")
-            self.milestones_shown.add(message)
-    
-    def track_progress(self, message):
-        """Track progress based on keywords in message."""
-        msg_lower = message.lower()
-        
-        # Check for milestone keywords and add appropriate emoji
-        if "extracting" in msg_lower or "extract" in msg_lower:
-            self.write_milestone("Extracting patient data...", "🔎")
-        elif "analyzing" in msg_lower or "analyze" in msg_lower:
-            self.write_milestone("Analyzing claim information...", "📊")
-        elif "generate" in msg_lower or "creating" in msg_lower or "filling" in msg_lower:
-            self.write_milestone("Generating UB-04 form...", "📝")
-        elif "validat" in msg_lower or "verify" in msg_lower:
-            self.write_milestone("Validating claim data...", "✓")
-        elif "review" in msg_lower:
-            self.write_milestone("Reviewing final claim...", "📋")
-        elif "complet" in msg_lower or "finish" in msg_lower or "done" in msg_lower:
-            self.write_milestone("Processing complete", "✅")
+# Import after path is set. The crew itself is imported lazily: when a claim
+# worker is running (see rag_agent.worker) the app only talks to it over HTTP.
+from rag_agent.memory_profile import memory_profiler
+from rag_agent.worker import WorkerClient
+
+# Set CLAIM_WORKER_URL to use a different worker; set USE_CLAIM_WORKER=0 to always run in-process
+USE_CLAIM_WORKER = os.getenv("USE_CLAIM_WORKER", "1") != "0"
+worker_client = WorkerClient()
 
 def get_available_patients():
     """
@@ -89,160 +42,168 @@ def get_available_patients():
         st.error(f"Error loading patient data: {e}")
         return []
 
-def run_claim_builder_crew(patient_name: str, output_container=None):
+# ---------------- Background claim jobs ---------------- #
+# The page never runs a crew itself: it submits jobs, keeps their references
+# and polls. A rerun, refresh or reconnect only re-reads job state.
+
+JOB_BACKENDS = ("worker", "local")
+
+# Crew task names in run order, for progress reporting
+with open(os.path.join(rag_agent_path, "rag_agent", "config", "tasks.yaml"), "r", encoding="utf-8") as tasks_file:
+    CLAIM_TASKS = list(yaml.safe_load(tasks_file))
+
+@st.cache_resource
+def _local_claim_worker():
+    """
+    Claim worker running inside this Streamlit server, used when no separate
+    worker is up. Cached as a resource, so every rerun and session shares it
+    and its jobs; it warms up on its own thread so no page load waits for it.
+    """
+    from rag_agent.worker import ClaimWorker
+
+    worker = ClaimWorker(jobs_dir=os.path.join(project_root, "rag_agent", "src", "output", "jobs"))
+    worker.start(wait_for_warm_up=False)
+    return worker
+
+def submit_claim_job(patient_name: str, save_profile=None):
     """
-    Run the UB-04 Claim Builder Crew with the given parameters.
+    Queue a claim build and return immediately.
 
     Args:
         patient_name: The patient's name to search for.
-        output_container: Optional Streamlit container to capture output.
+        save_profile: Optional PDF save profile ("fast", "compact" or "archive").
 
     Returns:
-        The result of the crew's execution.
+        dict: Job reference ({"job_id", "backend", "patient"}) to keep in session state.
     """
-    # Prepare inputs
-    inputs = {'patient_name': patient_name}
-    
-    # Initialize a new crew instance each time to avoid state conflicts
-    crew = UB04ClaimBuilderCrew()
-
-    # When running with streamlit output container, use reduced logging
-    if output_container:
-        # Create a logger filter
-        log_filter = MinimalLogFilter(output_container)
-        
-        # Display starting milestone
-        log_filter.write_milestone(f"🔍 Processing UB-04 claim for patient: {patient_name}", "🔍")
-        
-        # Run with output capturing and reduced verbosity
-        with capture_output(output_container):
-            # We're not using callbacks as they're not supported
-            # Instead, we rely on the StreamlitProcessOutput filtering
-            result = crew.crew().kickoff(inputs=inputs)
-            
-        # Add completion message
-        log_filter.write_milestone(f"✅ Claim processing complete for {patient_name}", "✅")
+    if USE_CLAIM_WORKER and worker_client.is_available():
+        job, backend = worker_client.submit(patient_name, save_profile=save_profile), "worker"
     else:
-        # Run with standard output (for console/debugging)
-        result = crew.crew().kickoff(inputs=inputs)
-
-    # Return the result
-    return result
+        job, backend = _local_claim_worker().submit(patient_name, save_profile=save_profile), "local"
+    return {"job_id": job.job_id, "backend": backend, "patient": patient_name}
 
-def process_multiple_patients(patients, progress_callback=None, status_callback=None):
+def get_claim_jobs(job_refs):
     """
-    Process multiple patients sequentially and handle the PDF copying.
-    
+    Current state of the referenced jobs, one request per backend.
+
     Args:
-        patients: List of patient names to process
-        progress_callback: Function to call with progress updates (0-1)
-        status_callback: Function to call with status message updates
-        
+        job_refs: Job references returned by submit_claim_job.
+
     Returns:
-        List of dictionaries with processing results for each patient
+        list: One ClaimJob per reference, in the same order. A job its backend
+        no longer knows (e.g. the worker restarted) comes back failed; one on an
+        unreachable worker comes back queued, so it is polled again.
     """
-    results = []
-    total_patients = len(patients)
-    
-    # Ensure the output directory exists for copied PDFs
-    output_dir = os.path.join(project_root, "rag_agent", "src", "output")
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Setup overall batch processing container if status_callback is available
-    if status_callback:
-        status_callback(f"🚀 Starting batch processing for {total_patients} patients")
-    
-    for i, patient in enumerate(patients):
-        # Update progress
-        current_progress = i / total_patients
-        if progress_callback:
-            progress_callback(current_progress)
-        
-        # Update status with patient number and percentage
-        percent_complete = int(current_progress * 100)
-        if status_callback:
-            status_callback(f"⏳ Processing patient {i+1}/{total_patients} ({percent_complete}%): {patient}")
-        
+    from rag_agent.worker import ClaimJob
+
+    found, unreachable = {}, {}
+    for backend in JOB_BACKENDS:
+        job_ids = [ref["job_id"] for ref in job_refs if ref["backend"] == backend]
+        if not job_ids:
+            continue
         try:
-            # Run the crew for this patient
-            result = run_claim_builder_crew(patient_name=patient)
-            
-            # Check for the generated PDF
-            report_path = get_pdf_report_path()
-            
-            if report_path and report_path.exists():
-                # Make a copy with unique name
-                safe_name = patient.replace(" ", "_").lower()
-                copy_path = os.path.join(output_dir, f"ub04_claim_{safe_name}.pdf")
-                
-                # Copy the file
-                shutil.copy2(report_path, copy_path)
-                
-                # Read the PDF content for the user to download
-                with open(copy_path, "rb") as file:
-                    pdf_content = file.read()
-                
-                # Add to results with success message
-                results.append({
-                    "patient": patient,
-                    "path": copy_path,
-                    "content": pdf_content,
-                    "success": True
-                })
-                
-                # Update status with success message
-                if status_callback:
-                    status_callback(f"✅ Successfully processed claim for {patient}")
+            jobs = worker_client.jobs(job_ids) if backend == "worker" else _local_claim_worker().get_many(job_ids)
+            found.update((job.job_id, job) for job in jobs)
+        except (OSError, RuntimeError) as e:
+            unreachable.update((job_id, str(e)) for job_id in job_ids)
+
+    jobs = []
+    for ref in job_refs:
+        job = found.get(ref["job_id"])
+        if job is None:
+            placeholder = {"job_id": ref["job_id"], "patient_name": ref.get("patient", ""), "submitted_at": ""}
+            if ref["job_id"] in unreachable:
+                placeholder.update(status="queued", stage=f"Claim worker unreachable: {unreachable[ref['job_id']]}")
             else:
-                # Record failure
-                results.append({
-                    "patient": patient,
-                    "success": False,
-                    "error": "PDF not generated"
-                })
-                
-                # Update status with failure message
-                if status_callback:
-                    status_callback(f"❌ Failed to generate PDF for {patient}")
-                    
-        except Exception as e:
-            # Record error
-            results.append({
-                "patient": patient,
-                "success": False,
-                "error": str(e)
-            })
-            
-            # Update status with error message
-            if status_callback:
-                status_callback(f"❌ Error processing {patient}: {str(e)}")
-            
-        # Brief pause between patients
-        if i < total_patients - 1:
-            time.sleep(1)
-    
-    # Update progress to complete
-    if progress_callback:
-        progress_callback(1.0)
-    
-    # Final status update
-    if status_callback:
-        status_callback(f"✅ Batch processing complete! Processed {total_patients} patients.")
-    
-    # Return the results
-    return results
+                placeholder.update(status="failed", error="Job is no longer known to the claim worker")
+            job = ClaimJob(**placeholder)
+        jobs.append(job)
+    return jobs
 
-def get_pdf_report_path():
+def get_claim_job_pdf(job_ref, job):
     """
-    Check for the generated PDF report and return its path.
+    PDF bytes of a succeeded job.
+
+    Args:
+        job_ref: The job's reference from submit_claim_job.
+        job: Its ClaimJob as returned by get_claim_jobs.
 
     Returns:
-        Path: The path to the PDF report, or None if not found.
+        bytes: The filled UB-04, or None when the job has no PDF.
     """
-    # Path to the PDF report in the rag_agent's output directory
-    pdf_path = Path(os.path.join(project_root, "rag_agent", "src", "output", "ub04_claim_filled.pdf"))
-    
-    if pdf_path.exists():
-        return pdf_path
-    else:
+    if job.status != "succeeded":
         return None
+    if job_ref["backend"] == "worker":
+        return worker_client.pdf(job.job_id)
+    if job.pdf_path and os.path.exists(job.pdf_path):
+        with open(job.pdf_path, "rb") as pdf_file:
+            return pdf_file.read()
+    return None
+
+def record_session_memory(session_state):
+    """Report the PDF bytes held in Streamlit session state to the memory profiler (RAG_MEMORY_PROFILE=1)."""
+    if not memory_profiler.enabled:
+        return
+    claim_pdfs = session_state.get("claim_pdfs") or {}
+    memory_profiler.gauge("session_claim_pdf_bytes", sum(len(content or b"") for content in claim_pdfs.values()))
+    combined = session_state.get("combined_pdf")
+    memory_profiler.gauge("session_combined_pdf_bytes", len(combined["content"] or b"") if combined else 0)
+
+def claim_job_progress(job):
+    """Completed fraction of a job (0-1), counting validation as a step before the crew tasks."""
+    if job.done:
+        return 1.0
+    if job.status == "queued":
+        return 0.0
+    return (1 + len(job.completed_tasks)) / (1 + len(CLAIM_TASKS))
+
+def encode_job_refs(job_refs):
+    """Job references as a compact query-parameter value ("backend:job_id:group,...")."""
+    return ",".join(f"{ref['backend']}:{ref['job_id']}:{ref.get('group', '')}" for ref in job_refs)
+
+def decode_job_refs(value):
+    """Inverse of encode_job_refs; malformed entries are skipped."""
+    job_refs = []
+    for item in (value or "").split(","):
+        parts = item.split(":")
+        if len(parts) == 3 and parts[0] in JOB_BACKENDS and parts[1]:
+            job_refs.append({"backend": parts[0], "job_id": parts[1], "group": parts[2]})
+    return job_refs
+
+@st.cache_resource
+def _batch_template():
+    """Template bytes and compiled field map for combined batch PDFs, loaded once per server."""
+    from rag_agent.batch_pdf import load_template_and_map
+
+    return load_template_and_map(os.path.join(project_root, "rag_agent", "template", "ub-40-.pdf"))
+
+def build_combined_pdf(jobs, output_path=None):
+    """
+    Render the claims of succeeded jobs into one bookmarked PDF for printing.
+
+    The template is stored once and every claim gets an outline entry; an
+    index file next to the PDF maps each claim ID to its page range (see
+    rag_agent.batch_pdf).
+
+    Args:
+        jobs: ClaimJob objects; jobs without a structured claim are skipped.
+        output_path: Where to write the PDF; defaults to a timestamped file in src/output/batches.
+
+    Returns:
+        tuple: (pdf_bytes, index) or (None, None) when no job has a claim.
+    """
+    from rag_agent.batch_pdf import BatchPDFWriter
+
+    jobs = [job for job in jobs if job.status == "succeeded" and job.claim]
+    if not jobs:
+        return None, None
+    output_path = output_path or os.path.join(
+        project_root, "rag_agent", "src", "output", "batches", f"ub04_batch_{time.strftime('%Y%m%d_%H%M%S')}.pdf"
+    )
+    template_bytes, field_map = _batch_template()
+    with memory_profiler.stage("batch_loop"), BatchPDFWriter(output_path, template_bytes, field_map) as writer:
+        for job in jobs:
+            writer.add_claim(job.claim)
+    memory_profiler.write_report(f"streamlit:{os.path.basename(output_path)}")
+    with open(output_path, "rb") as pdf_file:
+        return pdf_file.read(), writer.index()
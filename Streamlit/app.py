@@ -1,14 +1,16 @@
-__import__('pysqlite3')
 import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+# Left in sys.modules too: sessions re-run this script concurrently, and
+# popping it raced when two runs imported it at once
+sys.modules['sqlite3'] = __import__('pysqlite3')
 
 import streamlit as st
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 import pandas as pd
-import time
-import shutil
+import io
+import json
+import zipfile
 
 
 # Add the absolute path to the rag_agent's source directory
@@ -23,7 +25,11 @@ load_dotenv(dotenv_path=rag_agent_env_path)
 
 
 # Import from the agent bridge
-from agent_bridge import run_claim_builder_crew, get_pdf_report_path, get_available_patients
+from agent_bridge import (
+    get_available_patients, submit_claim_job, get_claim_jobs, get_claim_job_pdf,
+    claim_job_progress, encode_job_refs, decode_job_refs, build_combined_pdf, CLAIM_TASKS, record_session_memory,
+)
+from rag_agent.usage import latency_percentiles
 
 # Configure the page
 st.set_page_config(
@@ -32,20 +38,212 @@ st.set_page_config(
     layout="wide"
 )
 
+# Seconds between job status polls while claims are queued or running
+JOB_POLL_SECONDS = 2
+
+STATUS_ICONS = {"queued": "⏳", "running": "🔄", "succeeded": "✅", "failed": "❌"}
+
 # Initialize session state variables
 if "api_keys_set" not in st.session_state:
     st.session_state.api_keys_set = True
 
-if "processed_pdfs" not in st.session_state:
-    st.session_state.processed_pdfs = []
+# Claim jobs run in the background; the session only keeps references to them.
+# They are mirrored to the URL, so a refresh or reconnect picks them up again.
+if "claim_jobs" not in st.session_state:
+    st.session_state.claim_jobs = decode_job_refs(st.query_params.get("jobs"))
 
-if "processing_complete" not in st.session_state:
-    st.session_state.processing_complete = False
+# Finished jobs and their PDFs never change, so they are fetched only once
+if "finished_jobs" not in st.session_state:
+    st.session_state.finished_jobs = {}
+
+if "claim_pdfs" not in st.session_state:
+    st.session_state.claim_pdfs = {}
     
 # Store the available patients in session state to avoid reloading
 if "available_patients" not in st.session_state:
     st.session_state.available_patients = get_available_patients()
 
+
+def remember_jobs(job_refs):
+    """Store the session's job references and mirror them to the URL."""
+    st.session_state.claim_jobs = job_refs
+    if job_refs:
+        st.query_params["jobs"] = encode_job_refs(job_refs)
+    else:
+        st.query_params.pop("jobs", None)
+
+
+def refresh_jobs(job_refs):
+    """Current ClaimJob of every reference, polling only the unfinished ones."""
+    finished = st.session_state.finished_jobs
+    polled = iter(get_claim_jobs([ref for ref in job_refs if ref["job_id"] not in finished]))
+    jobs = []
+    for ref in job_refs:
+        job = finished.get(ref["job_id"]) or next(polled)
+        if job.done and ref["job_id"] not in finished:
+            finished[ref["job_id"]] = job
+            try:
+                st.session_state.claim_pdfs[job.job_id] = get_claim_job_pdf(ref, job)
+            except Exception as e:
+                st.error(f"Could not fetch PDF for {job.patient_name}: {str(e)}")
+            record_session_memory(st.session_state)
+        jobs.append(job)
+    return jobs
+
+
+def pdf_file_name(patient):
+    return f"ub04_claim_{patient.replace(' ', '_').lower()}.pdf"
+
+
+def show_partial_result(job):
+    """Show the latest task output of a job, as JSON when it is JSON."""
+    if not job.partial_output:
+        return
+    with st.expander(f"Partial result: {job.completed_tasks[-1]}", expanded=False):
+        try:
+            st.json(json.loads(job.partial_output))
+        except ValueError:
+            st.text(job.partial_output)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def single_patient_jobs():
+    """Status, partial results and downloads of the single-patient claims, newest first."""
+    job_refs = [ref for ref in st.session_state.claim_jobs if ref.get("group") == "single"]
+    if not job_refs:
+        return
+    for job in reversed(refresh_jobs(job_refs)):
+        st.write(f"{STATUS_ICONS.get(job.status, '')} **{job.patient_name}**: {job.stage or job.status}")
+        if not job.done:
+            st.progress(claim_job_progress(job),
+                        text=f"{len(job.completed_tasks)}/{len(CLAIM_TASKS)} tasks complete")
+        show_partial_result(job)
+        pdf_content = st.session_state.claim_pdfs.get(job.job_id)
+        if job.status == "succeeded" and pdf_content:
+            st.success(f"✅ Successfully generated claim form for {job.patient_name} in {job.run_seconds:.1f}s")
+            st.download_button(
+                label="📥 Download PDF Report",
+                data=pdf_content,
+                file_name=pdf_file_name(job.patient_name),
+                mime="application/pdf",
+                key=f"download_single_{job.job_id}"
+            )
+        elif job.status == "failed":
+            st.error(f"An error occurred: {job.error}")
+        st.write("---")
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def batch_jobs():
+    """Progress and results of the batch claims; each PDF is offered as soon as it is ready."""
+    job_refs = [ref for ref in st.session_state.claim_jobs if ref.get("group") == "batch"]
+    if not job_refs:
+        return
+    jobs = refresh_jobs(job_refs)
+    finished = [job for job in jobs if job.done]
+    succeeded = [job for job in finished if job.status == "succeeded"]
+
+    st.progress(sum(claim_job_progress(job) for job in jobs) / len(jobs),
+                text=f"Completed {len(finished)}/{len(jobs)} patients")
+
+    st.subheader("Processing Results")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Successfully Processed", len(succeeded))
+    with col2:
+        st.metric("Failed", len(finished) - len(succeeded))
+    with col3:
+        st.metric("In Progress", len(jobs) - len(finished))
+
+    latency = latency_percentiles([job.run_seconds for job in finished])
+    if latency:
+        st.caption("⏱️ Claim latency: " + ", ".join(f"{name} {value:.1f}s" for name, value in latency.items()))
+
+    with st.expander("Job Status", expanded=len(finished) < len(jobs)):
+        for job in jobs:
+            detail = job.error if job.status == "failed" else (job.stage or job.status)
+            st.write(f"{STATUS_ICONS.get(job.status, '')} **{job.patient_name}**: {detail}")
+            if not job.done:
+                show_partial_result(job)
+
+    # Show download section only if there are successful PDFs
+    successful_pdfs = [job for job in succeeded if st.session_state.claim_pdfs.get(job.job_id)]
+    if successful_pdfs:
+        st.subheader("Download Reports")
+        
+        # Determine how many columns to display per row
+        columns_per_row = 3
+        
+        # Loop through the results in groups to create rows of columns
+        for i in range(0, len(successful_pdfs), columns_per_row):
+            # Create a row of columns
+            cols = st.columns(columns_per_row)
+            
+            # Process patients for this row
+            for j, job in enumerate(successful_pdfs[i:i + columns_per_row]):
+                with cols[j]:
+                    st.write(f"**{job.patient_name}**")
+                    
+                    # Download button for this patient's PDF, keyed by job so reruns keep it stable
+                    st.download_button(
+                        label=f"📥 Download PDF",
+                        data=st.session_state.claim_pdfs[job.job_id],
+                        file_name=pdf_file_name(job.patient_name),
+                        mime="application/pdf",
+                        key=f"download_{job.job_id}"
+                    )
+        
+        # Add a download all button once the whole batch is done
+        if len(successful_pdfs) > 1 and len(finished) == len(jobs):
+            st.write("---")
+            st.write("**Download All PDFs as a ZIP**")
+            
+            # PDFs are already compressed, so they are stored as-is rather than deflated again
+            zip_buffer = io.BytesIO()
+            with zipfile.ZipFile(zip_buffer, 'a', zipfile.ZIP_STORED, False) as zip_file:
+                for job in successful_pdfs:
+                    zip_file.writestr(pdf_file_name(job.patient_name), st.session_state.claim_pdfs[job.job_id])
+            
+            # Offer the ZIP file for download
+            st.download_button(
+                label="📥 Download All PDFs (ZIP)",
+                data=zip_buffer.getvalue(),
+                file_name="all_ub04_claims.zip",
+                mime="application/zip",
+                key="download_all_zip"
+            )
+
+        # One print-ready PDF for the whole batch, bookmarked per claim
+        if len(finished) == len(jobs) and any(job.claim for job in succeeded):
+            st.write("---")
+            st.write("**Combined PDF for Printing**")
+            batch_key = tuple(job.job_id for job in succeeded)
+            combined = st.session_state.get("combined_pdf")
+            if combined is None or combined["key"] != batch_key:
+                if st.button("🖨️ Build Combined PDF", key="build_combined_pdf"):
+                    try:
+                        content, index = build_combined_pdf(succeeded)
+                        st.session_state.combined_pdf = combined = {"key": batch_key, "content": content, "index": index}
+                        record_session_memory(st.session_state)
+                    except Exception as e:
+                        st.error(f"Could not build the combined PDF: {str(e)}")
+            if combined is not None and combined["key"] == batch_key:
+                st.download_button(
+                    label=f"📥 Download Combined PDF ({combined['index']['pages']} pages)",
+                    data=combined["content"],
+                    file_name="ub04_claims_batch.pdf",
+                    mime="application/pdf",
+                    key="download_combined_pdf"
+                )
+                st.download_button(
+                    label="📥 Download Page Index (JSON)",
+                    data=json.dumps(combined["index"], indent=2),
+                    file_name="ub04_claims_batch.index.json",
+                    mime="application/json",
+                    key="download_combined_index"
+                )
+
+
 # Main header
 st.markdown("<h1 style='text-align: center; margin-bottom: 20px;'>📄 UB-04 Claim Builder</h1>", unsafe_allow_html=True)
 
@@ -105,62 +303,15 @@ with tab1:
     # Run analysis button
     run_button = st.button("🚀 Build Claim Form", type="primary", disabled=not patient_name, key="single_patient_button")
 
-    # Check if we should run the analysis
+    # Queue the claim; it runs in the background and is shown below while it progresses
     if run_button and patient_name:
-        # Create a progress bar and status message
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        status_text.text("Initializing claim processing...")
-        
-        # Create a hidden container for the detailed logs
-        log_container = st.container()
-        with st.expander("Processing Details", expanded=False):
-            output_container = st.container()
-            
-        with st.spinner("Building UB-04 Claim..."):
-            try:
-                # Update progress
-                progress_bar.progress(0.2)
-                status_text.text("Extracting patient data...")
-                
-                # Run the crew with detailed output hidden in collapsed expander
-                result = run_claim_builder_crew(patient_name=patient_name, output_container=output_container)
-                
-                # Update progress
-                progress_bar.progress(0.8)
-                status_text.text("Generating PDF form...")
-                
-                # Check for the generated PDF report
-                report_path = get_pdf_report_path()
-
-                if report_path and report_path.exists():
-                    # Update progress to complete
-                    progress_bar.progress(1.0)
-                    status_text.text("Claim form successfully generated!")
-                    
-                    # Read the PDF content for downloading
-                    with open(report_path, "rb") as file:
-                        pdf_content = file.read()
+        try:
+            job_ref = submit_claim_job(patient_name)
+            remember_jobs(st.session_state.claim_jobs + [{**job_ref, "group": "single"}])
+        except Exception as e:
+            st.error(f"Could not queue the claim: {str(e)}")
 
-                    # Show success message and download button
-                    st.success(f"✅ Successfully generated claim form for {patient_name}")
-                    
-                    # Download button
-                    st.download_button(
-                        label="📥 Download PDF Report",
-                        data=pdf_content,
-                        file_name=f"ub04_claim_{patient_name.replace(' ', '_').lower()}.pdf",
-                        mime="application/pdf"
-                    )
-                else:
-                    progress_bar.progress(1.0)
-                    status_text.text("Failed to generate claim form.")
-                    st.error("Could not find the generated PDF report. The crew may have failed to create it.")
-
-            except Exception as e:
-                progress_bar.progress(1.0)
-                status_text.text("Error occurred during processing.")
-                st.error(f"An error occurred: {str(e)}")
+    single_patient_jobs()
 
 # Tab 2: Multiple Patients Processing
 with tab2:
@@ -173,198 +324,40 @@ with tab2:
         help="Select multiple patients to process one by one"
     )
     
+    # PDF save profile for every claim in this batch
+    save_profile = st.selectbox(
+        "PDF Save Profile",
+        options=["compact", "fast", "archive"],
+        help="fast: quickest save, slightly larger files. compact: smaller rewritten files. "
+             "archive: smallest, with form fields flattened so they can no longer be edited."
+    )
+    
+    batch_refs = [ref for ref in st.session_state.claim_jobs if ref.get("group") == "batch"]
     col1, col2 = st.columns([1, 1])
     
     # Run batch button
     with col1:
         batch_button = st.button("🚀 Process Selected Patients", type="primary", disabled=not selected_patients, key="batch_button")
     
-    # Clear results button
+    # Clear results button (running claims finish in the background; they are only no longer shown)
     with col2:
-        clear_button = st.button("🗑️ Clear Results", type="secondary", disabled=len(st.session_state.processed_pdfs) == 0, key="clear_button")
+        clear_button = st.button("🗑️ Clear Results", type="secondary", disabled=len(batch_refs) == 0, key="clear_button")
         
     if clear_button:
-        # Clear the processed PDFs and reset the processing complete flag
-        st.session_state.processed_pdfs = []
-        st.session_state.processing_complete = False
+        remember_jobs([ref for ref in st.session_state.claim_jobs if ref.get("group") != "batch"])
         st.rerun()
     
     if batch_button and selected_patients:
-        # Create a progress bar and status container
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        status_text.text("Preparing to process patients...")
-        
-        # Create a hidden container for logs - only show this in the expandable section
-        with st.expander("Detailed Processing Logs", expanded=False):
-            log_expander = st.container()
-        
-        # Clear any previous results
-        st.session_state.processed_pdfs = []
-        st.session_state.processing_complete = False
-        
-        # Process each patient
-        for i, patient in enumerate(selected_patients):
-            # Update progress
-            progress = (i) / len(selected_patients)
-            progress_bar.progress(progress)
-            status_text.text(f"Processing {i+1}/{len(selected_patients)}: {patient}")
-            
-            # Create a container for this patient's processing output - within the collapsed expander
-            with log_expander:
-                st.write(f"**Processing patient: {patient}**")
-                patient_output = st.container()
-            
-            try:
-                # Run the crew with output captured in the patient's container (hidden in the expander)
-                result = run_claim_builder_crew(patient_name=patient, output_container=patient_output)
-                
-                # Check for the generated PDF report
-                report_path = get_pdf_report_path()
-                
-                if report_path and report_path.exists():
-                    # Make a copy with unique name
-                    safe_name = patient.replace(" ", "_").lower()
-                    copy_path = os.path.join(project_root, "rag_agent", "src", "output", f"ub04_claim_{safe_name}.pdf")
-                    
-                    # Copy the file
-                    shutil.copy2(report_path, copy_path)
-                    
-                    # Read the PDF content for the user to download
-                    with open(copy_path, "rb") as file:
-                        pdf_content = file.read()
-                    
-                    # Store the processed PDF info
-                    st.session_state.processed_pdfs.append({
-                        "patient": patient,
-                        "path": str(copy_path),
-                        "content": pdf_content,
-                        "success": True
-                    })
-                    
-                    # Log success in the hidden container
-                    with log_expander:
-                        st.success(f"Successfully processed {patient}")
-                else:
-                    # Record failure
-                    st.session_state.processed_pdfs.append({
-                        "patient": patient,
-                        "success": False,
-                        "error": "PDF not generated"
-                    })
-                    
-                    # Log failure in the hidden container
-                    with log_expander:
-                        st.error(f"Failed to process {patient}: PDF not generated")
-                
-                # Brief pause between patients to avoid rate limiting
-                if i < len(selected_patients) - 1:
-                    time.sleep(2)  # Increased wait time to ensure completion
-                    
-            except Exception as e:
-                # Record error
-                st.session_state.processed_pdfs.append({
-                    "patient": patient,
-                    "success": False,
-                    "error": str(e)
-                })
-                
-                # Log error in the hidden container
-                with log_expander:
-                    st.error(f"Error processing {patient}: {str(e)}")
-        
-        # Complete the progress bar
-        progress_bar.progress(1.0)
-        status_text.text(f"Completed processing {len(selected_patients)} patients")
-        
-        # Set the processing complete flag
-        st.session_state.processing_complete = True
-        
-    # Display results section if there are processed PDFs
-    if len(st.session_state.processed_pdfs) > 0:
-        st.subheader("Processing Results")
-        
-        # Calculate success rate
-        success_count = sum(1 for result in st.session_state.processed_pdfs if result["success"])
-        
-        # Show success metrics
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("Successfully Processed", success_count)
-        with col2:
-            st.metric("Failed", len(st.session_state.processed_pdfs) - success_count)
-        
-        # Show download section only if there are successful PDFs
-        if success_count > 0:
-            st.subheader("Download Reports")
-            
-            # Determine how many columns to display per row
-            columns_per_row = 3
-            
-            # Loop through the results in groups to create rows of columns
-            successful_pdfs = [pdf for pdf in st.session_state.processed_pdfs if pdf["success"]]
-            for i in range(0, len(successful_pdfs), columns_per_row):
-                # Create a row of columns
-                cols = st.columns(columns_per_row)
-                
-                # Process patients for this row
-                for j in range(columns_per_row):
-                    idx = i + j
-                    if idx < len(successful_pdfs):
-                        result = successful_pdfs[idx]
-                        
-                        # Get the PDF content or read it from the path if needed
-                        pdf_content = result.get("content")
-                        if pdf_content is None and "path" in result:
-                            try:
-                                with open(result["path"], "rb") as file:
-                                    pdf_content = file.read()
-                                    # Update the content in session state
-                                    result["content"] = pdf_content
-                            except Exception as e:
-                                st.error(f"Could not read PDF for {result['patient']}: {str(e)}")
-                                continue
-                        
-                        with cols[j]:
-                            st.write(f"**{result['patient']}**")
-                            
-                            # Use a unique key for each download button
-                            download_key = f"download_{result['patient']}_{idx}"
-                            
-                            # Download button for this patient's PDF
-                            st.download_button(
-                                label=f"📥 Download PDF",
-                                data=pdf_content,
-                                file_name=f"ub04_claim_{result['patient'].replace(' ', '_').lower()}.pdf",
-                                mime="application/pdf",
-                                key=download_key
-                            )
-            
-            # Add a download all button
-            if len(successful_pdfs) > 1:
-                st.write("---")
-                st.write("**Download All PDFs as a ZIP**")
-                
-                # Create a ZIP file containing all PDFs
-                import io
-                import zipfile
-                
-                # Create a BytesIO object for the zip file
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, 'a', zipfile.ZIP_DEFLATED, False) as zip_file:
-                    for pdf in successful_pdfs:
-                        if "content" in pdf and pdf["content"]:
-                            safe_name = pdf["patient"].replace(" ", "_").lower()
-                            zip_file.writestr(f"ub04_claim_{safe_name}.pdf", pdf["content"])
-                
-                # Offer the ZIP file for download
-                st.download_button(
-                    label="📥 Download All PDFs (ZIP)",
-                    data=zip_buffer.getvalue(),
-                    file_name="all_ub04_claims.zip",
-                    mime="application/zip",
-                    key="download_all_zip"
-                )
+        # A new batch replaces the previous batch's results
+        job_refs = [ref for ref in st.session_state.claim_jobs if ref.get("group") != "batch"]
+        try:
+            for patient in selected_patients:
+                job_refs.append({**submit_claim_job(patient, save_profile=save_profile), "group": "batch"})
+        except Exception as e:
+            st.error(f"Could not queue all claims: {str(e)}")
+        remember_jobs(job_refs)
+
+    batch_jobs()
 
 # Footer
 st.markdown("---")  
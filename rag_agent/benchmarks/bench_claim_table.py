@@ -0,0 +1,73 @@
+# bench_claim_table.py
+"""
+Memory and row-access benchmark: default DataFrame vs ClaimTable.
+
+Writes a synthetic claims CSV by cycling the rows of knowledge/ub04_claims.csv
+(with unique control and record numbers), loads it both ways and reports
+resident size, load time and the cost of materializing random rows as
+UB04Claim objects.
+
+Usage:
+    python benchmarks/bench_claim_table.py [rows ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from rag_agent.claim_table import ClaimTable  # noqa: E402
+from rag_agent.models import UB04Claim  # noqa: E402
+
+CSV_PATH = os.path.join(project_root, "knowledge", "ub04_claims.csv")
+SAMPLE_ROWS = 2000
+
+
+def write_csv(rows, path):
+    sample = pd.read_csv(CSV_PATH, dtype=str)
+    df = sample.iloc[[i % len(sample) for i in range(rows)]].reset_index(drop=True)
+    numbers = pd.Series(range(rows)).astype(str).str.zfill(9)
+    df["PatientControlNumber"] = "PCN" + numbers
+    df["MedicalRecordNumber"] = "MRN" + numbers
+    df.to_csv(path, index=False)
+
+
+def time_rows(get_row, rows):
+    started = time.perf_counter()
+    for row in rows:
+        UB04Claim.from_csv_row(get_row(row))
+    return (time.perf_counter() - started) / len(rows) * 1e6
+
+
+def run(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "claims.csv")
+        write_csv(rows, path)
+
+        started = time.perf_counter()
+        df = pd.read_csv(path)
+        df_load = time.perf_counter() - started
+        started = time.perf_counter()
+        table = ClaimTable.from_csv(path)
+        table_load = time.perf_counter() - started
+
+    sample = random.Random(0).sample(range(rows), min(SAMPLE_ROWS, rows))
+    df_bytes = df.memory_usage(deep=True).sum()
+    table_bytes = table.memory_usage()
+    df_row = time_rows(lambda row: df.loc[row].to_dict(), sample)
+    table_row = time_rows(table.record, sample)
+    print(f"{rows:>9} {df_bytes / 2**20:>9.1f} {table_bytes / 2**20:>9.1f} {df_bytes / table_bytes:>6.1f}x "
+          f"{df_load:>8.2f} {table_load:>8.2f} {df_row:>9.1f} {table_row:>9.1f}")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'rows':>9} {'df MB':>9} {'table MB':>9} {'ratio':>7} {'df load':>8} {'tbl load':>8} "
+          f"{'df us/row':>9} {'tbl us/row':>9}")
+    for count in counts:
+        run(count)
@@ -0,0 +1,80 @@
+# bench_pdf_profiles.py
+"""
+Time and size benchmark for the PDFFormFillerTool save profiles.
+
+Fills the UB-04 template once per sample claim in knowledge/ub04_claims.csv
+with every save profile and reports the mean/p95 fill+save time and the
+mean output size. With --lines N every claim is given N revenue lines, so
+long stays that continue onto extra form pages can be timed as well. Tool
+logging is suppressed while timing.
+
+Usage:
+    python benchmarks/bench_pdf_profiles.py [--rounds N] [--lines N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from rag_agent.models import UB04Claim  # noqa: E402
+from rag_agent.tools.pdf_tool import SAVE_PROFILES, PDFFormFillerTool  # noqa: E402
+
+CSV_PATH = os.path.join(project_root, "knowledge", "ub04_claims.csv")
+
+
+def load_claims(lines=None):
+    df = pd.read_csv(CSV_PATH)
+    claims = [UB04Claim.from_csv_row(row).model_dump(mode="json") for _, row in df.iterrows()]
+    if lines:
+        for claim in claims:
+            # Repeat the claim's own lines up to the requested count
+            claim["revenue_lines"] = [claim["revenue_lines"][i % len(claim["revenue_lines"])] for i in range(lines)]
+    return claims
+
+
+def run(profile, claims, rounds, tmp):
+    tool = PDFFormFillerTool(output_path=os.path.join(tmp, f"{profile}.pdf"), save_profile=profile)
+    tool.load_template()
+    tool.load_field_map()
+    timings, sizes = [], []
+    for _ in range(rounds):
+        for claim in claims:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                message = tool._run(claim)
+            timings.append(time.perf_counter() - started)
+            if not message.startswith("Successfully"):
+                raise RuntimeError(message)
+            sizes.append(os.path.getsize(tool.output_path))
+    timings.sort()
+    return {
+        "profile": profile,
+        "fills": len(timings),
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p95_ms": timings[int(0.95 * (len(timings) - 1))] * 1000,
+        "mean_kb": statistics.mean(sizes) / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the sample claims per profile")
+    parser.add_argument("--lines", type=int, default=None, help="Revenue lines per claim (default: as in the CSV)")
+    args = parser.parse_args()
+
+    claims = load_claims(args.lines)
+    print(f"{'profile':<9} {'fills':>6} {'mean ms':>9} {'p95 ms':>9} {'mean KB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in SAVE_PROFILES:
+            result = run(profile, claims, args.rounds, tmp)
+            print(f"{result['profile']:<9} {result['fills']:>6} {result['mean_ms']:>9.2f} "
+                  f"{result['p95_ms']:>9.2f} {result['mean_kb']:>9.1f}")
@@ -0,0 +1,390 @@
+# bench_streamlit_sessions.py
+"""
+Multi-session load test for the Streamlit app (Streamlit/app.py).
+
+Drives N concurrent headless sessions with Streamlit's AppTest, each in its
+own process, each acting like an analyst: it builds one single-patient
+claim, then a batch of patients, polling the page until every claim has
+its PDF. The LLM and the embeddings are stubbed (no network, no tokens):
+embeddings are hashed vectors, and each crew run does the real CSV lookup
+and PDF fill with a simulated LLM delay of --llm-seconds per task. So the
+numbers measure the app, the job backend and the tools, not the model.
+
+Backends: with --backend worker every session submits to one shared claim
+worker server, as the users of one deployment do, so jobs of all sessions
+queue together. With --backend local each session process runs the app's
+in-process worker on its own (AppTest cannot host several sessions in one
+runtime), so local numbers are per-session costs without contention.
+
+Reported per concurrency level: claims/second, submit-to-PDF latency and
+page rerun latency percentiles, and errors in three groups:
+    app            exceptions raised by the page, claims not finished in time
+    cross-session  jobs showing up in a session that did not submit them,
+                   PDFs filled for a different patient, missing PDFs
+    harness        failures of this script itself (a session process that
+                   crashed or raised outside the page)
+App or cross-session errors exit 1; harness errors alone exit 2, since the
+run is then inconclusive rather than failed.
+
+Needs the app's dependencies (streamlit, pysqlite3). Job PDFs land in
+rag_agent/src/output/jobs as in normal use.
+
+Usage:
+    python benchmarks/bench_streamlit_sessions.py [--sessions 1 2 4 8] [--batch-size N]
+        [--runs N] [--llm-seconds S] [--backend local|worker]
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from types import SimpleNamespace
+
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+repo_root = os.path.dirname(project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+APP_PATH = os.path.join(repo_root, "Streamlit", "app.py")
+CSV_PATH = os.path.join(project_root, "knowledge", "ub04_claims.csv")
+EMBEDDING_DIM = 64
+ERROR_GROUPS = ("app", "cross_session", "harness")
+
+
+def hashed_embeddings(self, input):
+    """Deterministic stand-in for OpenAI embeddings: token hashes folded into a fixed-size vector."""
+    vectors = []
+    for text in input:
+        vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        for token in str(text).lower().split():
+            vector[int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % EMBEDDING_DIM] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+def install_stubs(llm_seconds, scratch_dir, jitter=0.25):
+    """
+    Replace the network-bound parts before the app imports the crew: the
+    embedding function, and the crew kickoff, which becomes the two real tool
+    calls with a simulated LLM delay around each. The knowledge index and the
+    filled PDF live in scratch_dir, so processes never share them.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+    os.environ["RAG_VECTOR_BACKEND"] = "numpy"
+    os.environ["RAG_RENDER_CACHE"] = "0"  # every claim is rendered
+    # The index is built next to this copy, not next to the real knowledge file
+    knowledge_path = os.path.join(scratch_dir, os.path.basename(CSV_PATH))
+    shutil.copyfile(CSV_PATH, knowledge_path)
+    os.environ["RAG_KNOWLEDGE_PATH"] = knowledge_path
+
+    from chromadb.utils import embedding_functions
+
+    embedding_functions.OpenAIEmbeddingFunction.__call__ = hashed_embeddings
+
+    from rag_agent import crew as crew_module
+    from rag_agent.models import UB04Claim
+
+    # Workers copy the fill output into the job; two processes filling one path would swap PDFs
+    crew_module.pdf_tool.output_path = os.path.join(scratch_dir, "ub04_claim_filled.pdf")
+
+    def llm_delay():
+        time.sleep(max(0.0, random.gauss(llm_seconds, llm_seconds * jitter)))
+
+    def stub_run_claim(self, inputs):
+        llm_delay()
+        raw = crew_module.csv_tool._run(inputs["patient_name"])
+        claim = UB04Claim.model_validate_json(raw)
+        for listener in self.task_listeners:
+            listener(SimpleNamespace(name="gather_encounter_data", raw=raw, pydantic=claim))
+        llm_delay()
+        result = crew_module.pdf_tool._run(claim.model_dump(mode="json"))
+        for listener in self.task_listeners:
+            listener(SimpleNamespace(name="generate_pdf_task", raw=result, pydantic=None))
+        return result
+
+    crew_module.UB04ClaimBuilderCrew.run_claim = stub_run_claim
+
+
+def start_worker(jobs_dir):
+    """A claim worker server on a free port, for --backend worker. Returns its URL."""
+    from rag_agent.worker import ClaimWorker, start_worker_server
+
+    worker = ClaimWorker(jobs_dir=jobs_dir)
+    _, url = start_worker_server(worker, port=0)
+    return url
+
+
+def pdf_patient(pdf_bytes):
+    """(first name, last name) filled into a claim PDF, from its widgets or, for flattened PDFs, its text."""
+    import fitz  # PyMuPDF
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        values = {widget.field_name: widget.field_value for widget in doc.load_page(0).widgets()}
+        if values:
+            return values.get("PatientFirstName") or "", values.get("PatientLastName") or ""
+        return None, doc.load_page(0).get_text()
+
+
+class Session:
+    """One simulated analyst working through the page."""
+
+    def __init__(self, number, patients, args):
+        self.number = number
+        self.patients = patients
+        self.args = args
+        self.random = random.Random(number)
+        self.claim_seconds = []
+        self.rerun_seconds = []
+        self.claims = 0
+        self.failed = 0
+        self.errors = {group: [] for group in ERROR_GROUPS}
+        self.app = None
+
+    def error(self, group, message):
+        self.errors[group].append(f"session {self.number}: {message}")
+
+    def open(self):
+        """Load the page once, so the first timed rerun is not the process's first import of the crew."""
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP_PATH, default_timeout=self.args.timeout)
+        self.rerun()
+        self.rerun_seconds.clear()
+
+    def rerun(self):
+        started = time.perf_counter()
+        self.app.run()
+        self.rerun_seconds.append(time.perf_counter() - started)
+        for exception in self.app.exception:
+            self.error("app", f"app exception: {exception.message}")
+
+    def wait_for(self, job_ids, submitted):
+        """Poll (rerun the page) until every job is finished and its PDF fetched."""
+        deadline = time.perf_counter() + self.args.timeout
+        pending = set(job_ids)
+        while pending:
+            time.sleep(self.args.poll_seconds)
+            self.rerun()
+            finished = self.app.session_state["finished_jobs"]
+            for job_id in list(pending):
+                if job_id in finished:
+                    pending.discard(job_id)
+                    self.claim_seconds.append(time.perf_counter() - submitted)
+            if time.perf_counter() > deadline:
+                self.error("app", f"timed out waiting for {len(pending)} job(s)")
+                return
+
+    def check(self, expected):
+        """Every job of the session is one it submitted, for the patient it asked for, with that patient's PDF."""
+        refs = self.app.session_state["claim_jobs"]
+        finished = self.app.session_state["finished_jobs"]
+        pdfs = self.app.session_state["claim_pdfs"]
+        for ref in refs:
+            job_id = ref["job_id"]
+            if job_id not in expected:
+                self.error("cross_session", f"foreign job {job_id} ({ref.get('patient')})")
+                continue
+            job = finished.get(job_id)
+            if job is None:
+                continue
+            if job.patient_name != expected[job_id]:
+                self.error("cross_session", f"job {job_id} is for {job.patient_name}, "
+                                            f"submitted for {expected[job_id]}")
+            if job.status != "succeeded":
+                continue
+            content = pdfs.get(job_id)
+            if not content:
+                self.error("cross_session", f"no PDF for job {job_id}")
+                continue
+            first, last = pdf_patient(content)
+            wanted_first, _, wanted_last = expected[job_id].partition(" ")
+            filled = f"{first} {last}" if first is not None else last
+            if wanted_last not in filled or wanted_first not in filled:
+                self.error("cross_session", f"PDF of job {job_id} is for '{filled.strip()[:40]}', "
+                                            f"not {expected[job_id]}")
+
+    def count(self, job_ids):
+        finished = self.app.session_state["finished_jobs"]
+        for job_id in job_ids:
+            job = finished.get(job_id)
+            if job is not None:
+                self.claims += 1
+                self.failed += job.status != "succeeded"
+
+    def work(self):
+        expected = {}
+        for _ in range(self.args.runs):
+            # Single patient: pick, click, poll
+            patient = self.random.choice(self.patients)
+            self.app.selectbox[0].select(patient)
+            self.rerun()
+            known = {ref["job_id"] for ref in self.app.session_state["claim_jobs"]}
+            self.app.button(key="single_patient_button").click()
+            submitted = time.perf_counter()
+            self.rerun()
+            new = [ref["job_id"] for ref in self.app.session_state["claim_jobs"] if ref["job_id"] not in known]
+            expected.update({job_id: patient for job_id in new})
+            self.wait_for(new, submitted)
+            self.count(new)
+
+            # Batch: pick several, click, poll
+            batch = self.random.sample(self.patients, min(self.args.batch_size, len(self.patients)))
+            self.app.multiselect[0].set_value(batch)
+            self.rerun()
+            self.app.button(key="batch_button").click()
+            submitted = time.perf_counter()
+            self.rerun()
+            new = [ref for ref in self.app.session_state["claim_jobs"]
+                   if ref.get("group") == "batch" and ref["job_id"] not in expected]
+            expected.update({ref["job_id"]: ref["patient"] for ref in new})
+            self.wait_for([ref["job_id"] for ref in new], submitted)
+            self.count([ref["job_id"] for ref in new])
+            self.check(expected)
+
+    def report(self):
+        return {
+            "claims": self.claims,
+            "failed": self.failed,
+            "claim_seconds": self.claim_seconds,
+            "rerun_seconds": self.rerun_seconds,
+            "errors": self.errors,
+        }
+
+
+def run_session(number, patients, args, barrier, results):
+    """
+    Body of one session process: set up and load the page, wait until every
+    session is ready, then work through the page and put a report on results.
+    """
+    session = Session(number, patients, args)
+    ready = False
+    try:
+        install_stubs(args.llm_seconds, tempfile.mkdtemp(prefix=f"bench_streamlit_{number}_"))
+        session.open()
+        ready = True
+    except Exception:
+        session.error("harness", f"setup failed:\n{traceback.format_exc()}")
+    try:
+        # Also reached after a failed setup, so the other sessions are not left waiting
+        barrier.wait(timeout=args.setup_timeout)
+        if ready:
+            session.work()
+    except threading.BrokenBarrierError:
+        session.error("harness", "sessions did not all start together")
+    except Exception:
+        session.error("harness", f"driver raised:\n{traceback.format_exc()}")
+    results.put({"number": number, **session.report()})
+
+
+def run_level(sessions, patients, args):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(sessions + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_session, args=(number, patients, args, barrier, results),
+                        name=f"session-{number}")
+        for number in range(sessions)
+    ]
+    for process in processes:
+        process.start()
+    harness_errors = []
+    try:
+        barrier.wait(timeout=args.setup_timeout)
+    except threading.BrokenBarrierError:
+        harness_errors.append(f"sessions not ready within {args.setup_timeout:g}s")
+    began = time.perf_counter()
+    reports = []
+    while len(reports) < sessions:
+        try:
+            reports.append(results.get(timeout=args.timeout + args.setup_timeout))
+        except queue.Empty:
+            break
+    elapsed = time.perf_counter() - began
+    for process in processes:
+        process.join(timeout=30)
+        if process.is_alive():
+            process.terminate()
+    reported = {report["number"] for report in reports}
+    for number, process in enumerate(processes):
+        if number not in reported:
+            harness_errors.append(f"session {number}: process ended without a report (exit code {process.exitcode})")
+
+    claims = sum(report["claims"] for report in reports)
+    errors = {group: [error for report in reports for error in report["errors"][group]] for group in ERROR_GROUPS}
+    errors["harness"] = harness_errors + errors["harness"]
+    return {
+        "sessions": sessions,
+        "seconds": round(elapsed, 2),
+        "claims": claims,
+        "failed": sum(report["failed"] for report in reports),
+        "claims_per_second": round(claims / elapsed, 3),
+        "claim_seconds": [value for report in reports for value in report["claim_seconds"]],
+        "rerun_seconds": [value for report in reports for value in report["rerun_seconds"]],
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrent sessions per level")
+    parser.add_argument("--runs", type=int, default=1, help="Single + batch rounds per session")
+    parser.add_argument("--batch-size", type=int, default=5, help="Patients per batch run")
+    parser.add_argument("--llm-seconds", type=float, default=0.5, help="Simulated LLM time per crew task")
+    parser.add_argument("--poll-seconds", type=float, default=0.5, help="Pause between page reruns while waiting")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds a session waits for its claims")
+    parser.add_argument("--setup-timeout", type=float, default=300, help="Seconds a session process may take to start")
+    parser.add_argument("--backend", choices=("local", "worker"), default="local",
+                        help="local: each session's in-process worker; worker: one shared worker server")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_streamlit_")
+    # Session processes inherit the backend settings from this environment
+    if args.backend == "worker":
+        install_stubs(args.llm_seconds, scratch)
+        os.environ["CLAIM_WORKER_URL"] = start_worker(os.path.join(scratch, "jobs"))
+        os.environ["USE_CLAIM_WORKER"] = "1"
+    else:
+        os.environ["USE_CLAIM_WORKER"] = "0"
+
+    import pandas as pd
+
+    from rag_agent.usage import latency_percentiles
+
+    names = pd.read_csv(CSV_PATH, dtype=str)
+    patients = sorted({f"{first} {last}" for first, last in zip(names["PatientFirstName"], names["PatientLastName"])})
+
+    results = []
+    print(f"{'sessions':>8} {'claims':>7} {'failed':>7} {'claims/s':>9} {'p50 s':>7} {'p95 s':>7} "
+          f"{'p99 s':>7} {'rerun p95':>10} {'app':>5} {'cross':>6} {'harness':>8}")
+    for sessions in args.sessions:
+        result = run_level(sessions, patients, args)
+        claim = latency_percentiles(result["claim_seconds"]) or {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+        rerun = latency_percentiles(result["rerun_seconds"]) or {"p95": 0.0}
+        errors = result["errors"]
+        print(f"{sessions:>8} {result['claims']:>7} {result['failed']:>7} {result['claims_per_second']:>9.2f} "
+              f"{claim['p50']:>7.2f} {claim['p95']:>7.2f} {claim['p99']:>7.2f} {rerun['p95']:>10.2f} "
+              f"{len(errors['app']):>5} {len(errors['cross_session']):>6} {len(errors['harness']):>8}")
+        for group in ERROR_GROUPS:
+            for error in errors[group][:10]:
+                print(f"    [{group}] {error}")
+        results.append({**result, "claim_latency": claim, "rerun_latency": rerun})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as results_file:
+            json.dump([{key: value for key, value in result.items() if not key.endswith("_seconds")}
+                       for result in results], results_file, indent=2)
+    shutil.rmtree(scratch, ignore_errors=True)
+    if any(result["errors"]["app"] or result["errors"]["cross_session"] for result in results):
+        sys.exit(1)
+    if any(result["errors"]["harness"] for result in results):
+        sys.exit(2)
@@ -0,0 +1,66 @@
+# bench_submission.py
+"""
+Submission throughput and failure-handling benchmark against the local stub
+clearinghouse. No real network is used.
+
+Submits the sample claims (cycled to the requested count) one claim per
+837I, at several concurrency levels, with optional injected HTTP failures
+and claim rejections, and reports claims/second, retries and outcomes.
+
+Usage:
+    python benchmarks/bench_submission.py [--claims N] [--latency S] [--failure-rate R] [--reject-rate R]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from itertools import cycle, islice
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from rag_agent.clearinghouse import ClearinghouseClient  # noqa: E402
+from rag_agent.clearinghouse_stub import StubSettings, start_stub_server  # noqa: E402
+from rag_agent.x12 import iter_claims_from_csv  # noqa: E402
+
+CSV_PATH = os.path.join(project_root, "knowledge", "ub04_claims.csv")
+
+
+async def run(url, claims, concurrency):
+    async with ClearinghouseClient(url, max_concurrency=concurrency, max_connections=concurrency,
+                                   backoff_base=0.01) as client:
+        started = time.perf_counter()
+        results = await client.submit_claims(claims)
+        elapsed = time.perf_counter() - started
+    failed = [r for r in results if not r.accepted]
+    rejected = sum(1 for r in results for c in r.claims if not c.accepted)
+    retries = sum(r.attempts - 1 for r in results)
+    print(
+        f"concurrency {concurrency:>3}: {len(results) / elapsed:8.0f} claims/s  "
+        f"retries {retries:>4}  failed submissions {len(failed):>3}  rejected claims {rejected:>3}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--claims", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--reject-rate", type=float, default=0.02)
+    args = parser.parse_args()
+
+    settings = StubSettings(latency=args.latency, failure_rate=args.failure_rate,
+                            reject_rate=args.reject_rate, seed=42)
+    server, url = start_stub_server(settings=settings)
+    claims = list(islice(cycle(iter_claims_from_csv(CSV_PATH)), args.claims))
+    try:
+        for concurrency in (1, 8, 32):
+            asyncio.run(run(url, claims, concurrency))
+    finally:
+        server.shutdown()
+    print(f"stub saw {settings.requests} requests, injected {settings.failures} failures")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# bench_vector_store.py
+"""
+Startup and query latency of the vector store backends at 1k, 100k and 1M rows.
+
+Uses a deterministic random embedding function so no API calls are made.
+Each store is built once in a temporary directory, then reopened cold to
+measure startup (open + count) and queried to measure latency.
+
+Usage:
+    python benchmarks/bench_vector_store.py [--rows 1000 100000 1000000] [--dim 256]
+                                            [--backends numpy chroma] [--chroma-max-rows 100000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from rag_agent.vector_store import ChromaVectorStore, NumpyFlatVectorStore  # noqa: E402
+
+
+class RandomEmbedding:
+    """Stable pseudo-embeddings: the same text always maps to the same vector."""
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def __call__(self, input):
+        return [
+            np.random.default_rng(abs(hash(text)) % (2 ** 32)).standard_normal(self.dim).astype(np.float32)
+            for text in input
+        ]
+
+    # ChromaDB inspects these on custom embedding functions
+    def embed_query(self, input):
+        return self(input)
+
+    def name(self):
+        return "bench_random"
+
+    def is_legacy(self):
+        return False
+
+
+def build(backend, path, rows, dim, embedding):
+    ids = [str(i) for i in range(rows)]
+    rng = np.random.default_rng(0)
+    started = time.perf_counter()
+    if backend == "numpy":
+        store = NumpyFlatVectorStore(path, embedding)
+        for start in range(0, rows, 100000):
+            vectors = rng.standard_normal((min(100000, rows - start), dim)).astype(np.float32)
+            store.add_vectors(ids[start:start + len(vectors)], vectors)
+    else:
+        store = ChromaVectorStore(path, "bench", embedding)
+        for start in range(0, rows, 5000):
+            vectors = rng.standard_normal((min(5000, rows - start), dim)).astype(np.float32)
+            store.collection.add(ids=ids[start:start + len(vectors)], embeddings=vectors)
+    return time.perf_counter() - started
+
+
+def open_store(backend, path, embedding):
+    if backend == "numpy":
+        return NumpyFlatVectorStore(path, embedding)
+    return ChromaVectorStore(path, "bench", embedding)
+
+
+def run(backend, rows, dim, queries=50):
+    embedding = RandomEmbedding(dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, backend)
+        build_seconds = build(backend, path, rows, dim, embedding)
+
+        started = time.perf_counter()
+        store = open_store(backend, path, embedding)
+        store.count()
+        startup_ms = (time.perf_counter() - started) * 1000
+
+        latencies = []
+        for i in range(queries):
+            started = time.perf_counter()
+            store.query([f"patient {i}"], n_results=5)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+    print(
+        f"{backend:>6} {rows:>9} rows  build {build_seconds:7.1f} s  startup {startup_ms:8.1f} ms  "
+        f"query p50 {statistics.median(latencies):7.2f} ms  p95 {latencies[int(len(latencies) * 0.95) - 1]:7.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"])
+    parser.add_argument("--chroma-max-rows", type=int, default=100000,
+                        help="Skip Chroma above this size; HNSW inserts at 1M rows take a long time")
+    args = parser.parse_args()
+    for rows in args.rows:
+        for backend in args.backends:
+            if backend == "chroma" and rows > args.chroma_max_rows:
+                print(f"chroma {rows:>9} rows  skipped (raise --chroma-max-rows to include)")
+                continue
+            run(backend, rows, args.dim)
@@ -0,0 +1,58 @@
+# bench_x12.py
+"""
+Throughput benchmark for the streaming 837I writer.
+
+Cycles the claims in knowledge/ub04_claims.csv (with unique patient control
+numbers) through X12_837IWriter and reports claims/second, output size and
+peak traced memory. Peak memory should stay flat as the claim count grows.
+
+Usage:
+    python benchmarks/bench_x12.py [claims ...]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import cycle, islice
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from rag_agent.x12 import X12_837IWriter, iter_claims_from_csv  # noqa: E402
+
+CSV_PATH = os.path.join(project_root, "knowledge", "ub04_claims.csv")
+
+
+def synthetic_claims(count):
+    """Yield `count` claims built from the sample rows, each with a unique PCN."""
+    templates = list(iter_claims_from_csv(CSV_PATH))
+    for number, template in enumerate(islice(cycle(templates), count)):
+        visit = template.visit.model_copy(update={"patient_control_number": f"PCN{number:09d}"})
+        yield template.model_copy(update={"visit": visit})
+
+
+def run(count):
+    writer = X12_837IWriter()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.837")
+        started = time.perf_counter()
+        stats = writer.write_file(synthetic_claims(count), path)
+        elapsed = time.perf_counter() - started
+        size_mb = os.path.getsize(path) / 1e6
+
+        # Second pass under tracemalloc, which slows Python down too much to time
+        tracemalloc.start()
+        writer.write_file(synthetic_claims(count), path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(
+        f"{count:>8} claims  {elapsed:7.2f} s  {count / elapsed:9.0f} claims/s  "
+        f"{stats.interchanges:>4} interchanges  {size_mb:7.1f} MB  peak {peak / 1e6:6.2f} MB"
+    )
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 50000]
+    for count in counts:
+        run(count)
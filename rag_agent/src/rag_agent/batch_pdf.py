@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from rag_agent.field_map import FieldMap, load_field_map
+from rag_agent.memory_profile import memory_profiler
+
+# Largest font used for field text; smaller when the value does not fit its box
+MAX_FONT_SIZE = 9.0
+MIN_FONT_SIZE = 4.0
+
+
+def index_path_for(pdf_path: str) -> str:
+    """Where the page index of a combined PDF is written."""
+    return os.path.splitext(pdf_path)[0] + ".index.json"
+
+
+def claim_id_of(claim: Dict[str, Any]) -> str:
+    """The claim's patient control number (UB-04 FL 3a), the ID the index is keyed by."""
+    return str((claim.get("visit") or {}).get("patient_control_number") or "")
+
+
+def claim_title(claim: Dict[str, Any]) -> str:
+    patient = claim.get("patient") or {}
+    name = ", ".join(part for part in (patient.get("last_name"), patient.get("first_name")) if part)
+    return f"{name or 'Unknown patient'} ({claim_id_of(claim) or 'no claim ID'})"
+
+
+class BatchPDFWriter:
+    """
+    Renders many claims into one print-ready PDF.
+
+    The template's first page is embedded once, as a form XObject that every
+    claim page draws as its background; a page only adds its own field text,
+    so the template's fonts and artwork are stored a single time however
+    many claims the file holds. Field values are printed at the template's
+    widget positions (the output is flat, like the "archive" profile), with
+    continuation pages from the field map for long claims.
+
+    Pages are written to disk every `flush_every` claims with incremental
+    saves, and the document is reopened after each flush, so memory stays
+    bounded for month-end batches. `close` adds one outline entry per claim
+    and writes an index (see `index_path_for`) mapping each claim ID to its
+    page range.
+    """
+
+    def __init__(self, output_path: str, template_bytes: bytes, field_map: FieldMap, flush_every: int = 500):
+        self.output_path = output_path
+        self.field_map = field_map
+        self.flush_every = flush_every
+        self._template = fitz.open(stream=template_bytes, filetype="pdf")
+        template_page = self._template.load_page(0)
+        self._page_rect = template_page.rect
+        self._layout: List[Tuple[str, fitz.Rect]] = [(widget.field_name, fitz.Rect(widget.rect))
+                                                    for widget in template_page.widgets()]
+        self._background_xref: Optional[int] = None
+        self._font = fitz.Font("helv")
+        self._entries: List[Dict[str, Any]] = []
+        self._pending = 0
+        self._saved = False
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        self._doc = fitz.open()
+
+    def __enter__(self) -> "BatchPDFWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def page_count(self) -> int:
+        return self._doc.page_count
+
+    def add_claim(self, claim: Dict[str, Any], claim_id: Optional[str] = None,
+                  title: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Append one claim's pages.
+
+        Args:
+            claim: Claim JSON (UB04Claim.model_dump(mode="json") or the agent's dict).
+            claim_id: Index key; defaults to the claim's patient control number.
+            title: Outline entry; defaults to "Last, First (claim ID)".
+
+        Returns:
+            (first_page, last_page): 1-based page range of the claim.
+        """
+        first_page = self._doc.page_count + 1
+        for values in self.field_map.flatten(claim):
+            page = self._doc.new_page(width=self._page_rect.width, height=self._page_rect.height)
+            self._draw_background(page)
+            self._draw_fields(page, values)
+        last_page = self._doc.page_count
+        self._entries.append({
+            "claim_id": claim_id or claim_id_of(claim),
+            "title": title or claim_title(claim),
+            "first_page": first_page,
+            "last_page": last_page,
+        })
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+        return first_page, last_page
+
+    def _draw_background(self, page: fitz.Page) -> None:
+        if self._background_xref is None:
+            page.show_pdf_page(page.rect, self._template, 0)
+            self._background_xref = next(xref for xref, name, *_ in page.get_xobjects() if name.startswith("fzFrm"))
+            return
+        # Later pages reference the same XObject, also after the document has been reopened
+        doc = page.parent
+        doc.xref_set_key(page.xref, "Resources", f"<</XObject<</Template {self._background_xref} 0 R>>>>")
+        contents = doc.get_new_xref()
+        doc.update_object(contents, "<<>>")
+        doc.update_stream(contents, b"q /Template Do Q")
+        doc.xref_set_key(page.xref, "Contents", f"{contents} 0 R")
+
+    def _draw_fields(self, page: fitz.Page, values: Dict[str, str]) -> None:
+        # One text writer per page: a single content stream and font resource for all fields
+        writer = fitz.TextWriter(page.rect)
+        for name, rect in self._layout:
+            text = values.get(name)
+            if not text:
+                continue
+            size = min(MAX_FONT_SIZE, rect.height * 0.8)
+            width = fitz.get_text_length(text, fontname="helv", fontsize=size)
+            if width > rect.width - 2:
+                size = max(MIN_FONT_SIZE, size * (rect.width - 2) / width)
+            writer.append((rect.x0 + 1, rect.y1 - (rect.height - size) / 2 - 1), text, font=self._font, fontsize=size)
+        writer.write_text(page)
+
+    def flush(self) -> None:
+        """Write the pages added so far and release them from memory."""
+        if self._saved:
+            self._doc.save(self.output_path, incremental=True, deflate=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        elif self._doc.page_count:
+            self._doc.save(self.output_path, deflate=True)
+            self._saved = True
+        else:
+            return
+        self._doc.close()
+        self._doc = fitz.open(self.output_path)
+        self._pending = 0
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Add the outline, write the last pages and the index.
+
+        Returns:
+            The index: {"pdf", "pages", "field_map", "claims": [{claim_id, title, first_page, last_page}]}.
+        """
+        if self._doc.is_closed:
+            return self.index()
+        if self._entries:
+            self._doc.set_toc([[1, entry["title"], entry["first_page"]] for entry in self._entries])
+        self.flush()
+        self._doc.close()
+        self._template.close()
+        index = self.index()
+        with open(index_path_for(self.output_path), "w", encoding="utf-8") as index_file:
+            json.dump(index, index_file, indent=2)
+        return index
+
+    def index(self) -> Dict[str, Any]:
+        return {
+            "pdf": os.path.basename(self.output_path),
+            "pages": self._entries[-1]["last_page"] if self._entries else 0,
+            "field_map": self.field_map.key,
+            "claims": list(self._entries),
+        }
+
+
+def write_batch_pdf(claims: Iterable[Dict[str, Any]], output_path: str, template_bytes: bytes,
+                    field_map: FieldMap, flush_every: int = 500) -> Dict[str, Any]:
+    """
+    Render claims into one combined PDF.
+
+    Args:
+        claims: Claim JSON dicts, rendered in order.
+        output_path: Combined PDF to write; the index goes next to it.
+        template_bytes: UB-04 template PDF.
+        field_map: Compiled field map (PDFFormFillerTool.load_field_map()).
+        flush_every: Claims rendered between writes to disk.
+
+    Returns:
+        The page index (see BatchPDFWriter.close).
+    """
+    with BatchPDFWriter(output_path, template_bytes, field_map, flush_every=flush_every) as writer:
+        for claim in claims:
+            writer.add_claim(claim)
+    return writer.index()
+
+
+def load_template_and_map(template_path: str, field_map_path: Optional[str] = None) -> Tuple[bytes, FieldMap]:
+    """Template bytes and the field map compiled against it, without loading the crew or its tools."""
+    with open(template_path, "rb") as template_file:
+        template_bytes = template_file.read()
+    with fitz.open(stream=template_bytes, filetype="pdf") as template:
+        widget_names = {widget.field_name for widget in template.load_page(0).widgets()}
+    return template_bytes, load_field_map(widget_names, field_map_path)
+
+
+def main():
+    """
+    Render every claim row of a CSV into one combined, bookmarked PDF.
+
+    With --mrn only that patient's claims are rendered, oldest service period
+    first, so all of a long-stay patient's periods are billed in one pass.
+    """
+    import pandas as pd
+
+    from rag_agent.knowledge_base import ShardedKnowledgeBase
+    from rag_agent.models import UB04Claim
+
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description="Render a batch of UB-04 claims into one PDF with a page index.")
+    parser.add_argument("csv", nargs="?", default=os.path.join(project_root, "knowledge", "ub04_claims.csv"),
+                        help="Claims CSV (ub04_claims.csv layout); with --mrn also a directory of shards")
+    parser.add_argument("--output", default=os.path.join(project_root, "src", "output", "ub04_claims_batch.pdf"))
+    parser.add_argument("--template", default=os.path.join(project_root, "template", "ub-40-.pdf"))
+    parser.add_argument("--patients", nargs="*", default=None, help="Only these patients (\"First Last\")")
+    parser.add_argument("--mrn", default=None, help="Only this patient's claims, in service-period order")
+    parser.add_argument("--from", dest="start", default=None, help="With --mrn: periods ending on or after this date")
+    parser.add_argument("--to", dest="end", default=None, help="With --mrn: periods starting on or before this date")
+    parser.add_argument("--latest", type=int, default=None, help="With --mrn: only the newest N claims")
+    parser.add_argument("--flush-every", type=int, default=500, help="Claims rendered between writes to disk")
+    args = parser.parse_args()
+
+    def csv_rows():
+        for chunk in pd.read_csv(args.csv, dtype=str, keep_default_na=False, chunksize=1000):
+            for _, row in chunk.iterrows():
+                yield row
+
+    def patient_rows():
+        # Grouped per-patient index: one lookup, no embeddings needed
+        knowledge_base = ShardedKnowledgeBase(args.csv, embedding_function=None, build_vectors=False,
+                                              active_periods=None)
+        shards = knowledge_base.route_dates(args.start, args.end)
+        for global_id in knowledge_base.patient_claims(args.mrn, shards, args.start, args.end, args.latest):
+            yield knowledge_base.record(global_id, shards)
+
+    template_bytes, field_map = load_template_and_map(args.template)
+    wanted = {name.strip().lower() for name in args.patients} if args.patients else None
+    skipped = 0
+    with memory_profiler.stage("batch_loop"), \
+            BatchPDFWriter(args.output, template_bytes, field_map, flush_every=args.flush_every) as writer:
+        for row in (patient_rows() if args.mrn else csv_rows()):
+            name = f"{row['PatientFirstName'] or ''} {row['PatientLastName'] or ''}".strip()
+            if wanted and name.lower() not in wanted:
+                continue
+            try:
+                claim = UB04Claim.from_csv_row(row)
+            except (ValueError, TypeError) as e:
+                skipped += 1
+                print(f"Skipping row for {name}: {e}")
+                continue
+            writer.add_claim(claim.model_dump(mode="json"))
+    index = writer.index()
+    print(f"Wrote {len(index['claims'])} claim(s) on {index['pages']} page(s) to {args.output}"
+          + (f", skipped {skipped} invalid row(s)" if skipped else ""))
+    print(f"Index: {index_path_for(args.output)}")
+    memory_profiler.write_report(f"batch_pdf:{os.path.basename(args.output)}")
+    return index
+
+
+if __name__ == "__main__":
+    main()
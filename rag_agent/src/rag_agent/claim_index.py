@@ -0,0 +1,123 @@
+import datetime
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from rag_agent.validation import DATE_FORMAT
+
+# Sorts before every real date: claims whose admission date does not parse come first
+MISSING_DAY = np.iinfo(np.int32).min
+
+_MONTH = re.compile(r"^(\d{4})-(\d{1,2})$")
+_YEAR = re.compile(r"^(\d{4})$")
+
+
+def _claim_days(values: Sequence) -> np.ndarray:
+    """CSV dates (MM/DD/YYYY) as days since 1970-01-01; blanks and bad dates become MISSING_DAY."""
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), format=DATE_FORMAT, errors="coerce")
+    days = np.full(len(parsed), MISSING_DAY, dtype=np.int32)
+    valid = parsed.notna().to_numpy()
+    days[valid] = parsed[valid].to_numpy().astype("datetime64[D]").astype(np.int32)
+    return days
+
+
+def query_day(value: Optional[str], end: bool = False) -> Optional[int]:
+    """
+    A query date as days since 1970-01-01.
+
+    Accepts YYYY-MM-DD, MM/DD/YYYY, a month (YYYY-MM) or a year (YYYY); a
+    month or year means its first day, or its last day when `end` is set, so
+    "2025-04" to "2025-04" covers all of April.
+    """
+    if value is None or not str(value).strip():
+        return None
+    text = str(value).strip()
+    month, year = _MONTH.match(text), _YEAR.match(text)
+    if month or year:
+        first = datetime.date(int((month or year).group(1)), int(month.group(2)) if month else 1, 1)
+        if end:
+            last = (first.replace(year=first.year + 1, month=1) if not month or first.month == 12
+                    else first.replace(month=first.month + 1))
+            first = last - datetime.timedelta(days=1)
+        return (first - datetime.date(1970, 1, 1)).days
+    for date_format in ("%Y-%m-%d", DATE_FORMAT):
+        try:
+            day = datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+        return (day - datetime.date(1970, 1, 1)).days
+    raise ValueError(f"Unrecognised date '{value}'; use YYYY-MM-DD, MM/DD/YYYY, YYYY-MM or YYYY")
+
+
+class PatientClaimIndex:
+    """
+    Claim rows grouped by patient (Medical Record Number), in service-period order.
+
+    Built once per claim table with one sort: rows are ordered by MRN, then
+    admission date, and each MRN owns a contiguous slice of that order, found
+    by binary search. A patient's claims, the ones whose admission-discharge
+    period overlaps a date range and the latest N are therefore slices of
+    precomputed arrays rather than scans of the table.
+    """
+
+    def __init__(self, mrns: Sequence, admission_dates: Sequence, discharge_dates: Sequence):
+        keys = np.asarray([str(mrn).strip() if mrn is not None else "" for mrn in mrns], dtype=object)
+        admitted = _claim_days(admission_dates)
+        discharged = _claim_days(discharge_dates)
+        # A claim without a discharge date covers its admission day only
+        discharged = np.where(discharged == MISSING_DAY, admitted, discharged)
+        order = np.lexsort((np.arange(len(keys)), admitted, keys))
+        sorted_keys = keys[order]
+        self._rows = order.astype(np.int64)
+        self._admitted = admitted[order]
+        self._discharged = discharged[order]
+        # Each MRN's claims are the slice [_starts[i], _ends[i]) of the sorted order
+        changes = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+        self._starts = np.concatenate(([0], changes)).astype(np.int64) if len(keys) else changes
+        self._ends = np.concatenate((changes, [len(keys)])).astype(np.int64) if len(keys) else changes
+        self._mrns = sorted_keys[self._starts]
+
+    @classmethod
+    def from_table(cls, table) -> "PatientClaimIndex":
+        return cls(table.column("MedicalRecordNumber"), table.column("AdmissionDate"), table.column("DischargeDate"))
+
+    def __len__(self) -> int:
+        """Number of distinct patients."""
+        return len(self._mrns)
+
+    def _slice(self, mrn: str) -> slice:
+        key = str(mrn).strip()
+        position = int(np.searchsorted(self._mrns, key))
+        if position >= len(self._mrns) or self._mrns[position] != key:
+            return slice(0, 0)
+        return slice(int(self._starts[position]), int(self._ends[position]))
+
+    def claims(self, mrn: str, start: Optional[int] = None, end: Optional[int] = None,
+               latest: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        A patient's claims in admission-date order.
+
+        Args:
+            mrn: Medical Record Number.
+            start: Keep claims whose period ends on or after this day (see query_day).
+            end: Keep claims whose period starts on or before this day.
+            latest: Keep only the last N of the remaining claims.
+
+        Returns:
+            [(admission_day, row)]: row numbers of the table, oldest period first.
+        """
+        group = self._slice(mrn)
+        admitted, discharged, rows = self._admitted[group], self._discharged[group], self._rows[group]
+        if start is not None or end is not None:
+            keep = admitted != MISSING_DAY
+            if start is not None:
+                keep &= discharged >= start
+            if end is not None:
+                keep &= admitted <= end
+            admitted, rows = admitted[keep], rows[keep]
+        if latest is not None:
+            first = max(0, len(rows) - latest)
+            admitted, rows = admitted[first:], rows[first:]
+        return list(zip(admitted.tolist(), rows.tolist()))
@@ -0,0 +1,288 @@
+import json
+import re
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from rag_agent.models import _csv_text
+
+# How each ub04_claims.csv column is stored:
+#   category  dictionary-encoded: small integer codes into a list of distinct values
+#   code      fixed-width ASCII bytes (identifiers, codes and dates)
+#   number    float64
+# Numbered revenue-line columns are matched by prefix; unknown columns are dictionary-encoded.
+COLUMN_KINDS: Dict[str, str] = {
+    "FacilityName": "category",
+    "FacilityNPI": "category",
+    "FacilityAddress": "category",
+    "PatientControlNumber": "code",
+    "MedicalRecordNumber": "code",
+    "PatientLastName": "category",
+    "PatientFirstName": "category",
+    "PatientDOB": "code",
+    "PatientSex": "category",
+    "AdmissionDate": "code",
+    "DischargeDate": "code",
+    "BillType": "category",
+    "TotalCharge": "number",
+    "PrimaryPayerName": "category",
+    "PrimaryPayerID": "category",
+    "PrimaryDiagnosisCode": "category",
+    "SecondaryDiagnosisCode1": "category",
+    "AttendingPhysicianNPI": "code",
+}
+REVENUE_COLUMN_KINDS: Dict[str, str] = {
+    "RevenueCode": "category",
+    "HCPCSCode": "category",
+    "Units": "number",
+    "Charges": "number",
+}
+
+_REVENUE_COLUMN = re.compile(r"^(RevenueCode|HCPCSCode|Units|Charges)\d+$")
+
+
+def column_kind(column: str) -> str:
+    """Storage kind ("category", "code" or "number") of a claims CSV column."""
+    match = _REVENUE_COLUMN.match(column)
+    if match:
+        return REVENUE_COLUMN_KINDS[match.group(1)]
+    return COLUMN_KINDS.get(column, "category")
+
+
+def _smallest_code_dtype(size: int) -> np.dtype:
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _to_fixed_bytes(values: pd.Series) -> np.ndarray:
+    """Encode text as a stripped fixed-width bytes array; missing values become b''."""
+    text = values.to_numpy(dtype=object, na_value="")
+    try:
+        # object -> bytes is a single C loop, far cheaper than going through numpy unicode
+        encoded = text.astype("S")
+    except UnicodeEncodeError:
+        # Codes are ASCII by spec; replace stray characters instead of failing the load
+        encoded = np.char.encode(text.astype(str), "ascii", "replace")
+    padded = np.char.startswith(encoded, b" ") | np.char.endswith(encoded, b" ")
+    if padded.any():
+        encoded[padded] = np.char.strip(encoded[padded])
+    return encoded
+
+
+def _to_numbers(values: pd.Series) -> np.ndarray:
+    """Parse a column as float64; blanks and unparseable cells become NaN."""
+    try:
+        return values.to_numpy(dtype=object, na_value="nan").astype(np.float64)
+    except (ValueError, TypeError):
+        return pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+
+
+class ClaimRecord(Mapping):
+    """
+    One decoded claim row.
+
+    A read-only mapping of column name to value (str, float or None for a
+    blank cell), so it can be passed straight to UB04Claim.from_csv_row.
+    Records share their table's column index; only the values are per row.
+    """
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: Dict[str, int], values: Tuple[Any, ...]):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, column: str) -> Any:
+        return self._values[self._index[column]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f"ClaimRecord({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._index, self._values))
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+
+class ClaimTable:
+    """
+    Compact, column-oriented in-memory copy of the claims CSV.
+
+    Repeated text (facility, payer, names, codes) is dictionary-encoded into
+    int8/int16/int32 code arrays, identifiers and dates are stored as
+    fixed-width ASCII bytes and amounts as float64. Compared with a default
+    DataFrame, which keeps one Python string object per cell, this uses a
+    fraction of the memory, and `record(i)` builds a ClaimRecord without the
+    per-row Series that `df.loc[i]` creates.
+
+    Build it with `ClaimTable.from_csv(path)` (chunked, so the full default
+    DataFrame never exists) or `ClaimTable.from_frame(df)`.
+    """
+
+    def __init__(self):
+        self.columns: List[str] = []
+        self._kinds: Dict[str, str] = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._vocabularies: Dict[str, List[Optional[str]]] = {}  # category values; None last for code -1
+        self._index: Dict[str, int] = {}
+        self._decoders: List = []
+        self._length = 0
+
+    # ---------------- Building ---------------- #
+    @classmethod
+    def from_csv(cls, csv_path: str, chunksize: int = 200_000) -> "ClaimTable":
+        """Load a claims CSV chunk by chunk, keeping every cell as text until it is encoded."""
+        builder = _ClaimTableBuilder()
+        for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunksize):
+            builder.append(chunk)
+        return builder.finish()
+
+    @classmethod
+    def from_parquet(cls, parquet_path: str) -> "ClaimTable":
+        """Load a columnar (Parquet) shard with the claims CSV schema. Needs pyarrow or fastparquet."""
+        return cls.from_frame(pd.read_parquet(parquet_path))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ClaimTable":
+        """Encode an already loaded DataFrame (numeric codes are rendered like the CSV text)."""
+        builder = _ClaimTableBuilder()
+        builder.append(df.reset_index(drop=True).astype(object).map(lambda value: _csv_text(value) or None))
+        return builder.finish()
+
+    def _finalize(self) -> None:
+        self._index = {column: position for position, column in enumerate(self.columns)}
+        self._decoders = [self._decoder(column) for column in self.columns]
+
+    def _decoder(self, column: str):
+        array = self._arrays[column]
+        kind = self._kinds[column]
+        if kind == "category":
+            vocabulary = self._vocabularies[column]
+            return lambda row: vocabulary[array[row]]
+        if kind == "code":
+            return lambda row: array[row].decode("ascii") or None
+        return lambda row: None if np.isnan(array[row]) else float(array[row])
+
+    # ---------------- Access ---------------- #
+    def __len__(self) -> int:
+        return self._length
+
+    def record(self, row: int) -> ClaimRecord:
+        """Decode one row."""
+        if not -self._length <= row < self._length:
+            raise IndexError(f"Row {row} out of range for {self._length} claims")
+        return ClaimRecord(self._index, tuple(decode(row) for decode in self._decoders))
+
+    def records(self, rows: Iterable[int]) -> List[ClaimRecord]:
+        return [self.record(int(row)) for row in rows]
+
+    def column(self, column: str) -> np.ndarray:
+        """Decode a whole column into an object array (None for blanks)."""
+        array = self._arrays[column]
+        kind = self._kinds[column]
+        if kind == "category":
+            return np.asarray(self._vocabularies[column], dtype=object)[array]
+        if kind == "code":
+            decoded = np.char.decode(array, "ascii").astype(object)
+            decoded[array == b""] = None
+            return decoded
+        return array.astype(object)
+
+    def find(self, column: str, value: Any) -> np.ndarray:
+        """Row numbers whose `column` equals `value`, compared on the encoded data."""
+        array = self._arrays[column]
+        kind = self._kinds[column]
+        text = str(value).strip()
+        if kind == "category":
+            vocabulary = self._vocabularies[column]
+            try:
+                code = vocabulary.index(text, 0, len(vocabulary) - 1)
+            except ValueError:
+                return np.zeros(0, dtype=np.int64)
+            return np.flatnonzero(array == code)
+        if kind == "code":
+            try:
+                return np.flatnonzero(array == text.encode("ascii"))
+            except UnicodeEncodeError:
+                return np.zeros(0, dtype=np.int64)
+        try:
+            return np.flatnonzero(array == float(text))
+        except ValueError:
+            return np.zeros(0, dtype=np.int64)
+
+    def memory_usage(self) -> int:
+        """Approximate resident bytes: arrays plus the distinct category strings."""
+        total = sum(array.nbytes for array in self._arrays.values())
+        for vocabulary in self._vocabularies.values():
+            total += sum(len(value) + 49 for value in vocabulary if value is not None)
+        return total
+
+    def to_frame(self) -> pd.DataFrame:
+        """Decode back to a DataFrame (for validation or export)."""
+        return pd.DataFrame({column: self.column(column) for column in self.columns})
+
+
+class _ClaimTableBuilder:
+    """Encodes DataFrame chunks column by column and concatenates them at the end."""
+
+    def __init__(self):
+        self.columns: List[str] = []
+        self.parts: Dict[str, List[np.ndarray]] = {}
+        self.lookups: Dict[str, Dict[str, int]] = {}  # category value -> code
+        self.length = 0
+
+    def append(self, chunk: pd.DataFrame) -> None:
+        if not self.columns:
+            self.columns = [str(column) for column in chunk.columns]
+            self.parts = {column: [] for column in self.columns}
+        for column in self.columns:
+            values = chunk[column]
+            kind = column_kind(column)
+            if kind == "category":
+                self.parts[column].append(self._encode_category(column, values))
+            elif kind == "code":
+                self.parts[column].append(_to_fixed_bytes(values))
+            else:
+                self.parts[column].append(_to_numbers(values))
+        self.length += len(chunk)
+
+    def _encode_category(self, column: str, values: pd.Series) -> np.ndarray:
+        lookup = self.lookups.setdefault(column, {})
+        codes, uniques = pd.factorize(values)
+        # Map this chunk's local codes onto the column's global vocabulary
+        mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+        for local, value in enumerate(uniques):
+            mapping[local] = lookup.setdefault(str(value).strip(), len(lookup))
+        mapping[-1] = -1  # factorize marks missing values with -1
+        return mapping[codes]
+
+    def finish(self) -> ClaimTable:
+        table = ClaimTable()
+        table.columns = self.columns
+        table._length = self.length
+        for column in self.columns:
+            kind = column_kind(column)
+            table._kinds[column] = kind
+            parts = self.parts[column]
+            if kind == "category":
+                vocabulary = list(self.lookups.get(column, {}))
+                codes = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+                table._arrays[column] = codes.astype(_smallest_code_dtype(len(vocabulary)))
+                table._vocabularies[column] = vocabulary + [None]
+            elif kind == "code":
+                table._arrays[column] = np.concatenate(parts) if parts else np.zeros(0, dtype="S1")
+            else:
+                table._arrays[column] = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float64)
+        table._finalize()
+        return table
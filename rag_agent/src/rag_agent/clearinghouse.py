@@ -0,0 +1,214 @@
+import asyncio
+import io
+import itertools
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+from pydantic import BaseModel, Field
+
+from rag_agent.models import UB04Claim
+from rag_agent.x12 import ELEMENT_SEPARATOR, SEGMENT_TERMINATOR, X12_837IWriter, X12Envelope
+
+# HTTP statuses worth retrying: throttling and transient server errors
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# 277CA claim status category codes (STC01-1) that mean the claim was accepted
+ACCEPTED_CATEGORY_CODES = {"A0", "A1", "A2", "A5"}
+
+
+class ClaimStatus(BaseModel):
+    """Acceptance status of one claim from a 277CA."""
+    patient_control_number: str = Field(..., description="Claim identifier echoed in TRN02")
+    category_code: str = Field(..., description="STC01-1 claim status category, e.g. A1 or A7")
+    status_code: str = Field("", description="STC01-2 claim status code")
+    accepted: bool = Field(..., description="True for acknowledgement/acceptance categories")
+
+
+class SubmissionResult(BaseModel):
+    """Outcome of one 837I submission."""
+    submission_id: str = Field(..., description="Client-side identifier of the submission")
+    http_status: int = Field(0, description="Final HTTP status code, 0 if no response was received")
+    attempts: int = Field(0, description="Number of HTTP attempts made")
+    elapsed_seconds: float = Field(0.0, description="Wall-clock time including retries")
+    ack_status: str = Field("", description="999 AK901: A accepted, E accepted with errors, R rejected")
+    claims: List[ClaimStatus] = Field(default_factory=list, description="Per-claim 277CA statuses")
+    error: Optional[str] = Field(None, description="Transport or HTTP error when submission failed")
+
+    @property
+    def accepted(self) -> bool:
+        return self.error is None and self.ack_status in ("A", "E")
+
+
+def _segments(x12_text: str) -> List[List[str]]:
+    """Split an X12 document into segments of elements."""
+    return [
+        segment.strip().split(ELEMENT_SEPARATOR)
+        for segment in x12_text.split(SEGMENT_TERMINATOR)
+        if segment.strip()
+    ]
+
+
+def parse_acknowledgements(x12_text: str) -> Dict[str, object]:
+    """
+    Parse a clearinghouse response containing a 999 and/or a 277CA.
+
+    Args:
+        x12_text: Raw X12 response body.
+
+    Returns:
+        dict: {"ack_status": str, "claims": List[ClaimStatus]}
+    """
+    ack_status = ""
+    claims: List[ClaimStatus] = []
+    transaction = ""
+    current_claim = ""
+    for elements in _segments(x12_text):
+        segment_id = elements[0]
+        if segment_id == "ST":
+            transaction = elements[1] if len(elements) > 1 else ""
+        elif transaction == "999" and segment_id == "AK9" and len(elements) > 1:
+            ack_status = elements[1]
+        elif transaction == "277" and segment_id == "TRN" and len(elements) > 2 and elements[1] == "2":
+            # TRN*2 starts a claim-level loop (2200D) identified by the patient control number
+            current_claim = elements[2]
+        elif transaction == "277" and segment_id == "STC" and current_claim and len(elements) > 1:
+            category, _, status = elements[1].partition(":")
+            status = status.split(":")[0]
+            claims.append(ClaimStatus(
+                patient_control_number=current_claim,
+                category_code=category,
+                status_code=status,
+                accepted=category in ACCEPTED_CATEGORY_CODES,
+            ))
+            current_claim = ""
+    return {"ack_status": ack_status, "claims": claims}
+
+
+class ClearinghouseClient:
+    """
+    Asyncio client for submitting 837I files and individual claims.
+
+    A single pooled httpx.AsyncClient is shared by all submissions, a
+    semaphore bounds how many are in flight, and transient failures
+    (connection errors, timeouts, 429/5xx) are retried with exponential
+    backoff and jitter, honouring Retry-After when the server sends it.
+
+    Use as an async context manager:
+
+        async with ClearinghouseClient("http://127.0.0.1:8837") as client:
+            results = await client.submit_claims(claims)
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        submit_path: str = "/submit",
+        max_connections: int = 16,
+        max_concurrency: int = 8,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 8.0,
+        timeout: float = 30.0,
+        envelope: Optional[X12Envelope] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.submit_path = submit_path
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.envelope = envelope or X12Envelope()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._timeout = httpx.Timeout(timeout)
+        self._headers = {"Content-Type": "application/edi-x12", **(headers or {})}
+        self._client: Optional[httpx.AsyncClient] = None
+        # Control numbers for single-claim interchanges must be unique per client
+        self._control_numbers = itertools.count(self.envelope.first_control_number)
+
+    async def __aenter__(self) -> "ClearinghouseClient":
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url, limits=self._limits, timeout=self._timeout, headers=self._headers,
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---------------- Submissions ---------------- #
+    async def submit_file(self, path: str) -> SubmissionResult:
+        """Submit an existing 837I file as-is."""
+        with open(path, "rb") as edi_file:
+            payload = edi_file.read()
+        return await self.submit_payload(payload, submission_id=path)
+
+    async def submit_claim(self, claim: UB04Claim) -> SubmissionResult:
+        """Render one claim as its own 837I interchange and submit it."""
+        control_number = next(self._control_numbers)
+        envelope = self.envelope.model_copy(update={"first_control_number": control_number})
+        buffer = io.StringIO()
+        X12_837IWriter(envelope=envelope, batch_size=1).write([claim], buffer)
+        return await self.submit_payload(
+            buffer.getvalue().encode("ascii", errors="replace"),
+            submission_id=claim.visit.patient_control_number,
+        )
+
+    async def submit_claims(self, claims: Iterable[UB04Claim]) -> List[SubmissionResult]:
+        """Submit claims individually and concurrently; results keep input order."""
+        return await asyncio.gather(*(self.submit_claim(claim) for claim in claims))
+
+    async def submit_files(self, paths: Iterable[str]) -> List[SubmissionResult]:
+        """Submit several 837I files concurrently; results keep input order."""
+        return await asyncio.gather(*(self.submit_file(path) for path in paths))
+
+    async def submit_payload(self, payload: bytes, submission_id: str) -> SubmissionResult:
+        """POST a raw 837I payload with bounded concurrency and retries."""
+        if self._client is None:
+            raise RuntimeError("ClearinghouseClient must be used inside 'async with'")
+
+        result = SubmissionResult(submission_id=submission_id)
+        started = time.perf_counter()
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                result.attempts = attempt + 1
+                retry_after: Optional[float] = None
+                try:
+                    response = await self._client.post(self.submit_path, content=payload)
+                    result.http_status = response.status_code
+                    if response.status_code < 400:
+                        parsed = parse_acknowledgements(response.text)
+                        result.ack_status = parsed["ack_status"]
+                        result.claims = parsed["claims"]
+                        result.error = None
+                        break
+                    result.error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        break
+                    retry_after = _retry_after_seconds(response)
+                except httpx.TransportError as e:
+                    result.error = f"{type(e).__name__}: {e}"
+
+                if attempt < self.max_retries:
+                    await asyncio.sleep(retry_after if retry_after is not None else self._backoff(attempt))
+
+        result.elapsed_seconds = round(time.perf_counter() - started, 4)
+        return result
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
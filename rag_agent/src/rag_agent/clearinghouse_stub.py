@@ -0,0 +1,146 @@
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+from rag_agent.x12 import ELEMENT_SEPARATOR, SEGMENT_TERMINATOR
+
+
+class StubSettings:
+    """Behaviour knobs for the local stub clearinghouse."""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, reject_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency            # seconds added to every response
+        self.failure_rate = failure_rate  # share of requests answered with HTTP 503
+        self.reject_rate = reject_rate    # share of claims rejected in the 277CA
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.claims = 0
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return self.random.random() < rate
+
+
+def _segment(*elements: str) -> str:
+    return ELEMENT_SEPARATOR.join(elements) + SEGMENT_TERMINATOR
+
+
+def build_acknowledgements(x12_text: str, settings: StubSettings) -> str:
+    """
+    Build a 999 and a 277CA for a submitted 837I.
+
+    Every claim (CLM01) gets an STC: A1:20 when accepted, A7:21 when the stub
+    decides to reject it.
+    """
+    group_control, transaction_control = "", ""
+    claims: List[Tuple[str, str]] = []
+    for raw in x12_text.split(SEGMENT_TERMINATOR):
+        elements = raw.strip().split(ELEMENT_SEPARATOR)
+        if elements[0] == "GS" and len(elements) > 6:
+            group_control = elements[6]
+        elif elements[0] == "ST" and len(elements) > 2:
+            transaction_control = elements[2]
+        elif elements[0] == "CLM" and len(elements) > 2:
+            claims.append((elements[1], elements[2]))
+
+    today = datetime.now().strftime("%Y%m%d")
+    ack_status = "A" if claims else "R"
+    segments = [
+        _segment("ST", "999", "0001", "005010X231A1"),
+        _segment("AK1", "HC", group_control, "005010X223A2"),
+        _segment("AK2", "837", transaction_control, "005010X223A2"),
+        _segment("IK5", ack_status),
+        _segment("AK9", ack_status, "1", "1", "1" if ack_status == "A" else "0"),
+        _segment("SE", "6", "0001"),
+        _segment("ST", "277", "0002", "005010X214"),
+        _segment("BHT", "0085", "08", group_control, today, "0000", "TH"),
+    ]
+    for patient_control_number, amount in claims:
+        rejected = settings.roll(settings.reject_rate)
+        segments.append(_segment("TRN", "2", patient_control_number))
+        segments.append(_segment("STC", "A7:21" if rejected else "A1:20", today, "WQ" if not rejected else "U", amount))
+    segments.append(_segment("SE", str(len(segments) - 6 + 1), "0002"))
+    with settings.lock:
+        settings.claims += len(claims)
+    return "\n".join(segments) + "\n"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive, so client-side pooling is exercised
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    settings: StubSettings = StubSettings()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("ascii", errors="replace")
+        settings = self.settings
+        with settings.lock:
+            settings.requests += 1
+        if settings.latency:
+            time.sleep(settings.latency)
+
+        if settings.roll(settings.failure_rate):
+            with settings.lock:
+                settings.failures += 1
+            self._reply(503, "Service temporarily unavailable", {"Retry-After": "0"})
+            return
+        self._reply(200, build_acknowledgements(body, settings))
+
+    def _reply(self, status: int, text: str, headers: Optional[dict] = None):
+        payload = text.encode("ascii")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/edi-x12")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0,
+                      settings: Optional[StubSettings] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the stub clearinghouse in a daemon thread.
+
+    Args:
+        host: Interface to bind (loopback by default).
+        port: Port to bind; 0 picks a free one.
+        settings: Latency/failure/rejection behaviour.
+
+    Returns:
+        (server, base_url): Call server.shutdown() when done.
+    """
+    handler = type("StubHandler", (_StubHandler,), {"settings": settings or StubSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub clearinghouse for 837I submissions.")
+    parser.add_argument("--port", type=int, default=8837)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = start_stub_server(port=args.port, settings=StubSettings(
+        latency=args.latency, failure_rate=args.failure_rate, reject_rate=args.reject_rate,
+    ))
+    print(f"Stub clearinghouse listening on {url}/submit")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,5 +1,6 @@
 from crewai import Agent, Crew, Process, Task
-from crewai.project import CrewBase, agent, crew, task
+from crewai.project import CrewBase, agent, crew, task, before_kickoff, after_kickoff
+from crewai.project import llm as llm_route
 from crewai.memory import LongTermMemory
 from crewai.memory.storage.ltm_sqlite_storage import LTMSQLiteStorage
 from .tools.csv_tool import CSVKnowledgeTool
@@ -7,7 +8,16 @@ from .tools.pdf_tool import PDFFormFillerTool
 from dotenv import load_dotenv
 from crewai import LLM 
 from rag_agent.models import UB04Claim 
+from pydantic import ValidationError
+from rag_agent.usage import ClaimUsageTracker
+from rag_agent.hedging import HedgedLLM, end_claim_deadline, start_claim_deadline
+from rag_agent.routing import PassThroughToolLLM, RoutedLLM
+from rag_agent.plan_cache import PlanCache, PlanCachingAgent
+from rag_agent.render_cache import RenderCache
+from rag_agent.memory_profile import memory_profiler
+from rag_agent.structured_output import StructuredOutputConverter, conversion_stats, output_schema_prompt
 import os 
+import time
 
 
 load_dotenv() 
@@ -47,6 +57,36 @@ llm3 = LLM(
     max_tokens=50000
 )
 
+# Agents call llm; a call slower than its recent p95 is hedged to llm2, then llm3
+hedged_llm = HedgedLLM(
+    llm,
+    fallbacks=[llm2, llm3],
+    hedge_percentile=float(os.getenv("RAG_HEDGE_PERCENTILE", "95")),
+    initial_hedge_after=float(os.getenv("RAG_HEDGE_AFTER_SECONDS", "30")),
+)
+agent_llm = hedged_llm if os.getenv("RAG_HEDGING", "1") != "0" else llm
+
+# Small, fast model for steps that only forward data to a tool
+fast_llm = LLM(
+    model="openai/gpt-4.1-mini-2025-04-14",
+    max_tokens=4000,
+    temperature=0.0,
+    seed=42,
+)
+
+# Model routes, chosen per agent with the `llm:` key in config/agents.yaml.
+# RAG_PASSTHROUGH_LLM=stub answers pass-through steps locally without an LLM call.
+llm_routes = {
+    "extraction_llm": RoutedLLM("extraction_llm", agent_llm),
+    "passthrough_llm": RoutedLLM(
+        "passthrough_llm",
+        PassThroughToolLLM() if os.getenv("RAG_PASSTHROUGH_LLM", "fast") == "stub" else fast_llm,
+    ),
+}
+
+# Wall-clock budget per claim; 0 disables it
+claim_deadline_seconds = float(os.getenv("CLAIM_DEADLINE_SECONDS", "300"))
+
 
 # Initialize the tools. The CSV tool is now self-contained and only needs the path.
 
@@ -58,12 +98,39 @@ csv_path = os.path.join(project_root, "knowledge", "ub04_claims.csv")
 knowledge_dir = os.path.join(project_root, "knowledge")
 os.makedirs(knowledge_dir, exist_ok=True)
 
+# RAG_KNOWLEDGE_PATH may point at a directory of per-facility/per-period shards instead
+knowledge_path = os.getenv("RAG_KNOWLEDGE_PATH", csv_path)
+
+# "numpy" keeps a flat memory-mapped index next to the CSV instead of ChromaDB
+vector_backend = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+
 csv_tool = CSVKnowledgeTool(
-    csv_path=csv_path
+    csv_path=knowledge_path,
+    vector_backend=vector_backend,
+    # Newest periods per facility loaded at startup; 0 loads the whole archive
+    active_periods=int(os.getenv("RAG_ACTIVE_PERIODS", "1")) or None,
+    # Parallel workers set RAG_READ_ONLY=1 to open an index built beforehand (see main.build_index)
+    read_only=os.getenv("RAG_READ_ONLY", "0") == "1"
 )
 
 pdf_tool = PDFFormFillerTool()
 
+# Per-claim token accounting is appended here, one JSON record per claim
+usage_log_path = os.path.join(project_root, "src", "output", "claim_usage.jsonl")
+
+# Reasoning plans are made once per task template and reused across claims; RAG_PLAN_CACHE=0 plans every run
+plan_cache = (
+    PlanCache(os.path.join(custom_storage_path, "reasoning_plans.json"))
+    if os.getenv("RAG_PLAN_CACHE", "1") != "0" else None
+)
+
+# Rendered PDFs keyed by claim content, template and field map; RAG_RENDER_CACHE=0 always runs the crew
+render_cache = (
+    RenderCache(os.path.join(project_root, "src", "output", "render_cache"),
+                max_bytes=int(os.getenv("RAG_RENDER_CACHE_MB", "256")) * 1024 * 1024)
+    if os.getenv("RAG_RENDER_CACHE", "1") != "0" else None
+)
+
 
 @CrewBase
 class UB04ClaimBuilderCrew():
@@ -73,35 +140,138 @@ class UB04ClaimBuilderCrew():
     agents_config = "config/agents.yaml"
     tasks_config = "config/tasks.yaml"
 
+    def __init__(self):
+        # Token usage of the most recent kickoff, per task and per agent
+        self.usage_tracker = ClaimUsageTracker(log_path=usage_log_path, conversion_stats=conversion_stats)
+        self.last_usage = None
+        # Set when the last build_claim was answered from the render cache: the claim it rendered
+        self.served_from_cache = False
+        self.cached_claim = None
+        # Called with each TaskOutput as soon as its task finishes (progress, partial results)
+        self.task_listeners = []
+
+    # ---------------- Hooks ---------------- #
+    @before_kickoff
+    def start_usage_tracking(self, inputs):
+        self.usage_tracker.start(inputs or {}, self.agents)
+        start_claim_deadline(claim_deadline_seconds)
+        return inputs
+
+    @after_kickoff
+    def finish_usage_tracking(self, result):
+        end_claim_deadline()
+        self.last_usage = self.usage_tracker.finish()
+        return result
+
+    def task_finished(self, task_output):
+        """Crew task callback: record usage, then notify the task listeners."""
+        self.usage_tracker.record_task(task_output)
+        for listener in self.task_listeners:
+            listener(task_output)
+
+    def run_claim(self, inputs):
+        """
+        Kick off the crew for one claim. A run that raises (for example when
+        the claim deadline is exceeded) is still recorded in the usage log.
+        """
+        try:
+            with memory_profiler.stage("crew_kickoff"):
+                return self.crew().kickoff(inputs=inputs)
+        except Exception as e:
+            end_claim_deadline()
+            self.last_usage = self.usage_tracker.fail(e)
+            raise
+
+    def build_claim(self, inputs):
+        """
+        Produce the claim PDF for inputs["patient_name"] at pdf_tool.output_path.
+
+        An unchanged claim (same source row, template, field map and save
+        profile) is copied from the render cache without running the crew;
+        anything else runs run_claim and stores the new PDF.
+        """
+        try:
+            self.served_from_cache, self.cached_claim = False, None
+            key = None
+            if render_cache is not None:
+                # Only claims resolvable without the agents (a confident name match) can be keyed up front
+                claim = csv_tool.source_claim(inputs["patient_name"])
+                if claim is not None:
+                    key = RenderCache.key(claim, pdf_tool.render_fingerprint(), pdf_tool.save_profile)
+            if key is not None and render_cache.fetch(key, pdf_tool.output_path):
+                self.served_from_cache, self.cached_claim = True, claim
+                self.last_usage = None
+                print(f"Render cache: reused PDF for {inputs['patient_name']} ({key[:12]})")
+                return f"Successfully reused the rendered PDF and saved to '{pdf_tool.output_path}' (render cache)"
+
+            started = time.time()
+            result = self.run_claim(inputs)
+            if key is not None and self._rendered_key(started) == key:
+                render_cache.put(key, pdf_tool.output_path)
+            return result
+        finally:
+            # One memory report per claim when RAG_MEMORY_PROFILE=1 (stages since the previous claim)
+            memory_profiler.write_report(f"claim:{inputs['patient_name']}")
+
+    @staticmethod
+    def _rendered_key(started: float):
+        """
+        Render cache key of the PDF the crew filled since `started`, or None
+        when no fill succeeded since then or its data does not fit the claim
+        model. The PDF is only cached when this equals the source row's key,
+        so a failed or diverging render is never served for that row.
+        """
+        render = pdf_tool.last_render
+        if render is None or render.finished_at < started or render.path != pdf_tool.output_path:
+            return None
+        try:
+            claim = UB04Claim.model_validate(render.claim_data)
+        except ValidationError:
+            return None
+        return RenderCache.key(claim, pdf_tool.render_fingerprint(), pdf_tool.save_profile)
+
+    # ---------------- LLM routes ---------------- #
+    @llm_route
+    def extraction_llm(self):
+        return llm_routes["extraction_llm"]
+
+    @llm_route
+    def passthrough_llm(self):
+        return llm_routes["passthrough_llm"]
+
     # ---------------- Agents ---------------- #
     @agent
     def ehr_interface_specialist(self) -> Agent:
-        return Agent(
+        return PlanCachingAgent(
             config=self.agents_config['ehr_interface_specialist'],  # type: ignore[index]
             verbose=True,
             tools=[csv_tool], 
             max_rpm=30,
             max_iter=4,
-            llm=llm
+            plan_cache=plan_cache,
         )
     
     @agent
     def reporting_agent(self) -> Agent:
-        return Agent(
+        return PlanCachingAgent(
             config=self.agents_config['reporting_agent'],  # type: ignore[index]
             verbose=True,
             tools=[pdf_tool],  
             max_rpm=40,
             max_iter=4,
-            llm=llm
+            plan_cache=plan_cache,
         ) 
 
     # ---------------- Tasks ---------------- #
     @task
     def gather_encounter_data(self) -> Task:
+        config = self.tasks_config['gather_encounter_data']  # type: ignore[index]
         return Task(
-            config=self.tasks_config['gather_encounter_data'],  # type: ignore[index]
-            output_pydantic=UB04Claim
+            config=config,
+            # The schema in the prompt is generated from the same model the output is parsed into
+            expected_output=f"{config['expected_output'].strip()}\n{output_schema_prompt(UB04Claim)}",
+            output_pydantic=UB04Claim,
+            converter_cls=StructuredOutputConverter,
         )
 
     @task
@@ -118,6 +288,7 @@ class UB04ClaimBuilderCrew():
             tasks=self.tasks,
             process=Process.sequential,
             verbose=True,
+            task_callback=self.task_finished,
             long_term_memory=LongTermMemory(
                 storage=LTMSQLiteStorage(
                     db_path="memory/rag_memory.db"
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import math
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+DEFAULT_FIELD_MAP_PATH = os.path.join(os.path.dirname(__file__), "config", "ub04_field_map.yaml")
+
+
+def _compile_path(path: str) -> Callable[[Any], str]:
+    """A getter for a dotted path into the claim JSON; missing values render as ""."""
+    keys = tuple(path.split("."))
+
+    def get(data: Any) -> str:
+        for key in keys:
+            if not isinstance(data, dict):
+                return ""
+            data = data.get(key)
+        return "" if data is None else str(data)
+
+    return get
+
+
+def _compile_fields(fields: Dict[str, str], widget_names: Iterable[str], section: str) -> List[Tuple[str, Callable]]:
+    missing = sorted(set(fields) - set(widget_names))
+    if missing:
+        raise ValueError(f"Field map {section} names fields the template does not have: {missing}")
+    return [(field, _compile_path(path)) for field, path in fields.items()]
+
+
+class FieldMap:
+    """
+    A declarative UB-04 field map, compiled against the template's widgets.
+
+    `flatten` turns one claim into the field values of each form page: the
+    header fields on every page, up to `lines_per_page` service lines per page
+    and the footer fields on the last page. Compilation resolves every path
+    and field name once, so flattening a claim is a single pass of dict
+    lookups, and fails (ValueError) when the spec names a field the template
+    does not have.
+    """
+
+    def __init__(self, spec: Dict[str, Any], widget_names: Iterable[str]):
+        widget_names = set(widget_names)
+        self.version = spec.get("version", 1)
+        self.fingerprint = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+        self._header = _compile_fields(spec.get("header") or {}, widget_names, "header")
+        self._footer = _compile_fields(spec.get("footer") or {}, widget_names, "footer")
+
+        lines = spec.get("lines") or {}
+        self._lines_key = lines.get("source")
+        patterns = lines.get("fields") or {}
+        unnumbered = [pattern for pattern in patterns if "{n}" not in pattern]
+        if unnumbered:
+            raise ValueError(f"Field map line fields must contain {{n}}: {unnumbered}")
+
+        # Rows per page: how many consecutive numbered rows the template has all fields for
+        self.lines_per_page = 0
+        while patterns and all(pattern.format(n=self.lines_per_page + 1) in widget_names for pattern in patterns):
+            self.lines_per_page += 1
+        if patterns and self.lines_per_page == 0:
+            raise ValueError(f"Template has no complete service line for fields {sorted(patterns)}")
+        self._line_fields = [
+            (tuple(pattern.format(n=row) for row in range(1, self.lines_per_page + 1)), _compile_path(path))
+            for pattern, path in patterns.items()
+        ]
+
+    @property
+    def key(self) -> str:
+        """Identifies what the map renders; changes whenever the spec does."""
+        return f"v{self.version}-{self.fingerprint[:16]}"
+
+    def page_count(self, claim: Dict[str, Any]) -> int:
+        lines = self._lines(claim)
+        return max(1, math.ceil(len(lines) / self.lines_per_page)) if self.lines_per_page else 1
+
+    def _lines(self, claim: Dict[str, Any]) -> List[Any]:
+        if not self._lines_key:
+            return []
+        lines = claim
+        for key in self._lines_key.split("."):
+            lines = lines.get(key) if isinstance(lines, dict) else None
+        return lines if isinstance(lines, list) else []
+
+    def flatten(self, claim: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Field values of every page of a claim.
+
+        Args:
+            claim: Claim JSON (UB04Claim.model_dump(mode="json") or the agent's dict).
+
+        Returns:
+            One {field name: value} dict per page, in page order.
+        """
+        header = {field: get(claim) for field, get in self._header}
+        lines = self._lines(claim)
+        per_page = self.lines_per_page or 1
+        pages = []
+        for page in range(self.page_count(claim)):
+            values = dict(header)
+            for row, line in enumerate(lines[page * per_page:(page + 1) * per_page]):
+                for names, get in self._line_fields:
+                    values[names[row]] = get(line)
+            pages.append(values)
+        pages[-1].update((field, get(claim)) for field, get in self._footer)
+        return pages
+
+
+def load_field_map(widget_names: Iterable[str], path: Optional[str] = None) -> FieldMap:
+    """
+    Read a field-map spec and compile it against the template's widget names.
+
+    Args:
+        widget_names: Field names of the template page the map fills.
+        path: YAML spec; defaults to config/ub04_field_map.yaml.
+
+    Returns:
+        FieldMap: Compiled map. Raises ValueError when the spec does not fit the template.
+    """
+    with open(path or DEFAULT_FIELD_MAP_PATH, "r", encoding="utf-8") as spec_file:
+        spec = yaml.safe_load(spec_file)
+    return FieldMap(spec, widget_names)
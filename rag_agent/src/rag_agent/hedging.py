@@ -0,0 +1,275 @@
+import contextvars
+import copy
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+from crewai.llms.base_llm import BaseLLM
+from litellm.integrations.custom_logger import CustomLogger
+
+from rag_agent.usage import latency_percentiles
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a claim has used up its latency budget."""
+
+
+class ClaimDeadline:
+    """Wall-clock latency budget for one claim run."""
+
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.started = time.perf_counter()
+
+    def remaining(self) -> float:
+        return max(0.0, self.budget_seconds - (time.perf_counter() - self.started))
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+
+# Deadline of the claim running in the current thread (crew runs are sequential per thread)
+_current_deadline: contextvars.ContextVar[Optional[ClaimDeadline]] = contextvars.ContextVar(
+    "claim_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[ClaimDeadline]:
+    return _current_deadline.get()
+
+
+def start_claim_deadline(budget_seconds: Optional[float]) -> Optional[ClaimDeadline]:
+    """Start the budget of the claim about to run in this thread; None or 0 disables it."""
+    deadline = ClaimDeadline(budget_seconds) if budget_seconds else None
+    _current_deadline.set(deadline)
+    return deadline
+
+
+def end_claim_deadline() -> None:
+    _current_deadline.set(None)
+
+
+@contextmanager
+def claim_deadline(budget_seconds: Optional[float]) -> Iterator[Optional[ClaimDeadline]]:
+    """Run a block under a claim deadline, restoring the previous one afterwards."""
+    token = _current_deadline.set(ClaimDeadline(budget_seconds) if budget_seconds else None)
+    try:
+        yield _current_deadline.get()
+    finally:
+        _current_deadline.reset(token)
+
+
+def _is_valid_response(response: Any) -> bool:
+    if response is None:
+        return False
+    return bool(response.strip()) if isinstance(response, str) else True
+
+
+class _CallbackGate:
+    """Open while a hedged call waits for its answer, closed once the call has returned."""
+
+    def __init__(self, on_late_usage):
+        self._lock = threading.Lock()
+        self._open = True
+        self._on_late_usage = on_late_usage
+
+    def close(self) -> None:
+        with self._lock:
+            self._open = False
+
+    def wrap(self, callbacks: Optional[List[Any]]) -> Optional[List[Any]]:
+        if not callbacks:
+            return callbacks
+        return [_GatedCallback(callback, self) if hasattr(callback, "log_success_event") else callback
+                for callback in callbacks]
+
+    def forward(self, callback: Any, kwargs: Any, response_obj: Any, start_time: Any, end_time: Any) -> None:
+        with self._lock:
+            if self._open:
+                callback.log_success_event(kwargs=kwargs, response_obj=response_obj,
+                                           start_time=start_time, end_time=end_time)
+                return
+        self._on_late_usage(response_obj)
+
+
+class _GatedCallback(CustomLogger):
+    """
+    A caller's usage callback (crewAI's TokenCalcHandler) as seen by one
+    attempt. An abandoned attempt that answers after the hedged call returned
+    would otherwise add its tokens to whatever task or claim the agent runs
+    by then; those tokens go to the hedging stats instead.
+    """
+
+    def __init__(self, callback: Any, gate: _CallbackGate):
+        super().__init__()
+        self.callback = callback
+        self.gate = gate
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        self.gate.forward(self.callback, kwargs, response_obj, start_time, end_time)
+
+
+class HedgedLLM(BaseLLM):
+    """
+    An LLM that hedges slow completions across fallback models.
+
+    Every call goes to the primary model first. If it has not answered
+    within the `hedge_percentile` latency of its recent successful calls
+    (`initial_hedge_after` seconds until `min_samples` calls are recorded),
+    the same request is also sent to the next fallback; a failed or empty
+    answer moves on to the next model at once. The first valid response
+    wins and the others are abandoned.
+
+    Calls also respect the deadline of the claim running in the current
+    thread (see `claim_deadline`): each attempt is given the remaining budget
+    as its HTTP timeout, so abandoned requests are cut off by the client
+    instead of running on, and once the budget is spent DeadlineExceeded is
+    raised so the crew run fails fast instead of stalling the batch. Without
+    a deadline, attempts time out after `attempt_timeout_factor` times the
+    hedge delay. Tokens of attempts that answer after the call has returned
+    are not charged to the caller; they are counted as `abandoned_tokens`.
+    """
+
+    def __init__(self, primary: Any, fallbacks: Sequence[Any] = (), hedge_percentile: float = 95.0,
+                 min_samples: int = 20, initial_hedge_after: float = 30.0, max_samples: int = 500,
+                 attempt_timeout_factor: float = 4.0):
+        super().__init__(model=primary.model, temperature=primary.temperature)
+        self.models: List[Any] = [primary, *fallbacks]
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.initial_hedge_after = initial_hedge_after
+        self.attempt_timeout_factor = attempt_timeout_factor
+        self._latencies: "deque[float]" = deque(maxlen=max_samples)  # successful primary calls
+        self._counters = {"calls": 0, "hedged": 0, "fallback_wins": 0, "failed_attempts": 0,
+                          "deadline_exceeded": 0, "abandoned_tokens": 0}
+        self._lock = threading.Lock()
+
+    # ---------------- crewAI LLM interface ---------------- #
+    def supports_function_calling(self) -> bool:
+        return all(model.supports_function_calling() for model in self.models)
+
+    def supports_stop_words(self) -> bool:
+        return True  # forwarded to the models that support them
+
+    def get_context_window_size(self) -> int:
+        return self.models[0].get_context_window_size()
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        deadline = current_deadline()
+        self._count("calls")
+        if deadline is not None and deadline.expired:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(f"Claim deadline of {deadline.budget_seconds:g}s exceeded")
+
+        results: "queue.Queue" = queue.Queue()
+        errors: List[Exception] = []
+        launched = 0
+        gate = _CallbackGate(self._count_late_usage)
+        attempt_callbacks = gate.wrap(callbacks)
+
+        def launch() -> None:
+            nonlocal launched
+            timeout = deadline.remaining() if deadline is not None else self.attempt_timeout()
+            request = (copy.deepcopy(messages), tools, attempt_callbacks, available_functions)
+            threading.Thread(
+                target=self._attempt, args=(launched, timeout, request, results),
+                name=f"llm-attempt-{launched}", daemon=True,
+            ).start()
+            launched += 1
+
+        try:
+            launch()
+            hedge_at = time.perf_counter() + self.hedge_after()
+            while True:
+                wait = max(0.0, hedge_at - time.perf_counter()) if launched < len(self.models) else None
+                if deadline is not None:
+                    wait = deadline.remaining() if wait is None else min(wait, deadline.remaining())
+                try:
+                    index, response, error = results.get(timeout=wait)
+                except queue.Empty:
+                    if deadline is not None and deadline.expired:
+                        self._count("deadline_exceeded")
+                        raise DeadlineExceeded(f"Claim deadline of {deadline.budget_seconds:g}s exceeded")
+                    # The primary is slower than usual: race the next model against it
+                    self._count("hedged")
+                    launch()
+                    hedge_at = time.perf_counter() + self.hedge_after()
+                    continue
+
+                if error is None:
+                    if index > 0:
+                        self._count("fallback_wins")
+                    return response
+                self._count("failed_attempts")
+                errors.append(error)
+                if launched < len(self.models):
+                    launch()
+                    hedge_at = time.perf_counter() + self.hedge_after()
+                elif len(errors) == launched:
+                    raise errors[0]
+        finally:
+            gate.close()
+
+    # ---------------- Hedging ---------------- #
+    def hedge_after(self) -> float:
+        """Seconds to wait for the primary before sending a hedged request."""
+        with self._lock:
+            samples = list(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.initial_hedge_after
+        return float(np.percentile(samples, self.hedge_percentile))
+
+    def attempt_timeout(self) -> float:
+        """HTTP timeout of an attempt when no claim deadline bounds it."""
+        return self.attempt_timeout_factor * self.hedge_after()
+
+    def _attempt(self, index: int, timeout: Optional[float], request: tuple, results: "queue.Queue") -> None:
+        messages, tools, callbacks, available_functions = request
+        # A per-attempt copy carries this call's stop words and timeout without touching the shared client
+        model = copy.copy(self.models[index])
+        if model.supports_stop_words():
+            model.stop = list(self.stop or [])
+        if timeout is not None:
+            model.timeout = min(model.timeout, timeout) if getattr(model, "timeout", None) else timeout
+        started = time.perf_counter()
+        try:
+            response = model.call(messages, tools=tools, callbacks=callbacks,
+                                  available_functions=available_functions)
+            error = None if _is_valid_response(response) else ValueError(f"Empty response from {model.model}")
+        except Exception as e:
+            response, error = None, e
+        if index == 0 and error is None:
+            with self._lock:
+                self._latencies.append(time.perf_counter() - started)
+        results.put((index, response, error))
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
+
+    def _count_late_usage(self, response_obj: Any) -> None:
+        usage = response_obj.get("usage") if isinstance(response_obj, dict) else None
+        self._count("abandoned_tokens", getattr(usage, "total_tokens", 0) or 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Call counters and the primary's recent latency percentiles."""
+        with self._lock:
+            counters = dict(self._counters)
+            samples = list(self._latencies)
+        return {
+            **counters,
+            "models": [model.model for model in self.models],
+            "hedge_after_seconds": round(self.hedge_after(), 3),
+            "primary_latency": latency_percentiles(samples),
+        }
@@ -0,0 +1,580 @@
+import bisect
+import hashlib
+import heapq
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from rag_agent.claim_index import MISSING_DAY, PatientClaimIndex, _claim_days, query_day
+from rag_agent.claim_table import ClaimRecord, ClaimTable
+from rag_agent.memory_profile import memory_profiler
+from rag_agent.name_index import NameCandidate, NameIndex, NameSearchResult, normalize_name
+from rag_agent.vector_store import (Metadata, VectorStore, Where, create_vector_store, metadata_columns,
+                                    where_mask)
+
+SHARD_EXTENSIONS = (".csv", ".parquet")
+
+# ChromaDB location, relative to the knowledge directory
+DEFAULT_DB_PATH = os.path.join("db", "chroma")
+
+_NON_KEY = re.compile(r"[^a-z0-9]+")
+
+
+def facility_key(name: str) -> str:
+    """Routing key for a facility: 'Sunrise Care Home' and 'sunrise_care_home' are the same."""
+    return _NON_KEY.sub("_", str(name).lower()).strip("_")
+
+
+class ShardInfo(NamedTuple):
+    """One claims extract file and its partition keys."""
+    path: str
+    facility: str  # facility_key of the partition directory, "" for files at the top level
+    period: str    # file name stem, e.g. "2025-04"
+
+
+def discover_shards(path: str) -> List[ShardInfo]:
+    """
+    List the shards of a knowledge base.
+
+    A single file is a knowledge base with one shard. A directory is expected
+    to hold one sub-directory per facility with one file per period:
+
+        knowledge/shards/sunrise_care_home/2025-04.csv
+        knowledge/shards/sunrise_care_home/2025-05.parquet
+        knowledge/shards/oak_valley/2025-05.csv
+
+    Files directly inside the directory become shards without a facility.
+    Hidden and editor lock files ("." or "~" prefix) are skipped.
+    """
+    if os.path.isfile(path):
+        return [ShardInfo(os.path.abspath(path), "", "")]
+    shards = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))  # skip saved vector indexes
+        relative = os.path.relpath(root, path)
+        facility = "" if relative == "." else facility_key(relative.split(os.sep)[0])
+        for file_name in sorted(files):
+            stem, extension = os.path.splitext(file_name)
+            if extension.lower() in SHARD_EXTENSIONS and not file_name.startswith((".", "~")):
+                shards.append(ShardInfo(os.path.abspath(os.path.join(root, file_name)), facility, stem))
+    return shards
+
+
+def knowledge_dir(path: str) -> str:
+    """Directory a knowledge base lives in: the shard directory, or the folder of a single CSV."""
+    path = os.path.abspath(path)
+    return os.path.dirname(path) if os.path.isfile(path) else path
+
+
+def resolve_db_path(knowledge_path: str, db_path: Optional[str] = None) -> str:
+    """
+    Absolute ChromaDB directory for a knowledge base.
+
+    Relative paths (and the default, db/chroma) are resolved against the
+    knowledge directory rather than the working directory, so the app,
+    the CLI and workers started from any folder share one store.
+    """
+    db_path = db_path or DEFAULT_DB_PATH
+    if os.path.isabs(db_path):
+        return db_path
+    return os.path.join(knowledge_dir(knowledge_path), db_path)
+
+
+def load_claim_table(path: str) -> ClaimTable:
+    if path.lower().endswith(".parquet"):
+        return ClaimTable.from_parquet(path)
+    return ClaimTable.from_csv(path)
+
+
+def claim_documents(table: ClaimTable) -> List[str]:
+    """The text embedded for each row of a claim table."""
+    return [
+        (
+            f"Patient Name: {first_name} {last_name}. "
+            f"Medical Record Number: {mrn}. "
+            f"Payer: {payer}. "
+            f"Admission Date: {admission_date}."
+        )
+        for first_name, last_name, mrn, payer, admission_date in zip(
+            table.column('PatientFirstName'), table.column('PatientLastName'),
+            table.column('MedicalRecordNumber'), table.column('PrimaryPayerName'),
+            table.column('AdmissionDate'),
+        )
+    ]
+
+
+def claim_metadata(table: ClaimTable, rows: Optional[Sequence[int]] = None, facility: str = "") -> List[Metadata]:
+    """
+    The typed metadata stored with each row's vector, for claim_where() filters.
+
+    Keys: "facility" (the shard's facility partition, else the facility_key of
+    FacilityName), "payer" (facility_key of PrimaryPayerName), "mrn", and
+    "admission_day"/"discharge_day" as days since 1970-01-01 so date ranges
+    are numeric comparisons. A claim without a discharge date covers its
+    admission day only; missing dates are MISSING_DAY.
+
+    Args:
+        table: The shard's claim table.
+        rows: Only these row numbers (default: every row, in order).
+        facility: The shard's facility key ("" for shards without one).
+    """
+    columns = ('FacilityName', 'PrimaryPayerName', 'MedicalRecordNumber', 'AdmissionDate', 'DischargeDate')
+    if rows is None:
+        values = [table.column(column) for column in columns]
+    else:
+        records = table.records(rows)
+        values = [[record[column] for record in records] for column in columns]
+    facilities, payers, mrns = values[0], values[1], values[2]
+    admitted, discharged = _claim_days(values[3]), _claim_days(values[4])
+    discharged = [admission if discharge == MISSING_DAY else discharge
+                  for admission, discharge in zip(admitted.tolist(), discharged.tolist())]
+    return [
+        {
+            "facility": facility or facility_key(facility_name or ""),
+            "payer": facility_key(payer or ""),
+            "mrn": str(mrn).strip() if mrn is not None else "",
+            "admission_day": admission,
+            "discharge_day": discharge,
+        }
+        for facility_name, payer, mrn, admission, discharge in zip(facilities, payers, mrns, admitted.tolist(), discharged)
+    ]
+
+
+def claim_where(facility: Optional[str] = None, payer: Optional[str] = None, mrn: Optional[str] = None,
+                start: Optional[str] = None, end: Optional[str] = None) -> Optional[Where]:
+    """
+    A Chroma `where` clause over claim_metadata(), or None when nothing is filtered.
+
+    Args:
+        facility: Facility name or key.
+        payer: Primary payer name (case and punctuation are ignored).
+        mrn: Medical Record Number.
+        start: Claims whose service period ends on or after this date (see claim_index.query_day).
+        end: Claims whose service period starts on or before this date.
+    """
+    first, last = query_day(start), query_day(end, end=True)
+    conditions: List[Where] = []
+    if facility:
+        conditions.append({"facility": facility_key(facility)})
+    if payer:
+        conditions.append({"payer": facility_key(payer)})
+    if mrn:
+        conditions.append({"mrn": str(mrn).strip()})
+    if first is not None:
+        conditions.append({"discharge_day": {"$gte": first}})
+    if last is not None:
+        conditions.append({"admission_day": {"$lte": last}})
+    if first is not None or last is not None:
+        conditions.append({"admission_day": {"$ne": int(MISSING_DAY)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class KnowledgeShard:
+    """A loaded shard: its claim table, name index, per-patient claim index and vector store."""
+
+    def __init__(self, info: ShardInfo, base: int, table: ClaimTable, name_index: NameIndex,
+                 vector_store: Optional[VectorStore], claim_index: Optional[PatientClaimIndex] = None):
+        self.info = info
+        self.base = base  # global row id of this shard's first row
+        self.table = table
+        self.name_index = name_index
+        self.vector_store = vector_store
+        self.claim_index = claim_index or PatientClaimIndex.from_table(table)
+        # Whether vector searches can filter; a read-only store built before metadata existed cannot
+        self.filterable = vector_store is not None and vector_store.has_metadata()
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def filter_rows(self, rows: Sequence[int], where: Optional[Where]) -> List[int]:
+        """The rows (shard row numbers) whose claim_metadata() matches a `where` clause."""
+        rows = [int(row) for row in rows]
+        if not where or not rows:
+            return rows
+        metadatas = claim_metadata(self.table, rows, facility=self.info.facility)
+        keep = where_mask(where, metadata_columns(metadatas), len(rows))
+        return [row for row, kept in zip(rows, keep) if kept]
+
+
+class ShardedKnowledgeBase:
+    """
+    Claims knowledge split into per-facility, per-period shards.
+
+    Only the active shards (the newest `active_periods` periods of every
+    facility; all shards when it is None) are loaded up front, in parallel.
+    Lookups carrying a facility and/or period are routed to the matching
+    shards, which are loaded on first use, so startup and query cost follow
+    the shards in use rather than the whole archive.
+
+    Rows are addressed by global ids: each loaded shard owns the range
+    [base, base + len(shard)).
+
+    Every vector is stored with claim_metadata() (facility, payer, MRN,
+    service dates), so lookups can take a claim_where() filter: it becomes
+    the vector store's `where` clause and is applied to name matches and a
+    patient's claims the same way.
+
+    With read_only=True vector stores are opened as already built: no
+    emptiness check, no indexing and no writes, so several worker processes
+    can serve the same index.
+    """
+
+    def __init__(self, path: str, embedding_function: Callable, vector_backend: str = "chroma",
+                 db_path: Optional[str] = None, collection_name: str = "ub04_claims",
+                 active_periods: Optional[int] = 1, max_workers: Optional[int] = None,
+                 build_vectors: bool = True, read_only: bool = False):
+        self.path = path
+        self.embedding_function = embedding_function
+        self.vector_backend = vector_backend
+        self.db_path = resolve_db_path(path, db_path)
+        self.read_only = read_only
+        self.collection_name = collection_name
+        self.active_periods = active_periods
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) + 4)
+        self.build_vectors = build_vectors
+        self.shard_infos = discover_shards(path)
+        if not self.shard_infos:
+            raise ValueError(f"No claim shards ({', '.join(SHARD_EXTENSIONS)}) found under '{path}'")
+        # Copy on write: changed only under _lock by swapping in new containers,
+        # so lookups on other threads can read them without the lock
+        self._loaded: Dict[str, KnowledgeShard] = {}
+        self._bases: Tuple[List[int], Dict[int, KnowledgeShard]] = ([], {})  # sorted shard bases, for global ids
+        self._next_base = 0
+        self._lock = threading.Lock()
+
+    # ---------------- Loading ---------------- #
+    def active_shards(self) -> List[ShardInfo]:
+        if not self.active_periods:
+            return list(self.shard_infos)
+        periods: Dict[str, List[str]] = {}
+        for info in self.shard_infos:
+            periods.setdefault(info.facility, []).append(info.period)
+        active = {facility: set(sorted(values)[-self.active_periods:]) for facility, values in periods.items()}
+        return [info for info in self.shard_infos if info.period in active[info.facility]]
+
+    def load_active(self) -> List[KnowledgeShard]:
+        """Load the active shards in parallel and return them."""
+        return self.load(self.active_shards())
+
+    def load(self, infos: List[ShardInfo]) -> List[KnowledgeShard]:
+        """Load (or return the already loaded) shards, reading new ones in parallel."""
+        missing = [info for info in infos if info.path not in self._loaded]
+        if missing:
+            started = time.perf_counter()
+            with memory_profiler.stage("csv_load"), \
+                    ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                built = list(pool.map(self._build_shard, missing))
+            with self._lock:
+                for info, parts in zip(missing, built):
+                    if info.path not in self._loaded:
+                        self._swap(self._new_shard(info, *parts))
+            rows = sum(len(parts[0]) for parts in built)
+            print(f"Loaded {len(missing)} knowledge shard(s), {rows} rows, in {time.perf_counter() - started:.2f}s")
+        return [self._loaded[info.path] for info in infos]
+
+    def _new_shard(self, info: ShardInfo, table: ClaimTable, name_index: NameIndex,
+                   vector_store: Optional[VectorStore], claim_index: PatientClaimIndex) -> KnowledgeShard:
+        """A shard with the next free global id range (call with _lock held); global ids are never reused."""
+        shard = KnowledgeShard(info, self._next_base, table, name_index, vector_store, claim_index)
+        self._next_base += len(table)
+        return shard
+
+    def _swap(self, shard: KnowledgeShard, previous: Optional[KnowledgeShard] = None) -> None:
+        """
+        Register a shard, replacing `previous`, in one step (call with _lock held).
+
+        New containers are built and swapped in, never changed in place, so a
+        lookup iterating the old ones is unaffected and never sees the
+        previous shard removed before its replacement is added.
+        """
+        loaded = dict(self._loaded)
+        by_base = dict(self._bases[1])
+        if previous is not None:
+            del by_base[previous.base]
+        loaded[shard.info.path] = shard
+        by_base[shard.base] = shard
+        self._bases = (sorted(by_base), by_base)
+        self._loaded = loaded
+
+    def discover(self) -> List[ShardInfo]:
+        """
+        Shard files currently on disk.
+
+        For a directory knowledge base these are its shards; for a single
+        file, every claims file next to it (new extracts dropped beside the
+        original CSV).
+        """
+        if os.path.isdir(self.path):
+            return discover_shards(self.path)
+        folder = knowledge_dir(self.path)
+        return [
+            ShardInfo(os.path.join(folder, file_name), "", os.path.splitext(file_name)[0])
+            for file_name in sorted(os.listdir(folder))
+            if os.path.splitext(file_name)[1].lower() in SHARD_EXTENSIONS and not file_name.startswith((".", "~"))
+            and os.path.isfile(os.path.join(folder, file_name))
+        ]
+
+    def ingest(self, info: ShardInfo) -> List[int]:
+        """
+        Load a new shard file, or reload one that has grown, and index only its new rows.
+
+        Rows already embedded keep their vectors; the shard is re-registered
+        under a fresh global id range. Lookups running meanwhile keep working
+        on the shard list they routed to: their global ids resolve against
+        those shards (see record), not against the registry.
+
+        Returns:
+            List[int]: Global ids of the rows that were not loaded before.
+            Raises ValueError when a loaded file was rewritten rather than appended to.
+        """
+        table = load_claim_table(info.path)
+        previous = self._loaded.get(info.path)
+        known = len(previous) if previous is not None else 0
+        if previous is not None and (
+            len(table) < known or
+            list(table.column('PatientControlNumber')[:known]) != list(previous.table.column('PatientControlNumber'))
+        ):
+            raise ValueError(f"{info.path} was rewritten, not appended to; rebuild its index to load it")
+        table, name_index, vector_store, claim_index = self._build_shard(info, table)
+        with self._lock:
+            if info.path not in {known_info.path for known_info in self.shard_infos}:
+                self.shard_infos = self.shard_infos + [info]
+            shard = self._new_shard(info, table, name_index, vector_store, claim_index)
+            self._swap(shard, previous)
+        print(f"Ingested {len(shard) - known} new row(s) from {os.path.basename(info.path)}")
+        return list(range(shard.base + known, shard.base + len(shard)))
+
+    def _build_shard(self, info: ShardInfo, table: Optional[ClaimTable] = None
+                     ) -> Tuple[ClaimTable, NameIndex, Optional[VectorStore], PatientClaimIndex]:
+        table = table if table is not None else load_claim_table(info.path)
+        name_index = NameIndex()
+        name_index.add_rows(zip(
+            range(len(table)),
+            [name or "" for name in table.column('PatientFirstName')],
+            [name or "" for name in table.column('PatientLastName')],
+            table.column('MedicalRecordNumber'),
+        ))
+        vector_store = self._open_vector_store(info, table) if self.build_vectors else None
+        return table, name_index, vector_store, PatientClaimIndex.from_table(table)
+
+    def shard_collection_name(self, info: ShardInfo) -> str:
+        """Collection name of a shard; a single-file knowledge base keeps the base name."""
+        if os.path.isfile(self.path):
+            if info.path == os.path.abspath(self.path):
+                return self.collection_name
+            return f"{self.collection_name}_{hashlib.md5(os.path.basename(info.path).encode('utf-8')).hexdigest()[:10]}"
+        relative = os.path.relpath(info.path, self.path)
+        return f"{self.collection_name}_{hashlib.md5(relative.encode('utf-8')).hexdigest()[:10]}"
+
+    def _open_vector_store(self, info: ShardInfo, table: ClaimTable) -> VectorStore:
+        collection_name = self.shard_collection_name(info)
+        vector_store = create_vector_store(
+            backend=self.vector_backend,
+            csv_path=info.path,
+            db_path=self.db_path,
+            collection_name=collection_name,
+            embedding_function=self.embedding_function,
+            read_only=self.read_only,
+        )
+        # Only embed rows the store does not have yet: an empty store, or the rows appended to a grown file
+        stored = vector_store.count()
+        if not self.read_only and 0 < stored <= len(table) and not vector_store.has_metadata():
+            print(f"Adding filter metadata to the {stored} vectors of '{collection_name}'...")
+            vector_store.update_metadata(ids=[str(i) for i in range(stored)],
+                                         metadatas=claim_metadata(table, range(stored), facility=info.facility))
+        elif self.read_only and stored and not vector_store.has_metadata():
+            print(f"Vector store '{collection_name}' has no filter metadata; filtered searches of "
+                  f"{os.path.basename(info.path)} check the best unfiltered match only. Run build_index to add it.")
+        if not self.read_only and stored < len(table):
+            if stored == 0:
+                print(f"Vector store '{collection_name}' ({self.vector_backend}) is empty. "
+                      f"Indexing {os.path.basename(info.path)} with OpenAI embeddings...")
+            else:
+                print(f"Indexing {len(table) - stored} new row(s) of {os.path.basename(info.path)} "
+                      f"into '{collection_name}' ({self.vector_backend})...")
+            with memory_profiler.stage("index_build"):
+                vector_store.add(ids=[str(i) for i in range(stored, len(table))], documents=claim_documents(table)[stored:],
+                                 metadatas=claim_metadata(table, facility=info.facility)[stored:])
+            print("Indexing complete.")
+        elif stored > len(table):
+            print(f"Vector store '{collection_name}' has {stored} vectors for {len(table)} rows of "
+                  f"{os.path.basename(info.path)}; remove it and run build_index to re-embed the file.")
+        return vector_store
+
+    # ---------------- Routing ---------------- #
+    def route(self, facility: Optional[str] = None, period: Optional[str] = None) -> List[KnowledgeShard]:
+        """
+        Shards a lookup should search.
+
+        With no keys this is the loaded (active) shards. A facility and/or a
+        period ("2025-04"; a prefix such as "2025" also matches) narrows the
+        search to the matching shards, loading them if needed.
+        """
+        if not facility and not period:
+            loaded = self._loaded
+            if not loaded:
+                return self.load_active()
+            return list(loaded.values())
+        key = facility_key(facility) if facility else None
+        # Shards without a facility partition can hold any facility's claims; claim_where() narrows them
+        infos = [
+            info for info in self.shard_infos
+            if (key is None or info.facility in (key, "")) and (not period or info.period.startswith(period))
+        ]
+        return self.load(infos)
+
+    def route_dates(self, start: Optional[str] = None, end: Optional[str] = None,
+                    facility: Optional[str] = None) -> List[KnowledgeShard]:
+        """
+        Shards that can hold claims between two dates (see claim_index.query_day), loading them if needed.
+
+        Unlike route(), no dates means every period, not just the active ones:
+        a patient's history spans the whole archive. Shards whose file name is
+        not a period (YYYY-MM) are always included.
+        """
+        first, last = query_day(start), query_day(end, end=True)
+        key = facility_key(facility) if facility else None
+        infos = []
+        for info in self.shard_infos:
+            if key is not None and info.facility not in (key, ""):
+                continue
+            try:
+                period_start, period_end = query_day(info.period), query_day(info.period, end=True)
+            except ValueError:
+                period_start = period_end = None
+            # A claim is filed under its admission month but its stay can run past that month's end
+            if period_start is not None and ((last is not None and period_start > last) or
+                                             (first is not None and period_end < first - 366)):
+                continue
+            infos.append(info)
+        return self.load(infos)
+
+    def shard_for(self, global_id: int, shards: Optional[List[KnowledgeShard]] = None) -> KnowledgeShard:
+        """
+        The shard owning a global id: among `shards` when given (the list a
+        lookup routed to, which stays valid while files are ingested),
+        otherwise among the currently registered shards.
+        """
+        if shards is not None:
+            for shard in shards:
+                if shard.base <= global_id < shard.base + len(shard):
+                    return shard
+            raise KeyError(f"Row id {global_id} is not in the given shards")
+        bases, by_base = self._bases
+        position = bisect.bisect_right(bases, global_id) - 1
+        shard = by_base[bases[position]] if position >= 0 else None
+        if shard is None or global_id >= shard.base + len(shard):
+            raise KeyError(f"Row id {global_id} is not in a loaded shard")
+        return shard
+
+    def record(self, global_id: int, shards: Optional[List[KnowledgeShard]] = None) -> ClaimRecord:
+        """Decode a row by global id (see shard_for for `shards`)."""
+        shard = self.shard_for(global_id, shards)
+        return shard.table.record(global_id - shard.base)
+
+    # ---------------- Lookups ---------------- #
+    def search_names(self, query: str, shards: List[KnowledgeShard], limit: int = 5,
+                     where: Optional[Where] = None) -> NameSearchResult:
+        """
+        Search each shard's name index and merge the candidates (same name across shards is one candidate).
+
+        With a `where` clause only the matching rows count: candidates keep
+        those rows and their MRNs, and candidates left without rows are
+        dropped, so a name shared by patients of different facilities or
+        payers is no longer ambiguous once filtered.
+        """
+        merged: Dict[str, NameCandidate] = {}
+        for shard in shards:
+            for candidate in shard.name_index.search(query, limit=limit).candidates:
+                rows = shard.filter_rows(candidate.row_ids, where)
+                if not rows:
+                    continue
+                if where:
+                    row_mrns = {shard.table.record(row)['MedicalRecordNumber'] for row in rows}
+                    candidate = candidate._replace(mrns=[mrn for mrn in candidate.mrns if mrn in row_mrns])
+                row_ids = [shard.base + row for row in rows]
+                key = normalize_name(candidate.name)
+                previous = merged.get(key)
+                if previous is None:
+                    merged[key] = candidate._replace(row_ids=row_ids)
+                else:
+                    merged[key] = previous._replace(
+                        score=max(previous.score, candidate.score),
+                        row_ids=previous.row_ids + row_ids,
+                        mrns=previous.mrns + [mrn for mrn in candidate.mrns if mrn not in previous.mrns],
+                    )
+        candidates = sorted(merged.values(), key=lambda candidate: candidate.score, reverse=True)[:limit]
+        rule = shards[0].name_index if shards else NameIndex()
+        return NameSearchResult(query, candidates, rule.is_ambiguous(candidates))
+
+    def patient_frame(self, patient_name: str, shards: List[KnowledgeShard]) -> pd.DataFrame:
+        """
+        The loaded rows of a patient, for validation: every row whose name
+        matches exactly (ignoring case, punctuation and name order), indexed
+        by global id. Approximate matches are left out, as in validation.patient_rows.
+        """
+        match = self.search_names(patient_name, shards)
+        rows = [row for candidate in match.candidates if candidate.score >= 1.0 for row in candidate.row_ids]
+        return pd.DataFrame([self.record(row, shards).to_dict() for row in rows], index=pd.Index(rows, dtype=int))
+
+    def find_mrn(self, mrn: str, shards: List[KnowledgeShard], where: Optional[Where] = None) -> Optional[int]:
+        """Global id of the first row with this Medical Record Number (matching `where`, if given), or None."""
+        for shard in shards:
+            rows = shard.filter_rows(shard.table.find('MedicalRecordNumber', mrn), where)
+            if len(rows):
+                return shard.base + int(rows[0])
+        return None
+
+    def patient_claims(self, mrn: str, shards: List[KnowledgeShard], start: Optional[str] = None,
+                       end: Optional[str] = None, latest: Optional[int] = None,
+                       where: Optional[Where] = None) -> List[int]:
+        """
+        Global ids of a patient's claims, oldest service period first.
+
+        Args:
+            mrn: Medical Record Number.
+            shards: Shards to look in (route() or route_dates()).
+            start: Only claims whose admission-discharge period ends on or after this date.
+            end: Only claims whose period starts on or before this date.
+            latest: Only the newest N claims (after the date filter).
+            where: Only claims matching this claim_where() filter.
+
+        Returns:
+            List[int]: Global row ids, sorted by admission date.
+        """
+        first, last = query_day(start), query_day(end, end=True)
+        per_shard = []
+        for shard in shards:
+            claims = shard.claim_index.claims(mrn, first, last, None if where else latest)
+            if where:
+                kept = set(shard.filter_rows([row for _, row in claims], where))
+                claims = [(day, row) for day, row in claims if row in kept]
+            per_shard.append([(day, shard.base + row) for day, row in claims])
+        claims = list(heapq.merge(*per_shard))
+        if latest is not None:
+            claims = claims[max(0, len(claims) - latest):]
+        return [global_id for _, global_id in claims]
+
+    def vector_search(self, text: str, shards: List[KnowledgeShard], where: Optional[Where] = None) -> Optional[int]:
+        """Global id of the closest embedding match across the shards (among rows matching `where`), or None."""
+        best: Optional[Tuple[float, int]] = None
+        for shard in shards:
+            if shard.vector_store is None:
+                continue
+            # A store that cannot filter is searched unfiltered and only its best hit checked
+            hits = shard.vector_store.query([text], n_results=1, where=where if shard.filterable else None)[0]
+            # A store left over from a longer version of the file can point past the shard's rows
+            if not hits or int(hits[0][0]) >= len(shard):
+                continue
+            if where and not shard.filterable and not shard.filter_rows([int(hits[0][0])], where):
+                continue
+            if best is None or hits[0][1] > best[0]:
+                best = (hits[0][1], shard.base + int(hits[0][0]))
+        return best[1] if best else None
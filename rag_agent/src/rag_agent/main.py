@@ -1,6 +1,12 @@
 #!/usr/bin/env python
+import os
 import sys
-from rag_agent.crew import UB04ClaimBuilderCrew
+import pandas as pd
+from rag_agent.crew import UB04ClaimBuilderCrew, csv_tool, knowledge_path, usage_log_path, vector_backend
+from rag_agent.knowledge_base import discover_shards
+from rag_agent.memory_profile import DEFAULT_LOG_PATH as memory_log_path, load_memory_log, memory_summary
+from rag_agent.usage import latency_report as summarize_latency, load_usage_log
+from rag_agent.validation import validate_csv, validation_gate
 from dotenv import load_dotenv
 
 
@@ -12,6 +18,94 @@ load_dotenv()
 # Replace with inputs you want to test with, it will automatically
 # interpolate any tasks and agents information
 
+# Validation rules that do not block a run. The bundled sample data uses
+# placeholder NPIs that do not carry a valid check digit.
+VALIDATION_IGNORED_RULES = ["npi_checksum"]
+
+
+def validate():
+    """
+    Validate the claims knowledge (RAG_KNOWLEDGE_PATH, or the path given) and
+    print the per-row error report. A directory is validated shard by shard,
+    with each error labelled by its shard file.
+    """
+    path = sys.argv[1] if len(sys.argv) > 1 else knowledge_path
+    shards = discover_shards(path)
+    if not shards:
+        raise ValueError(f"No claim files found at '{path}'")
+    reports = [validate_csv(info.path) for info in shards]
+    if os.path.isdir(path):
+        reports = [
+            report.assign(file=os.path.relpath(info.path, path))[["file", *report.columns]]
+            for info, report in zip(shards, reports) if not report.empty
+        ]
+        report = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
+    else:
+        report = reports[0]
+    if report.empty:
+        print("All claim rows passed validation.")
+    else:
+        print(report.to_string(index=False))
+    return report
+
+
+def build_index():
+    """
+    Embed every knowledge shard whose vector store is still empty, so that
+    workers started with RAG_READ_ONLY=1 can open the finished index.
+    """
+    from rag_agent.tools.csv_tool import CSVKnowledgeTool
+
+    tool = CSVKnowledgeTool(csv_path=knowledge_path, vector_backend=vector_backend, active_periods=None)
+    print(f"Indexed {len(tool.knowledge_base.shard_infos)} shard(s) into {tool.knowledge_base.db_path}")
+
+
+def latency_report():
+    """
+    Print tail latency (p50/p95/p99) and per-route cost of the claim runs in the usage log.
+    """
+    records = load_usage_log(sys.argv[1] if len(sys.argv) > 1 else usage_log_path)
+    report = summarize_latency(records)
+    latency = report["latency_seconds"]
+    print(f"{report['claims']} claim run(s), {report['failed']} failed, "
+          f"{report['conversion_llm_calls']} output conversion call(s), {report['conversion_retries']} retries")
+    if latency:
+        print("  ".join(f"{name} {value:.2f}s" for name, value in latency.items()))
+    for name, route in report["routes"].items():
+        print(f"{name} ({', '.join(route['models'])}): {route['calls']} calls, {route['errors']} errors, "
+              f"{route['seconds_per_call']:.2f}s/call, {route['tokens_per_claim']:.0f} tokens/claim")
+    return report
+
+
+def memory_report():
+    """
+    Print per-stage peak RSS and traced Python memory across the runs in the memory profile log
+    (written when RAG_MEMORY_PROFILE=1).
+    """
+    reports = load_memory_log(sys.argv[1] if len(sys.argv) > 1 else memory_log_path)
+    summary = memory_summary(reports)
+    print(f"{len(reports)} profiled run(s)")
+    for name, stage in summary.items():
+        rss, traced = stage["peak_rss"], stage["traced_peak"]
+        print(f"{name}: {stage['runs']} run(s), {stage['calls']} call(s), peak RSS p50 {rss['p50'] / 2**20:.1f} MB "
+              f"p95 {rss['p95'] / 2**20:.1f} MB max {rss['max'] / 2**20:.1f} MB, "
+              f"traced peak max {traced['max'] / 2**20:.1f} MB")
+    return summary
+
+
+def gate_patient(patient_name: str):
+    """
+    Refuse to start the crew when the patient's claim rows fail validation.
+
+    Checks the rows csv_tool already holds in memory, in the shards its
+    lookups search, so a warm worker never re-reads the knowledge files.
+    """
+    knowledge_base = csv_tool.knowledge_base
+    df = knowledge_base.patient_frame(patient_name, knowledge_base.route())
+    # Names that only match approximately are left to the RAG lookup
+    if len(df) > 0:
+        validation_gate(df, ignore_rules=VALIDATION_IGNORED_RULES)
+
 
 def run():
     """
@@ -23,9 +117,12 @@ def run():
         'patient_name': 'Patel Nicholas', 
     }
     
+    # Check the source rows before spending any LLM calls on them
+    gate_patient(inputs['patient_name'])
+
     try:
         # Instantiate and run the crew.
-        UB04ClaimBuilderCrew().crew().kickoff(inputs=inputs)
+        UB04ClaimBuilderCrew().build_claim(inputs)
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
 
@@ -0,0 +1,242 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+# Reports go next to the usage log; RAG_MEMORY_PROFILE=1 turns profiling on
+DEFAULT_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "output", "memory_profile.jsonl")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (Linux /proc, else psutil when installed), or None."""
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class _ActiveStage:
+    def __init__(self, name: str, parent: Optional[str], rss: Optional[int]):
+        self.name = name
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.rss_before = rss
+        self.peak_rss = rss or 0
+        self.traced_peak = 0
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.traced_before = 0
+
+
+class MemoryProfiler:
+    """
+    Opt-in per-stage memory profiling: peak RSS and top Python allocators.
+
+    `stage(name)` wraps a pipeline step (CSV load, index build, lookup, crew
+    kickoff, PDF fill/save, batch loop). While profiling is on, a sampler
+    thread reads the RSS every `sample_interval` seconds and every open stage
+    keeps its maximum, and tracemalloc records the stage's traced peak and,
+    from snapshots taken on entry and exit, the source lines that grew the
+    most. Stages nest: a parent's peak includes its children. Concurrent
+    stages on different threads share the process-wide numbers.
+
+    Repeated stages are aggregated (calls, time, worst peak, the top
+    allocators of the call that grew the most). `write_report(run)` appends
+    one JSON record per run to `log_path` and starts a new run, so memory
+    footprint can be tracked across runs like latency (see main.memory_report).
+    When disabled every call is a no-op.
+    """
+
+    def __init__(self, enabled: bool = False, log_path: str = DEFAULT_LOG_PATH, top: int = 10,
+                 frames: int = 1, sample_interval: float = 0.01):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.top = top
+        self.frames = frames
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._active: List[_ActiveStage] = []
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._gauges: Dict[str, int] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self._run_started = time.time()
+        self._run_rss = None
+        if enabled:
+            self._start()
+
+    @classmethod
+    def from_env(cls) -> "MemoryProfiler":
+        return cls(
+            enabled=os.getenv("RAG_MEMORY_PROFILE", "0") == "1",
+            log_path=os.getenv("RAG_MEMORY_PROFILE_LOG", DEFAULT_LOG_PATH),
+            top=int(os.getenv("RAG_MEMORY_PROFILE_TOP", "10")),
+            frames=int(os.getenv("RAG_MEMORY_PROFILE_FRAMES", "1")),
+        )
+
+    def _start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._run_rss = current_rss()
+        self._sampler = threading.Thread(target=self._sample, name="memory-profile-sampler", daemon=True)
+        self._sampler.start()
+
+    def _sample(self) -> None:
+        while True:
+            rss = current_rss()
+            if rss is None:
+                return
+            with self._lock:
+                for active in self._active:
+                    active.peak_rss = max(active.peak_rss, rss)
+            time.sleep(self.sample_interval)
+
+    def _fold_traced_peak(self) -> None:
+        """Credit the traced peak so far to every open stage (before it is reset)."""
+        peak = tracemalloc.get_traced_memory()[1]
+        for active in self._active:
+            active.traced_peak = max(active.traced_peak, peak)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Profile the enclosed block as pipeline stage `name`."""
+        if not self.enabled:
+            yield
+            return
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        active = _ActiveStage(name, stack[-1].name if stack else None, current_rss())
+        active.snapshot = tracemalloc.take_snapshot()
+        with self._lock:
+            self._fold_traced_peak()
+            tracemalloc.reset_peak()
+            active.traced_before = tracemalloc.get_traced_memory()[0]
+            self._active.append(active)
+        stack.append(active)
+        try:
+            yield
+        finally:
+            stack.pop()
+            with self._lock:
+                self._fold_traced_peak()
+                self._active.remove(active)
+            self._record(active)
+
+    def _record(self, active: _ActiveStage) -> None:
+        rss_after = current_rss()
+        traced_after = tracemalloc.get_traced_memory()[0]
+        top = self._top_allocators(active.snapshot)
+        active.snapshot = None
+        if rss_after is not None:
+            active.peak_rss = max(active.peak_rss, rss_after)
+        with self._lock:
+            stats = self._stages.setdefault(active.name, {
+                "stage": active.name, "parent": active.parent, "calls": 0, "seconds": 0.0,
+                "peak_rss": 0, "rss_delta": 0, "traced_peak": 0, "traced_delta": 0,
+                "max_traced_delta": None, "top_allocators": [],
+            })
+            traced_delta = traced_after - active.traced_before
+            stats["calls"] += 1
+            stats["seconds"] = round(stats["seconds"] + time.perf_counter() - active.started, 4)
+            stats["peak_rss"] = max(stats["peak_rss"], active.peak_rss)
+            if active.rss_before is not None and rss_after is not None:
+                stats["rss_delta"] += rss_after - active.rss_before
+            stats["traced_peak"] = max(stats["traced_peak"], active.traced_peak)
+            stats["traced_delta"] += traced_delta
+            if stats["max_traced_delta"] is None or traced_delta > stats["max_traced_delta"]:
+                stats["max_traced_delta"] = traced_delta
+                stats["top_allocators"] = top
+
+    def _top_allocators(self, before: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+        after = tracemalloc.take_snapshot()
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+        differences = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+        return [
+            {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             "size_delta": stat.size_diff, "count_delta": stat.count_diff}
+            for stat in sorted(differences, key=lambda stat: stat.size_diff, reverse=True)[:self.top]
+            if stat.size_diff > 0
+        ]
+
+    def gauge(self, name: str, value: int) -> None:
+        """Record a size observed outside any stage (e.g. PDF bytes held in session state); keeps the largest."""
+        if self.enabled:
+            with self._lock:
+                self._gauges[name] = max(self._gauges.get(name, 0), int(value))
+
+    def report(self, run: str) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "run": run,
+                "started_at": datetime.fromtimestamp(self._run_started).isoformat(timespec="seconds"),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "rss_start": self._run_rss,
+                "rss_end": current_rss(),
+                "traced_current": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+                "stages": [dict(stats) for stats in self._stages.values()],
+                "gauges": dict(self._gauges),
+            }
+
+    def write_report(self, run: str) -> Optional[Dict[str, Any]]:
+        """Append this run's report to the log and start a new run. Returns the report (None when disabled)."""
+        if not self.enabled:
+            return None
+        report = self.report(run)
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as log_file:
+            log_file.write(json.dumps(report) + "\n")
+        with self._lock:
+            self._stages.clear()
+            self._gauges.clear()
+            self._run_started = time.time()
+            self._run_rss = report["rss_end"]
+        print(f"Memory profile for {run} written to {self.log_path} (peak RSS "
+              f"{max((stage['peak_rss'] for stage in report['stages']), default=0) / 2**20:.1f} MB)")
+        return report
+
+
+def load_memory_log(log_path: str = DEFAULT_LOG_PATH) -> List[Dict[str, Any]]:
+    """Reports from a memory profile log; a missing log is empty."""
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, "r", encoding="utf-8") as log_file:
+        return [json.loads(line) for line in log_file if line.strip()]
+
+
+def memory_summary(reports: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per stage across runs: runs seen, peak RSS and traced-peak percentiles (bytes)."""
+    from rag_agent.usage import latency_percentiles
+
+    by_stage: Dict[str, List[Dict[str, Any]]] = {}
+    for report in reports:
+        for stage in report.get("stages", []):
+            by_stage.setdefault(stage["stage"], []).append(stage)
+    return {
+        name: {
+            "runs": len(stages),
+            "calls": sum(stage["calls"] for stage in stages),
+            "peak_rss": latency_percentiles([stage["peak_rss"] for stage in stages]),
+            "traced_peak": latency_percentiles([stage["traced_peak"] for stage in stages]),
+        }
+        for name, stages in by_stage.items()
+    }
+
+
+# Process-wide profiler used by the pipeline stages
+memory_profiler = MemoryProfiler.from_env()
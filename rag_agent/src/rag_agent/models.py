@@ -1,9 +1,12 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, List, Mapping, Optional
+import math
+import re
 
 class Facility(BaseModel):
     name: str = Field(..., description="Name of the facility")
     address: str = Field(..., description="Address of the facility")
+    npi: Optional[str] = Field(None, description="Facility (billing provider) NPI")
 
 class Patient(BaseModel):
     first_name: str = Field(..., description="Patient's first name")
@@ -47,4 +50,95 @@ class UB04Claim(BaseModel):
     diagnoses: Diagnoses
     physicians: Physicians
     revenue_lines: List[RevenueLine] = Field(..., description="List of revenue lines")
-    total_charge: float = Field(..., description="Total charge for the claim")
\ No newline at end of file
+    total_charge: float = Field(..., description="Total charge for the claim")
+
+    @classmethod
+    def from_csv_row(cls, row: Mapping[str, Any]) -> "UB04Claim":
+        """
+        Build a claim directly from one flat ub04_claims.csv row.
+
+        Revenue lines are collected from every numbered RevenueCodeN/HCPCSCodeN/
+        UnitsN/ChargesN group present in the row, so the payload is already
+        shaped like the model and no LLM reshaping is needed.
+
+        Args:
+            row: Mapping of CSV column name to value (e.g. a pandas row as dict).
+
+        Returns:
+            UB04Claim: The nested claim model.
+        """
+        secondary = _csv_text(row.get("SecondaryDiagnosisCode1"))
+        return cls(
+            facility=Facility(
+                name=_csv_text(row.get("FacilityName")),
+                address=_csv_text(row.get("FacilityAddress")),
+                npi=_csv_text(row.get("FacilityNPI")) or None,
+            ),
+            patient=Patient(
+                first_name=_csv_text(row.get("PatientFirstName")),
+                last_name=_csv_text(row.get("PatientLastName")),
+                dob=_csv_text(row.get("PatientDOB")),
+                sex=_csv_text(row.get("PatientSex")),
+                mrn=_csv_text(row.get("MedicalRecordNumber")),
+            ),
+            visit=Visit(
+                admission_date=_csv_text(row.get("AdmissionDate")),
+                discharge_date=_csv_text(row.get("DischargeDate")),
+                patient_control_number=_csv_text(row.get("PatientControlNumber")),
+            ),
+            payer=Payer(
+                name=_csv_text(row.get("PrimaryPayerName")),
+                id=_csv_text(row.get("PrimaryPayerID")),
+            ),
+            bill_type=_csv_text(row.get("BillType")),
+            diagnoses=Diagnoses(
+                primary=_csv_text(row.get("PrimaryDiagnosisCode")),
+                secondary=secondary or None,
+            ),
+            physicians=Physicians(
+                attending=AttendingPhysician(npi=_csv_text(row.get("AttendingPhysicianNPI"))),
+            ),
+            revenue_lines=[
+                RevenueLine(
+                    revenue_code=revenue_code.zfill(4),
+                    hcpcs_code=_csv_text(row.get(f"HCPCSCode{n}")) or None,
+                    units=int(_csv_number(row.get(f"Units{n}"))),
+                    charge=_csv_number(row.get(f"Charges{n}")),
+                )
+                for n in revenue_line_numbers(row.keys())
+                if (revenue_code := _csv_text(row.get(f"RevenueCode{n}")))
+            ],
+            total_charge=_csv_number(row.get("TotalCharge")),
+        )
+
+
+_REVENUE_CODE_COLUMN = re.compile(r"^RevenueCode(\d+)$")
+
+
+def revenue_line_numbers(columns) -> List[int]:
+    """Return the sorted line numbers N of every RevenueCodeN column."""
+    return sorted(
+        int(match.group(1))
+        for column in columns
+        if (match := _REVENUE_CODE_COLUMN.match(str(column)))
+    )
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _csv_text(value: Any) -> str:
+    """Render a CSV cell as text, dropping the '.0' pandas adds to numeric codes."""
+    if _is_missing(value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _csv_number(value: Any) -> float:
+    """Render a CSV cell as a number, treating blanks as zero."""
+    if _is_missing(value) or value == "":
+        return 0.0
+    return float(value)
\ No newline at end of file
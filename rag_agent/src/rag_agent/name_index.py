@@ -0,0 +1,214 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+import numpy as np
+
+_NON_ALPHA = re.compile(r"[^a-z ]+")
+
+
+class NameCandidate(NamedTuple):
+    """One ranked match for a name query."""
+    name: str            # Name as indexed ("First Last")
+    score: float         # 0..1, 1 is an exact match (ignoring case and name order)
+    row_ids: List[int]   # Source rows carrying this name
+    mrns: List[str]      # Distinct medical record numbers for those rows
+
+
+class NameSearchResult(NamedTuple):
+    """Ranked candidates plus whether the top match can be trusted on its own."""
+    query: str
+    candidates: List[NameCandidate]
+    ambiguous: bool
+
+    @property
+    def best(self) -> Optional[NameCandidate]:
+        return self.candidates[0] if self.candidates else None
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, drop punctuation and sort the tokens so 'Patel, Nicholas' == 'nicholas patel'."""
+    tokens = _NON_ALPHA.sub(" ", str(name).lower().replace("-", " ")).split()
+    return " ".join(sorted(tokens))
+
+
+def trigrams(key: str) -> Set[str]:
+    """Character trigrams of each token, padded so short names still produce grams."""
+    grams: Set[str] = set()
+    for token in key.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def edit_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """
+    Levenshtein distance with a rolling row.
+
+    When max_distance is given the scan stops as soon as every cell of a row
+    exceeds it and max_distance + 1 is returned.
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        left = i
+        row_min = i
+        for j, char_b in enumerate(b, start=1):
+            # Plain comparisons instead of min() keep the inner loop fast
+            value = previous[j - 1] + (char_a != char_b)
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if left + 1 < value:
+                value = left + 1
+            current.append(value)
+            left = value
+            if value < row_min:
+                row_min = value
+        if max_distance is not None and row_min > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class NameIndex:
+    """
+    In-memory approximate matcher for patient names.
+
+    Names are normalized (case, punctuation and token order removed) and
+    indexed by character trigram. A query collects candidates that share
+    trigrams with it, keeps the best by Dice overlap, then re-ranks those
+    with edit distance. The index grows incrementally through `add`, so new
+    rows never require a rebuild.
+
+    A result is flagged ambiguous when the runner-up scores within
+    `ambiguity_margin` of the best match, or when the best name belongs to
+    more than one medical record number (two different patients with the
+    same name).
+    """
+
+    def __init__(self, ambiguity_margin: float = 0.05, min_score: float = 0.5, shortlist: int = 10):
+        self.ambiguity_margin = ambiguity_margin
+        self.min_score = min_score
+        self.shortlist = shortlist
+        self._postings: Dict[str, List[int]] = defaultdict(list)  # trigram -> name ids
+        # NumPy copies of postings/gram counts, refreshed lazily after adds
+        self._posting_arrays: Dict[str, np.ndarray] = {}
+        self._gram_count_array = np.zeros(0, dtype=np.int32)
+        self._keys: List[str] = []                                 # name id -> normalized key
+        self._gram_counts: List[int] = []                          # name id -> number of trigrams
+        self._display: List[str] = []                              # name id -> name as first added
+        self._rows: List[List[int]] = []                           # name id -> row ids
+        self._mrns: List[List[str]] = []                           # name id -> distinct MRNs
+        self._ids_by_key: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, row_id: int, first_name: str, last_name: str, mrn: Optional[str] = None) -> None:
+        """Index one source row."""
+        display = f"{first_name} {last_name}".strip()
+        key = normalize_name(display)
+        if not key:
+            return
+        name_id = self._ids_by_key.get(key)
+        if name_id is None:
+            name_id = len(self._keys)
+            self._ids_by_key[key] = name_id
+            grams = trigrams(key)
+            for gram in grams:
+                self._postings[gram].append(name_id)
+                self._posting_arrays.pop(gram, None)
+            self._keys.append(key)
+            self._gram_counts.append(len(grams))
+            self._display.append(display)
+            self._rows.append([])
+            self._mrns.append([])
+        self._rows[name_id].append(row_id)
+        if mrn and mrn not in self._mrns[name_id]:
+            self._mrns[name_id].append(mrn)
+
+    def add_rows(self, rows: Iterable) -> None:
+        """
+        Index (row_id, first_name, last_name, mrn) tuples, e.g. from
+        zip(df.index, df['PatientFirstName'], df['PatientLastName'], df['MedicalRecordNumber']).
+        """
+        for row_id, first_name, last_name, mrn in rows:
+            self.add(int(row_id), str(first_name), str(last_name), None if mrn is None else str(mrn))
+
+    def _posting_array(self, gram: str) -> np.ndarray:
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            array = self._posting_arrays[gram] = np.array(self._postings[gram], dtype=np.int64)
+        return array
+
+    def _gram_count_vector(self) -> np.ndarray:
+        if len(self._gram_count_array) != len(self._gram_counts):
+            self._gram_count_array = np.array(self._gram_counts, dtype=np.int32)
+        return self._gram_count_array
+
+    def search(self, query: str, limit: int = 5) -> NameSearchResult:
+        """
+        Rank indexed names against a query.
+
+        Args:
+            query: Patient name as typed, in any order and with typos.
+            limit: Maximum number of candidates to return.
+
+        Returns:
+            NameSearchResult: Candidates sorted by score (best first) and the
+            ambiguity flag.
+        """
+        key = normalize_name(query)
+        if not key:
+            return NameSearchResult(query, [], False)
+
+        exact = self._ids_by_key.get(key)
+        all_query_grams = trigrams(key)
+        query_grams = [gram for gram in all_query_grams if gram in self._postings]
+        shortlist: List[int] = []
+        if query_grams:
+            # Count shared trigrams per name in one bincount over the posting lists
+            shared = np.bincount(
+                np.concatenate([self._posting_array(gram) for gram in query_grams]),
+                minlength=len(self._keys),
+            )
+            # Dice overlap on trigrams builds a shortlist, edit distance decides the order
+            dice = 2 * shared / (len(all_query_grams) + self._gram_count_vector())
+            size = min(self.shortlist, int(np.count_nonzero(shared)))
+            top = np.argpartition(-dice, size - 1)[:size]
+            top = top[np.argsort(-dice[top])]
+            # Names sharing less than half the trigram overlap of the leader cannot win
+            shortlist = top[dice[top] >= dice[top[0]] / 2].tolist()
+        if exact is not None and exact not in shortlist:
+            shortlist.insert(0, exact)
+
+        candidates = []
+        for name_id in shortlist:
+            candidate_key = self._keys[name_id]
+            longest = max(len(key), len(candidate_key))
+            distance = edit_distance(key, candidate_key, max_distance=int((1 - self.min_score) * longest))
+            similarity = 1 - distance / longest
+            if similarity >= self.min_score:
+                candidates.append(NameCandidate(
+                    name=self._display[name_id],
+                    score=round(similarity, 4),
+                    row_ids=list(self._rows[name_id]),
+                    mrns=list(self._mrns[name_id]),
+                ))
+        candidates.sort(key=lambda candidate: candidate.score, reverse=True)
+        candidates = candidates[:limit]
+        return NameSearchResult(query, candidates, self.is_ambiguous(candidates))
+
+    def is_ambiguous(self, candidates: List[NameCandidate]) -> bool:
+        """Ambiguity rule for candidates sorted best first (also used to merge results of several indexes)."""
+        if not candidates:
+            return False
+        best = candidates[0]
+        runner_up = candidates[1].score if len(candidates) > 1 else 0.0
+        return best.score - runner_up < self.ambiguity_margin or len(best.mrns) > 1
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from crewai import Agent
+from pydantic import Field
+
+
+def plan_key(agent: Any, task: Any) -> str:
+    """
+    Cache key of a reasoning plan.
+
+    Built from the un-interpolated agent and task templates (so the patient
+    and other kickoff inputs do not change it), the agent's model and
+    reasoning settings and the tool set. Editing agents.yaml or tasks.yaml
+    changes the key, which is what invalidates cached plans.
+    """
+    tools = list(getattr(task, "tools", None) or getattr(agent, "tools", None) or [])
+    llm = getattr(agent, "llm", None)
+    payload = {
+        "role": agent._original_role or agent.role,
+        "goal": agent._original_goal or agent.goal,
+        "backstory": agent._original_backstory or agent.backstory,
+        "llm": getattr(llm, "route", None) or getattr(llm, "model", None),
+        "max_reasoning_attempts": agent.max_reasoning_attempts,
+        "description": task._original_description or task.description,
+        "expected_output": task._original_expected_output or task.expected_output,
+        "tools": sorted([tool.name, tool.description] for tool in tools),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    Reasoning plans per (agent, task template), kept in a JSON file.
+
+    Each agent/task slot holds one plan; storing a plan under a new key (the
+    YAML changed) replaces the old one, so stale plans never pile up.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as cache_file:
+                    self._entries = json.load(cache_file)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable plan cache '{path}': {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["plan"]
+
+    def put(self, key: str, slot: str, plan: str, ready: bool) -> None:
+        with self._lock:
+            for stale in [k for k, entry in self._entries.items() if entry["slot"] == slot and k != key]:
+                del self._entries[stale]
+            self._entries[key] = {"slot": slot, "plan": plan, "ready": ready, "created_at": time.time()}
+            self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as cache_file:
+            json.dump(self._entries, cache_file, indent=2)
+        os.replace(temporary, self.path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"plans": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def fill_plan(plan: str, inputs: Optional[Dict[str, Any]]) -> str:
+    """Put this run's kickoff inputs into a plan made from the task template."""
+    for name, value in (inputs or {}).items():
+        plan = plan.replace("{" + name + "}", str(value))
+    return plan
+
+
+class PlanCachingAgent(Agent):
+    """
+    Agent whose reasoning plan is made once per task template and reused.
+
+    crewAI plans on the interpolated task, so every claim pays for the same
+    planning calls with only {patient_name} changed. This agent plans on the
+    template instead (placeholders left in), stores the plan in `plan_cache`,
+    and on later runs fills the placeholders with the kickoff inputs and
+    skips the planning calls. Without a cache it behaves like Agent.
+    """
+
+    plan_cache: Optional[Any] = Field(default=None, exclude=True, description="PlanCache shared by the crew")
+
+    def execute_task(self, task: Any, context: Optional[str] = None, tools: Optional[List[Any]] = None) -> str:
+        if not self.reasoning or self.plan_cache is None:
+            return super().execute_task(task, context, tools)
+
+        key = plan_key(self, task)
+        plan = self.plan_cache.get(key)
+        if plan is None:
+            plan = self._plan_template(task, key)
+        if plan is not None:
+            inputs = getattr(self.crew, "_inputs", None) if self.crew is not None else None
+            task.description += f"\n\nReasoning Plan:\n{fill_plan(plan, inputs)}"
+
+        # The plan is already in the description; don't let crewAI plan again
+        self.reasoning = False
+        try:
+            return super().execute_task(task, context, tools)
+        finally:
+            self.reasoning = True
+
+    def _plan_template(self, task: Any, key: str) -> Optional[str]:
+        from crewai.utilities.reasoning_handler import AgentReasoning
+
+        template = task.model_copy(update={
+            "description": task._original_description or task.description,
+            "expected_output": task._original_expected_output or task.expected_output,
+        })
+        try:
+            output = AgentReasoning(task=template, agent=self).handle_agent_reasoning()
+        except Exception as e:
+            print(f"Error during reasoning process: {e}")
+            return None
+        self.plan_cache.put(key, f"{self.role.strip()}::{task.name or key}", output.plan.plan, output.plan.ready)
+        return output.plan.plan
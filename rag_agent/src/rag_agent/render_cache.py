@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def canonical_claim_json(claim: Any) -> str:
+    """Stable JSON of a claim (UB04Claim or dict): sorted keys, no whitespace."""
+    data = claim.model_dump(mode="json") if hasattr(claim, "model_dump") else claim
+    return json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+
+class RenderCache:
+    """
+    Content-addressed store of rendered claim PDFs.
+
+    A key is the hash of everything that decides the output: the canonical
+    claim, the template and field map (`PDFFormFillerTool.render_fingerprint`)
+    and the save profile. The same key always means the same PDF, so a hit
+    can be served without any lookup, LLM call or rendering; a changed source
+    row, template or field map simply produces a new key. Entries are files
+    under `root` (`<key[:2]>/<key>.pdf`); when the store grows past
+    `max_bytes` the least recently used ones are evicted.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 256 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, least recently used first
+        self._bytes = 0
+        self._scan()
+
+    @staticmethod
+    def key(claim: Any, render_fingerprint: str, save_profile: str) -> str:
+        payload = f"{canonical_claim_json(claim)}\n{render_fingerprint}\n{save_profile}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.pdf")
+
+    def _scan(self) -> None:
+        if not os.path.isdir(self.root):
+            return
+        found = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".pdf"):
+                    stat = os.stat(os.path.join(directory, name))
+                    found.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the stored PDF for key (and mark it recently used), or None."""
+        with self._lock:
+            if key not in self._entries or not os.path.exists(self.path(key)):
+                self._bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # The file's mtime is the recency order when the store is reopened
+        os.utime(self.path(key))
+        return self.path(key)
+
+    def fetch(self, key: str, destination: str) -> bool:
+        """Copy the stored PDF for key to destination; False on a miss."""
+        stored = self.get(key)
+        if stored is None:
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        # copyfile, not copy2: callers compare the output's mtime with their start time
+        shutil.copyfile(stored, destination)
+        return True
+
+    def put(self, key: str, pdf_path: str) -> str:
+        """Store a rendered PDF under key, evicting old entries past max_bytes. Returns the stored path."""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temporary = f"{target}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(pdf_path, temporary)
+        os.replace(temporary, target)
+        size = os.path.getsize(target)
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(self.path(old_key))
+                except FileNotFoundError:
+                    pass
+        return target
+
+    def clear(self) -> None:
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
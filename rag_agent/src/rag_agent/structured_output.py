@@ -0,0 +1,102 @@
+import copy
+import json
+import threading
+from typing import Any, Optional, Tuple, Type
+
+from crewai import LLM
+from crewai.utilities.converter import Converter, ConverterError
+from pydantic import BaseModel, ValidationError
+
+from rag_agent.routing import largest_json_object
+
+
+def output_schema_prompt(model: Type[BaseModel]) -> str:
+    """Expected-output text derived from the model, so the prompt and the parser never disagree."""
+    schema = json.dumps(model.model_json_schema(), separators=(",", ":"))
+    return f"JSON schema of the {model.__name__} model:\n{schema}"
+
+
+class ConversionStats:
+    """Process-wide counters of output conversions (answers that did not validate as-is)."""
+
+    def __init__(self):
+        self.conversions = 0   # converter invocations
+        self.llm_calls = 0     # conversion calls sent to an LLM
+        self.retries = 0       # attempts after the first
+        self._lock = threading.Lock()
+
+    def add(self, conversions: int = 0, llm_calls: int = 0, retries: int = 0) -> None:
+        with self._lock:
+            self.conversions += conversions
+            self.llm_calls += llm_calls
+            self.retries += retries
+
+    def snapshot(self) -> Tuple[int, int, int]:
+        with self._lock:
+            return self.conversions, self.llm_calls, self.retries
+
+
+conversion_stats = ConversionStats()
+
+
+def _native_llm(llm: Any, model: Type[BaseModel]) -> Optional[LLM]:
+    """
+    A copy of the litellm-backed model behind a (routed/hedged) agent LLM,
+    set up for provider-native structured output; None when there is none
+    or the provider cannot enforce a JSON schema.
+    """
+    seen = set()
+    while llm is not None and not isinstance(llm, LLM) and id(llm) not in seen:
+        seen.add(id(llm))
+        llm = getattr(llm, "llm", None) or (getattr(llm, "models", None) or [None])[0]
+    if not isinstance(llm, LLM):
+        return None
+    native = copy.copy(llm)
+    native.response_format = model
+    native.stop = []
+    try:
+        native._validate_call_params()
+    except ValueError:
+        return None
+    return native
+
+
+class StructuredOutputConverter(Converter):
+    """
+    Output converter that avoids free-form repair calls.
+
+    crewAI only calls the converter when the agent's answer does not
+    validate as-is. This converter first looks for a JSON object in the
+    answer that validates on its own (answers wrapped in prose or code
+    fences), then makes one provider-native structured-output call
+    (response_format set to the model's JSON schema), and only falls back
+    to crewAI's conversion when the provider cannot enforce a schema.
+    Every invocation, LLM call and retry is counted in `conversion_stats`.
+    """
+
+    def to_pydantic(self, current_attempt=1) -> BaseModel:
+        if current_attempt == 1:
+            conversion_stats.add(conversions=1)
+            embedded = largest_json_object(self.text)
+            if embedded is not None:
+                try:
+                    return self.model.model_validate(embedded)
+                except ValidationError:
+                    pass
+        else:
+            conversion_stats.add(retries=1)
+
+        native = _native_llm(self.llm, self.model)
+        conversion_stats.add(llm_calls=1)
+        if native is None:
+            return super().to_pydantic(current_attempt)
+        try:
+            response = native.call([
+                {"role": "system", "content": self.instructions},
+                {"role": "user", "content": self.text},
+            ])
+            return self.model.model_validate_json(response)
+        except Exception as e:
+            if current_attempt < self.max_attempts:
+                return self.to_pydantic(current_attempt + 1)
+            raise ConverterError(f"Failed to convert text into a Pydantic model with structured output: {e}")
@@ -0,0 +1,367 @@
+import argparse
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field
+
+# Column order of knowledge/ub04_claims.csv
+CLAIM_COLUMNS: List[str] = [
+    "FacilityName", "FacilityNPI", "FacilityAddress", "PatientControlNumber", "MedicalRecordNumber",
+    "PatientLastName", "PatientFirstName", "PatientDOB", "PatientSex", "AdmissionDate", "DischargeDate",
+    "BillType", "RevenueCode1", "HCPCSCode1", "Units1", "Charges1", "RevenueCode2", "HCPCSCode2",
+    "Units2", "Charges2", "TotalCharge", "PrimaryPayerName", "PrimaryPayerID", "PrimaryDiagnosisCode",
+    "SecondaryDiagnosisCode1", "AttendingPhysicianNPI",
+]
+
+# Kinds of dirty data, named after the validation rules that should catch them
+DIRTY_KINDS = ("required", "npi_checksum", "icd10_format", "hcpcs_format",
+               "total_mismatch", "date_order", "date_format")
+
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+    "Christopher", "Lisa", "Daniel", "Nancy", "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra",
+    "Donald", "Ashley", "Steven", "Kimberly", "Paul", "Emily", "Andrew", "Donna", "Joshua", "Michelle",
+    "Kenneth", "Carol", "Kevin", "Amanda", "Brian", "Dorothy", "George", "Melissa", "Timothy", "Deborah",
+    "Ronald", "Stephanie", "Edward", "Rebecca", "Jason", "Sharon", "Jeffrey", "Laura", "Ryan", "Cynthia",
+    "Jacob", "Kathleen", "Gary", "Amy", "Nicholas", "Angela", "Eric", "Shirley", "Jonathan", "Anna",
+    "Stephen", "Brenda", "Larry", "Pamela", "Justin", "Emma", "Scott", "Nicole", "Brandon", "Helen",
+    "Benjamin", "Samantha", "Samuel", "Katherine", "Gregory", "Christine", "Alexander", "Debra", "Frank",
+    "Rachel", "Patrick", "Carolyn", "Raymond", "Janet", "Jack", "Catherine", "Dennis", "Maria", "Jerry",
+    "Heather", "Tyler", "Diane", "Aaron", "Ruth", "Jose", "Julie", "Adam", "Olivia", "Nathan", "Joyce",
+    "Henry", "Virginia", "Douglas", "Victoria", "Zachary", "Kelly", "Peter", "Lauren", "Kyle", "Christina",
+    "Cheryl", "Felicia", "Walter", "Gloria", "Harold", "Evelyn", "Carl", "Jean", "Arthur", "Cheryl",
+]
+_COMMON_LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+    "Walker", "Young", "Allen", "King", "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores", "Green",
+    "Adams", "Nelson", "Baker", "Hall", "Rivera", "Campbell", "Mitchell", "Carter", "Roberts", "Patel",
+    "Salazar", "Price", "Kim", "Shah", "Chen", "Murphy", "Cook", "Rogers", "Morgan", "Peterson", "Cooper",
+]
+# Common surnames repeat a lot (as in real rosters); the composed ones give a long tail of rarer names
+_PREFIXES = ["Ash", "Bel", "Brad", "Cal", "Dal", "Elling", "Fair", "Gold", "Hart", "Hol", "Kings", "Lang",
+             "Mar", "Mill", "North", "Oak", "Pem", "Red", "Ros", "Stan", "Thorn", "Wal", "West", "Wood"]
+_SUFFIXES = ["bury", "by", "combe", "den", "field", "ford", "ham", "ley", "more", "ridge", "son", "ton",
+             "wood", "worth", "well", "wick"]
+LAST_NAMES = _COMMON_LAST_NAMES * 4 + [prefix + suffix for prefix in _PREFIXES for suffix in _SUFFIXES]
+
+FACILITY_NAMES = ["Sunrise Care Home", "Oak Valley Nursing Center", "Riverside Skilled Nursing",
+                  "Maple Grove Rehabilitation", "Pine Ridge Care Center", "Lakeview Senior Living",
+                  "Meadowbrook Health Center", "Cedar Hills Nursing Home"]
+STREETS = ["Elm St", "Main St", "Oak Ave", "Maple Dr", "Cedar Ln", "Lake Rd", "Park Ave", "Hill St"]
+CITIES = [("Springfield", "NY", "10001"), ("Riverton", "NJ", "08077"), ("Fairview", "PA", "19001"),
+          ("Greenville", "CT", "06101"), ("Franklin", "MA", "02038")]
+
+# (name, payer id, share of claims)
+PAYERS = [("Medicare", "80840", 0.4), ("Medicaid", "80841", 0.35), ("PrivateInsurance", "99999", 0.25)]
+PRIMARY_DIAGNOSES = ["M54.5", "J44.9", "N18.9", "J18.9", "I63.9", "I50.9", "F03.90", "G30.9", "E11.9",
+                     "S72.001A", "M62.81", "R26.2", "I69.351", "N39.0", "L89.154"]
+SECONDARY_DIAGNOSES = ["E11.9", "I10", "F33.1", "E78.5", "N18.3", "F41.9", "Z79.01", "K21.9", "M19.90"]
+# Accommodation line: (revenue code, daily rate range)
+ROOM_LINES = [("110", 280, 480), ("120", 200, 340), ("140", 320, 520)]
+# Ancillary line: (revenue code, HCPCS code, unit price range)
+ANCILLARY_LINES = [("410", "A4624", 60, 120), ("250", "J3490", 40, 200), ("420", "G0151", 55, 90),
+                   ("270", "A4550", 100, 220), ("272", "E0118", 150, 200), ("430", "G0152", 55, 95),
+                   ("440", "G0153", 60, 100)]
+
+_MASK_64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+class SyntheticClaimConfig(BaseModel):
+    """Knobs for the synthetic claim generator."""
+    seed: int = Field(42, description="Seed; the same config always yields the same rows")
+    facilities: int = Field(5, description="Number of distinct facilities")
+    start_date: str = Field("2025-01-01", description="Earliest admission date (YYYY-MM-DD)")
+    end_date: str = Field("2025-12-31", description="Latest admission date (YYYY-MM-DD)")
+    repeat_patient_rate: float = Field(0.3, description="Share of claims for a patient seen before")
+    name_collision_rate: float = Field(0.01, description="Share of patients given another patient's exact name")
+    dirty_rates: Dict[str, float] = Field(default_factory=dict, description="DIRTY_KINDS -> share of rows")
+    chunk_size: int = Field(100_000, description="Rows generated (and held in memory) at a time")
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: a fast, well-spread hash of uint64 values."""
+    with np.errstate(over="ignore"):
+        x = (values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)) & _MASK_64
+        x = ((x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)) & _MASK_64
+        x = ((x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)) & _MASK_64
+        return x ^ (x >> np.uint64(31))
+
+
+def npi_check_digits(bodies: np.ndarray) -> np.ndarray:
+    """Luhn check digit for an (n, 9) array of NPI body digits (with the 80840 prefix)."""
+    doubled = bodies[:, ::2] * 2
+    doubled = np.where(doubled > 9, doubled - 9, doubled)
+    total = 24 + doubled.sum(axis=1) + bodies[:, 1::2].sum(axis=1)  # 24 = Luhn sum of "80840"
+    return (10 - total % 10) % 10
+
+
+def random_npis(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Valid 10-digit NPIs (first digit 1 or 2, as issued) as strings."""
+    bodies = rng.integers(0, 10, size=(count, 9))
+    bodies[:, 0] = rng.integers(1, 3, size=count)
+    digits = np.concatenate([bodies, npi_check_digits(bodies)[:, None]], axis=1)
+    return (digits * 10 ** np.arange(9, -1, -1)).sum(axis=1).astype(str)
+
+
+def _us_dates(days: np.ndarray) -> pd.Series:
+    """Days since 1970-01-01 -> 'M/D/YYYY' strings (the CSV's unpadded format)."""
+    stamps = pd.to_datetime(days, unit="D")
+    return (pd.Series(stamps.month).astype(str) + "/" + pd.Series(stamps.day).astype(str)
+            + "/" + pd.Series(stamps.year).astype(str))
+
+
+class _Facilities:
+    def __init__(self, config: SyntheticClaimConfig):
+        rng = np.random.default_rng([config.seed, 1])
+        names, addresses = [], []
+        for number in range(config.facilities):
+            name = FACILITY_NAMES[number % len(FACILITY_NAMES)]
+            if number >= len(FACILITY_NAMES):
+                name = f"{name} {number // len(FACILITY_NAMES) + 1}"
+            city, state, zip_code = CITIES[number % len(CITIES)]
+            names.append(name)
+            addresses.append(f"{100 + 23 * number} {STREETS[number % len(STREETS)]}, {city}, {state} {zip_code}")
+        self.names = np.array(names, dtype=object)
+        self.addresses = np.array(addresses, dtype=object)
+        self.npis = random_npis(rng, config.facilities).astype(object)
+        # Each facility has a small pool of attending physicians
+        self.physician_npis = random_npis(rng, config.facilities * 8).astype(object).reshape(config.facilities, 8)
+
+
+def _patients(patient_ids: np.ndarray, config: SyntheticClaimConfig) -> Dict[str, np.ndarray]:
+    """Derive stable patient attributes from patient ids without storing the population."""
+    key = np.uint64(config.seed) * np.uint64(0x100000001B3)
+    hashes = _mix(patient_ids.astype(np.uint64) ^ key)
+    # Name collisions: some patients take the name of an earlier, different patient
+    collide = ((hashes >> np.uint64(40)) % np.uint64(10_000)).astype(np.int64) < config.name_collision_rate * 10_000
+    collide &= patient_ids > 0
+    name_ids = patient_ids.copy()
+    name_ids[collide] = ((hashes[collide] >> np.uint64(8)) % patient_ids[collide].astype(np.uint64)).astype(np.int64)
+    name_hashes = _mix(name_ids.astype(np.uint64) ^ key)
+    return {
+        "first": np.asarray(FIRST_NAMES, dtype=object)[(name_hashes % np.uint64(len(FIRST_NAMES))).astype(np.int64)],
+        "last": np.asarray(LAST_NAMES, dtype=object)[((name_hashes >> np.uint64(16)) % np.uint64(len(LAST_NAMES))).astype(np.int64)],
+        "sex": np.where((hashes >> np.uint64(32)) & np.uint64(1), "F", "M"),
+        "age_days": (65 * 365 + (hashes >> np.uint64(20)) % np.uint64(35 * 365)).astype(np.int64),
+        "facility": ((hashes >> np.uint64(48)) % np.uint64(config.facilities)).astype(np.int64),
+        "physician": ((hashes >> np.uint64(4)) % np.uint64(8)).astype(np.int64),
+        "payer": np.searchsorted(np.cumsum([share for _, _, share in PAYERS]),
+                                 ((hashes >> np.uint64(12)) % np.uint64(1000)).astype(np.int64) / 1000, side="right"),
+    }
+
+
+def _inject_dirty(chunk: pd.DataFrame, rng: np.random.Generator, rates: Dict[str, float]) -> None:
+    """Corrupt rows in place so each kind trips the validation rule of the same name."""
+    rows = len(chunk)
+
+    def pick(kind: str) -> np.ndarray:
+        return rng.random(rows) < rates.get(kind, 0.0)
+
+    mask = pick("required")
+    if mask.any():
+        columns = np.array(["PrimaryDiagnosisCode", "PatientDOB", "TotalCharge"])[rng.integers(0, 3, mask.sum())]
+        for column in set(columns):
+            chunk.loc[np.flatnonzero(mask)[columns == column], column] = ""
+    mask = pick("npi_checksum")
+    if mask.any():
+        npis = chunk.loc[mask, "AttendingPhysicianNPI"]
+        wrong = (npis.str[-1].astype(int) + 1) % 10
+        chunk.loc[mask, "AttendingPhysicianNPI"] = npis.str[:-1] + wrong.astype(str)
+    mask = pick("icd10_format")
+    if mask.any():
+        chunk.loc[mask, "PrimaryDiagnosisCode"] = "250.00"  # ICD-9 code where ICD-10 is required
+    mask = pick("hcpcs_format")
+    if mask.any():
+        chunk.loc[mask, "HCPCSCode2"] = chunk.loc[mask, "HCPCSCode2"].str[:3]
+    mask = pick("total_mismatch") & chunk["TotalCharge"].ne("").to_numpy()
+    if mask.any():
+        totals = pd.to_numeric(chunk.loc[mask, "TotalCharge"], errors="coerce")
+        chunk.loc[mask, "TotalCharge"] = (totals + rng.integers(1, 500, mask.sum())).astype("Int64").astype(str)
+    mask = pick("date_order")
+    if mask.any():
+        admission = chunk.loc[mask, "AdmissionDate"].copy()
+        chunk.loc[mask, "AdmissionDate"] = chunk.loc[mask, "DischargeDate"]
+        chunk.loc[mask, "DischargeDate"] = admission
+    mask = pick("date_format")
+    if mask.any():
+        dates = pd.to_datetime(chunk.loc[mask, "AdmissionDate"], format="%m/%d/%Y", errors="coerce")
+        chunk.loc[mask, "AdmissionDate"] = dates.dt.strftime("%Y-%m-%d").fillna("")
+
+
+def iter_claim_chunks(rows: int, config: Optional[SyntheticClaimConfig] = None) -> Iterator[pd.DataFrame]:
+    """
+    Generate `rows` synthetic claims as DataFrames of at most config.chunk_size rows.
+
+    Every cell is a string in the CSV's own format. Besides CLAIM_COLUMNS each
+    chunk carries a "_period" column (YYYY-MM of the clean admission date) used
+    to partition shards; writers drop it.
+
+    Clean rows pass validate_claims: NPIs carry valid check digits, codes come
+    from real ICD-10/revenue/HCPCS code sets, TotalCharge equals the line
+    charges and DOB < admission <= discharge. Patients recur across claims
+    (repeat_patient_rate) and some distinct patients share a name
+    (name_collision_rate).
+    """
+    config = config or SyntheticClaimConfig()
+    unknown = set(config.dirty_rates) - set(DIRTY_KINDS)
+    if unknown:
+        raise ValueError(f"Unknown dirty data kinds {sorted(unknown)}. Use {list(DIRTY_KINDS)}")
+    rng = np.random.default_rng(config.seed)
+    facilities = _Facilities(config)
+    start = int(pd.Timestamp(config.start_date).value // 86_400_000_000_000)
+    end = int(pd.Timestamp(config.end_date).value // 86_400_000_000_000)
+    patients_seen = 0
+
+    for first_row in range(0, rows, config.chunk_size):
+        size = min(config.chunk_size, rows - first_row)
+
+        # --- Patients: new ones get the next id, repeats reuse an earlier id ---
+        is_new = (rng.random(size) >= config.repeat_patient_rate) | (patients_seen == 0)
+        patient_ids = np.empty(size, dtype=np.int64)
+        patient_ids[is_new] = patients_seen + np.arange(is_new.sum())
+        patient_ids[~is_new] = rng.integers(0, max(patients_seen, 1), (~is_new).sum())
+        patients_seen += int(is_new.sum())
+        patient = _patients(patient_ids, config)
+
+        # --- Stay and charges ---
+        admission = rng.integers(start, end + 1, size)
+        stay = rng.integers(1, 31, size)
+        room = rng.integers(0, len(ROOM_LINES), size)
+        room_rate = np.array([low for _, low, _ in ROOM_LINES])[room] + rng.integers(0, 100, size)
+        ancillary = rng.integers(0, len(ANCILLARY_LINES), size)
+        ancillary_units = rng.integers(1, 11, size)
+        ancillary_low = np.array([low for _, _, low, _ in ANCILLARY_LINES])[ancillary]
+        ancillary_high = np.array([high for _, _, _, high in ANCILLARY_LINES])[ancillary]
+        ancillary_price = ancillary_low + (rng.random(size) * (ancillary_high - ancillary_low)).astype(np.int64)
+        charges1 = stay * room_rate
+        charges2 = ancillary_units * ancillary_price
+        facility = patient["facility"]
+
+        chunk = pd.DataFrame({
+            "FacilityName": facilities.names[facility],
+            "FacilityNPI": facilities.npis[facility],
+            "FacilityAddress": facilities.addresses[facility],
+            "PatientControlNumber": "PCN" + pd.Series(first_row + np.arange(size) + 1_000_001).astype(str),
+            "MedicalRecordNumber": "MRN" + pd.Series(patient_ids + 2_000_001).astype(str),
+            "PatientLastName": patient["last"],
+            "PatientFirstName": patient["first"],
+            "PatientDOB": _us_dates(admission - patient["age_days"]),
+            "PatientSex": patient["sex"],
+            "AdmissionDate": _us_dates(admission),
+            "DischargeDate": _us_dates(admission + stay),
+            "BillType": "111",
+            "RevenueCode1": np.array([code for code, _, _ in ROOM_LINES], dtype=object)[room],
+            "HCPCSCode1": "",
+            "Units1": stay.astype(str),
+            "Charges1": charges1.astype(str),
+            "RevenueCode2": np.array([code for code, _, _, _ in ANCILLARY_LINES], dtype=object)[ancillary],
+            "HCPCSCode2": np.array([code for _, code, _, _ in ANCILLARY_LINES], dtype=object)[ancillary],
+            "Units2": ancillary_units.astype(str),
+            "Charges2": charges2.astype(str),
+            "TotalCharge": (charges1 + charges2).astype(str),
+            "PrimaryPayerName": np.array([name for name, _, _ in PAYERS], dtype=object)[patient["payer"]],
+            "PrimaryPayerID": np.array([payer_id for _, payer_id, _ in PAYERS], dtype=object)[patient["payer"]],
+            "PrimaryDiagnosisCode": np.asarray(PRIMARY_DIAGNOSES, dtype=object)[rng.integers(0, len(PRIMARY_DIAGNOSES), size)],
+            "SecondaryDiagnosisCode1": np.asarray(SECONDARY_DIAGNOSES, dtype=object)[rng.integers(0, len(SECONDARY_DIAGNOSES), size)],
+            "AttendingPhysicianNPI": facilities.physician_npis[facility, patient["physician"]],
+        })
+        stamps = pd.to_datetime(admission, unit="D")
+        chunk["_period"] = (pd.Series(stamps.year).astype(str) + "-"
+                            + pd.Series(stamps.month).astype(str).str.zfill(2)).to_numpy()
+        if config.dirty_rates:
+            _inject_dirty(chunk, rng, config.dirty_rates)
+        yield chunk
+
+
+def write_csv(path: str, rows: int, config: Optional[SyntheticClaimConfig] = None) -> int:
+    """Stream synthetic claims into one CSV file. Returns the number of rows written."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        for chunk in iter_claim_chunks(rows, config):
+            chunk[CLAIM_COLUMNS].to_csv(csv_file, index=False, header=written == 0)
+            written += len(chunk)
+    return written
+
+
+def write_parquet(path: str, rows: int, config: Optional[SyntheticClaimConfig] = None) -> int:
+    """Stream synthetic claims into one Parquet file (one row group per chunk). Needs pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    schema = pa.schema([(column, pa.string()) for column in CLAIM_COLUMNS])
+    written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_claim_chunks(rows, config):
+            writer.write_table(pa.Table.from_pandas(chunk[CLAIM_COLUMNS], schema=schema, preserve_index=False))
+            written += len(chunk)
+    return written
+
+
+def write_shards(directory: str, rows: int, config: Optional[SyntheticClaimConfig] = None) -> int:
+    """
+    Stream synthetic claims into a sharded knowledge base, one CSV per
+    facility and admission month (<directory>/<facility>/<YYYY-MM>.csv).
+    """
+    from rag_agent.knowledge_base import facility_key
+
+    written = 0
+    started_files = set()
+    for chunk in iter_claim_chunks(rows, config):
+        for (facility, period), part in chunk.groupby(["FacilityName", "_period"], sort=False):
+            path = os.path.join(directory, facility_key(facility), f"{period}.csv")
+            new_file = path not in started_files
+            if new_file:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                started_files.add(path)
+            part[CLAIM_COLUMNS].to_csv(path, mode="w" if new_file else "a", index=False, header=new_file)
+        written += len(chunk)
+    return written
+
+
+def main():
+    """
+    Generate a synthetic claims file (or sharded directory) for load tests.
+    """
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic UB-04 claims.")
+    parser.add_argument("output", help="Output .csv/.parquet file, or a directory with --format shards")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--format", choices=["csv", "parquet", "shards"], default=None,
+                        help="Defaults to the output file extension")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--facilities", type=int, default=5)
+    parser.add_argument("--repeat-rate", type=float, default=0.3)
+    parser.add_argument("--collision-rate", type=float, default=0.01)
+    parser.add_argument("--dirty-rate", type=float, default=0.0,
+                        help="Rate applied to every dirty-data kind")
+    parser.add_argument("--dirty", action="append", default=[], metavar="KIND=RATE",
+                        help=f"Per-kind rate, repeatable. Kinds: {', '.join(DIRTY_KINDS)}")
+    args = parser.parse_args()
+
+    dirty_rates = {kind: args.dirty_rate for kind in DIRTY_KINDS} if args.dirty_rate else {}
+    for item in args.dirty:
+        kind, _, rate = item.partition("=")
+        dirty_rates[kind] = float(rate)
+    config = SyntheticClaimConfig(
+        seed=args.seed, facilities=args.facilities, repeat_patient_rate=args.repeat_rate,
+        name_collision_rate=args.collision_rate, dirty_rates=dirty_rates,
+    )
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    writer = {"csv": write_csv, "parquet": write_parquet, "shards": write_shards}[output_format]
+
+    started = time.perf_counter()
+    written = writer(args.output, args.rows, config)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {written} claims to {args.output} ({output_format}) in {elapsed:.1f}s "
+          f"({written / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
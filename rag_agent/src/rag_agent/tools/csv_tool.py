@@ -1,11 +1,12 @@
-import pandas as pd
-import chromadb
-from typing import Type, Callable
-from pydantic import BaseModel, Field
+from typing import Type, Callable, List, Optional
+from pydantic import BaseModel, Field, ValidationError
 from crewai.tools import BaseTool
 import json
 import os
 from dotenv import load_dotenv
+from rag_agent.knowledge_base import DEFAULT_DB_PATH, ShardedKnowledgeBase, claim_where
+from rag_agent.memory_profile import memory_profiler
+from rag_agent.models import UB04Claim
 # Import the specific embedding function we will use
 from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 
@@ -15,19 +16,39 @@ load_dotenv()
 class CSVKnowledgeToolInput(BaseModel):
     """Input schema for CSVKnowledgeTool."""
     patient_name: str = Field(..., description="The full name of the patient to search for in the CSV.")
+    mrn: Optional[str] = Field(None, description="Optional Medical Record Number to pick one patient when several share a name.")
+    facility: Optional[str] = Field(None, description="Optional facility name to search only that facility's claims.")
+    payer: Optional[str] = Field(None, description="Optional primary payer name (e.g. 'Medicare') to search only claims billed to that payer.")
+    period: Optional[str] = Field(None, description="Optional billing period (YYYY-MM, or YYYY) to search only that period's claims.")
+    start_date: Optional[str] = Field(None, description="Optional start of the service dates wanted (YYYY-MM-DD or YYYY-MM); the patient's latest claim in the range is returned.")
+    end_date: Optional[str] = Field(None, description="Optional end of the service dates wanted (YYYY-MM-DD or YYYY-MM).")
 
 class CSVKnowledgeTool(BaseTool):
     name: str = "RAG CSV Knowledge Tool"
     description: str = (
         "Searches a CSV file of patient claims to find data for a specific patient. "
-        "Uses a RAG pipeline with OpenAI embeddings for accurate semantic search."
+        "Uses a RAG pipeline with OpenAI embeddings for accurate semantic search. "
+        "Returns the patient's latest claim (or latest within start_date/end_date) as JSON "
+        "already shaped like the UB-04 claim model. Facility, payer and dates also filter "
+        "which patients can match, so a name shared across facilities can be told apart."
     )
     args_schema: Type[BaseModel] = CSVKnowledgeToolInput
+    # A claims CSV, or a directory of per-facility/per-period shards (see knowledge_base.discover_shards)
     csv_path: str
-    db_path: str = "db/chroma"
+    # ChromaDB directory; relative paths resolve against the knowledge directory, not the working directory
+    db_path: str = DEFAULT_DB_PATH
     collection_name: str = ""
-    df: pd.DataFrame = None
-    collection: chromadb.Collection = None
+    # "chroma" (persistent ChromaDB) or "numpy" (flat memory-mapped index saved next to the CSV)
+    vector_backend: str = "chroma"
+    # "claim" returns a UB04Claim-shaped payload, "row" returns the raw flat CSV row
+    output_format: str = "claim"
+    # Name matches scoring at least this much skip the embedding search entirely
+    name_match_threshold: float = 0.8
+    # Newest periods per facility loaded at startup; None loads every shard
+    active_periods: Optional[int] = 1
+    # Open already-built vector indexes without indexing checks or writes (parallel workers)
+    read_only: bool = False
+    knowledge_base: ShardedKnowledgeBase = None
     embedding_function: Callable = None
 
     def __init__(self, csv_path: str, **kwargs):
@@ -55,70 +76,156 @@ class CSVKnowledgeTool(BaseTool):
 
     def _setup_rag(self):
         """
-        Sets up the RAG pipeline. This involves loading the CSV, initializing the 
-        vector database, and indexing the data if it hasn't been already.
+        Sets up the RAG pipeline. This involves discovering the knowledge shards
+        (a single CSV is one shard), loading the active ones in parallel into
+        compact claim tables with name indexes, and opening each shard's vector
+        store, indexing the data if it hasn't been already.
         """
-        # 1. Load the CSV data into a pandas DataFrame
-        self.df = pd.read_csv(self.csv_path)
-        # Ensure name columns are strings for consistent processing
-        self.df['PatientFirstName'] = self.df['PatientFirstName'].astype(str)
-        self.df['PatientLastName'] = self.df['PatientLastName'].astype(str)
-
-        # 2. Initialize a persistent ChromaDB client
-        if not os.path.exists(self.db_path):
-            os.makedirs(self.db_path)
-        client = chromadb.PersistentClient(path=self.db_path)
-        
-        # 3. Get or create the collection, passing the internal embedding function
-        self.collection = client.get_or_create_collection(
-            name=self.collection_name,
-            embedding_function=self.embedding_function
+        self.knowledge_base = ShardedKnowledgeBase(
+            path=self.csv_path,
+            embedding_function=self.embedding_function,
+            vector_backend=self.vector_backend,
+            db_path=self.db_path,
+            collection_name=self.collection_name,
+            active_periods=self.active_periods,
+            read_only=self.read_only,
         )
+        self.knowledge_base.load_active()
+
+    def _vector_search(self, patient_name: str, shards, where=None):
+        """Return the global row id of the closest embedding match (among rows matching `where`), or None."""
+        print(f"RAG Tool: Searching for patient '{patient_name}' with OpenAI embeddings...")
+        return self.knowledge_base.vector_search(patient_name, shards, where=where)
 
-        # 4. Check if the collection is already populated to avoid re-indexing
-        if self.collection.count() == 0:
-            print(f"ChromaDB collection '{self.collection_name}' is empty. Indexing CSV data with OpenAI embeddings...")
-            
-            # Create a descriptive document for each row to improve search quality
-            documents = []
-            for index, row in self.df.iterrows():
-                doc = (
-                    f"Patient Name: {row['PatientFirstName']} {row['PatientLastName']}. "
-                    f"Medical Record Number: {row['MedicalRecordNumber']}. "
-                    f"Payer: {row['PrimaryPayerName']}. "
-                    f"Admission Date: {row['AdmissionDate']}."
-                )
-                documents.append(doc)
-            
-            # Add the documents to the collection.
-            self.collection.add(
-                documents=documents,
-                ids=[str(i) for i in self.df.index] # Use row index as a unique ID
-            )
-            print("Indexing complete.")
-
-    def _run(self, patient_name: str) -> str:
+    def source_claim(self, patient_name: str) -> Optional[UB04Claim]:
         """
-        The main execution method. It takes a patient's name, searches the 
-        vector database, and returns the full data for the best match as a JSON string.
+        The claim a confident, unambiguous name match resolves to, decoded the
+        same way _run does but without any vector search; None when _run would
+        need the embeddings, an MRN or would return a raw row.
         """
-        print(f"RAG Tool: Searching for patient '{patient_name}' with OpenAI embeddings...")
-        
-        # 1. Query the collection to find the most similar document
-        results = self.collection.query(
-            query_texts=[patient_name],
-            n_results=1
-        )
+        shards = self.knowledge_base.route()
+        match = self.knowledge_base.search_names(patient_name, shards)
+        if not match.best or match.ambiguous or match.best.score < self.name_match_threshold:
+            return None
+        try:
+            return UB04Claim.from_csv_row(
+                self.knowledge_base.record(self._latest_claim(match.best.row_ids[0], shards), shards))
+        except ValidationError:
+            return None
 
-        # 2. Handle cases where no results are found
-        if not results or not results['ids'][0]:
-            return f"Error: No patient found matching the name '{patient_name}'."
+    def _latest_claim(self, global_id: int, shards, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None, where=None) -> Optional[int]:
+        """The newest claim (within the dates and filter, if any) of the patient owning a matched row."""
+        mrn = self.knowledge_base.record(int(global_id), shards)['MedicalRecordNumber']
+        if not mrn:
+            return None if start_date or end_date else int(global_id)
+        claims = self.knowledge_base.patient_claims(mrn, shards, start=start_date, end=end_date, latest=1, where=where)
+        return claims[0] if claims else None
 
-        # 3. Get the ID of the best match, which is our row index
-        best_match_id = results['ids'][0][0]
-        
-        # 4. Retrieve the full data row from the original DataFrame
-        patient_data_row = self.df.loc[int(best_match_id)]
+    def patient_claims(self, patient_name: Optional[str] = None, mrn: Optional[str] = None,
+                       start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       latest: Optional[int] = None, facility: Optional[str] = None,
+                       payer: Optional[str] = None) -> List[UB04Claim]:
+        """
+        All of a patient's claims across the archive, oldest service period first.
+
+        Args:
+            patient_name: Used when no MRN is given; must be a confident, unambiguous name match.
+            mrn: Medical Record Number.
+            start_date: Only claims whose service period ends on or after this date.
+            end_date: Only claims whose service period starts on or before this date.
+            latest: Only the newest N claims.
+            facility: Only this facility's claims.
+            payer: Only claims billed to this primary payer.
+
+        Returns:
+            List[UB04Claim]: One claim per row. Raises ValueError when the
+            patient cannot be identified or a row does not fit the claim model.
+        """
+        shards = self.knowledge_base.route_dates(start_date, end_date, facility=facility)
+        where = claim_where(facility=facility, payer=payer)
+        if not mrn:
+            match = self.knowledge_base.search_names(patient_name or "", shards, where=where)
+            if not match.best or match.ambiguous or match.best.score < self.name_match_threshold:
+                raise ValueError(f"No unambiguous patient named '{patient_name}'; pass the MRN instead")
+            mrn = match.best.mrns[0]
+        rows = self.knowledge_base.patient_claims(mrn, shards, start=start_date, end=end_date, latest=latest,
+                                                  where=where)
+        return [UB04Claim.from_csv_row(self.knowledge_base.record(row, shards)) for row in rows]
+
+    def _run(self, patient_name: str, mrn: Optional[str] = None, facility: Optional[str] = None,
+             period: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None,
+             payer: Optional[str] = None) -> str:
+        with memory_profiler.stage("lookup"):
+            return self._lookup(patient_name, mrn, facility, period, start_date, end_date, payer)
+
+    def _lookup(self, patient_name: str, mrn: Optional[str], facility: Optional[str], period: Optional[str],
+                start_date: Optional[str], end_date: Optional[str], payer: Optional[str] = None) -> str:
+        """
+        The main execution method. It takes a patient's name, matches it against
+        the approximate name index (falling back to the vector database), and
+        returns the full data of that patient's latest claim as a JSON string.
+        A facility and/or period restricts the search to the matching knowledge
+        shards; a start/end date picks the latest claim overlapping those dates,
+        searching every period that can hold one. Facility, payer and dates
+        also become a metadata filter (knowledge_base.claim_where) on the name
+        matches and the vector search.
+        """
+        try:
+            if start_date or end_date:
+                shards = self.knowledge_base.route_dates(start_date, end_date, facility=facility)
+            else:
+                shards = self.knowledge_base.route(facility=facility, period=period)
+            where = claim_where(facility=facility, payer=payer, start=start_date, end=end_date)
+        except ValueError as e:
+            return f"Error: {e}"
+        if not shards:
+            if start_date or end_date:
+                return f"Error: No claims on file between {start_date or 'the first'} and {end_date or 'the last'} period."
+            return f"Error: No claims on file for facility '{facility or '*'}' and period '{period or '*'}'."
+
+        # 1. An MRN identifies the patient; otherwise try the approximate name index
+        # first: it is local, fast and scored
+        match = None if mrn else self.knowledge_base.search_names(patient_name, shards, where=where)
+        if mrn:
+            best_match_id = self.knowledge_base.find_mrn(mrn, shards, where=where)
+            if best_match_id is None:
+                if where:
+                    return f"Error: No claims for Medical Record Number '{mrn}' with the given facility, payer or dates."
+                return f"Error: No patient found with Medical Record Number '{mrn}'."
+        elif match.best and match.best.score >= self.name_match_threshold:
+            if match.ambiguous:
+                # Never guess between patients; let the agent see the candidates
+                return json.dumps({
+                    "error": f"Ambiguous patient name '{patient_name}'. Retry with the matching 'mrn'.",
+                    "candidates": [
+                        {"name": c.name, "score": c.score, "mrns": c.mrns}
+                        for c in match.candidates
+                    ],
+                })
+            print(f"RAG Tool: Matched '{patient_name}' to '{match.best.name}' (score {match.best.score})")
+            best_match_id = match.best.row_ids[0]
+        else:
+            best_match_id = self._vector_search(patient_name, shards, where)
+            if best_match_id is None:
+                if where:
+                    return f"Error: No patient matching the name '{patient_name}' with the given facility, payer or dates."
+                return f"Error: No patient found matching the name '{patient_name}'."
+
+        # 2. A long-stay patient has one claim per period: take the latest (in the date range)
+        best_match_id = self._latest_claim(best_match_id, shards, start_date, end_date, where)
+        if best_match_id is None:
+            return f"Error: No claims for '{patient_name}' between {start_date or 'the first'} and {end_date or 'the last'} period."
+
+        # 3. Decode the full row from the shard's claim table
+        patient_data_row = self.knowledge_base.record(int(best_match_id), shards)
         
-        # 5. Convert the row to a dictionary and then to a JSON string for the agent
+        # 4. Shape the row like UB04Claim so the agent can pass it through unchanged
+        if self.output_format == "claim":
+            try:
+                return UB04Claim.from_csv_row(patient_data_row).model_dump_json()
+            except ValidationError as e:
+                # Dirty rows fall back to the raw columns so the agent can still work with them
+                print(f"RAG Tool: Row {best_match_id} does not fit the claim model, returning raw row: {e}")
+
         return patient_data_row.to_json()
@@ -1,8 +1,32 @@
 import fitz  # PyMuPDF
 from crewai.tools import BaseTool
-from pydantic import BaseModel, Field
-from typing import Type, Dict, Any
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import Type, Dict, Any, NamedTuple, Optional
+import hashlib
 import os
+import threading
+import time
+
+from rag_agent.field_map import DEFAULT_FIELD_MAP_PATH, FieldMap, load_field_map
+from rag_agent.memory_profile import memory_profiler
+
+# Named ways of writing the filled form:
+#   fast     copy the template and append the filled fields as an incremental update
+#   compact  full rewrite with unused objects dropped and streams deflated
+#   archive  fields baked into the page (no longer editable) plus maximum compression
+SAVE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "fast": {"incremental": True},
+    "compact": {"garbage": 4, "deflate": True, "clean": True},
+    "archive": {"garbage": 4, "deflate": True, "deflate_images": True, "deflate_fonts": True,
+                "clean": True, "use_objstms": 1},
+}
+
+class RenderRecord(NamedTuple):
+    """A fill that was saved successfully: where, when (time.time()) and from which claim data."""
+    path: str
+    finished_at: float
+    claim_data: Dict[Any, Any]
+
 
 class PDFFormFillerInput(BaseModel):
     """Input schema for the PDF Form Filler Tool."""
@@ -14,6 +38,110 @@ class PDFFormFillerTool(BaseTool):
     args_schema: Type[BaseModel] = PDFFormFillerInput
     template_path: str = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../template/ub-40-.pdf"))
     output_path: str = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../output/ub04_claim_filled.pdf"))   
+    # One of SAVE_PROFILES; the worker and batch runs may switch it per job
+    save_profile: str = os.getenv("PDF_SAVE_PROFILE", "compact")
+    # Declarative map from claim JSON to template fields (see config/ub04_field_map.yaml)
+    field_map_path: str = DEFAULT_FIELD_MAP_PATH
+    # Template bytes are read once and reused, so repeated fills never touch the disk for it
+    _template_bytes: Optional[bytes] = PrivateAttr(default=None)
+    _field_map: Optional[FieldMap] = PrivateAttr(default=None)
+    _render_fingerprint: Optional[str] = PrivateAttr(default=None)
+    _last_render: Optional[RenderRecord] = PrivateAttr(default=None)
+
+    @property
+    def last_render(self) -> Optional[RenderRecord]:
+        """The most recent successful fill (failed fills never replace it)."""
+        return self._last_render
+
+    def load_template(self) -> bytes:
+        """Read the UB-04 template into memory (once) and return its bytes."""
+        if self._template_bytes is None:
+            with open(self.template_path, "rb") as template_file:
+                self._template_bytes = template_file.read()
+        return self._template_bytes
+
+    def working_path(self) -> str:
+        """
+        Scratch file next to output_path that a fill is saved to. It replaces
+        the output only once the save succeeded, so a failed fill never leaves
+        a fresh (blank or partial) PDF at output_path.
+        """
+        directory, name = os.path.split(self.output_path)
+        return os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def open_template(self, save_profile: str, working_path: Optional[str] = None) -> fitz.Document:
+        """
+        Open a fresh copy of the template for filling.
+
+        Incremental saves must go back to the file the document was opened
+        from, so the "fast" profile first copies the template to the working
+        path (default: working_path()).
+        """
+        if SAVE_PROFILES[save_profile].get("incremental"):
+            working_path = working_path or self.working_path()
+            with open(working_path, "wb") as working_file:
+                working_file.write(self.load_template())
+            return fitz.open(working_path)
+        return fitz.open(stream=self.load_template(), filetype="pdf")
+
+    def load_field_map(self) -> FieldMap:
+        """
+        Compile the field map (once) against the template's first-page widgets.
+        A spec naming a field the template lacks raises ValueError here, at load time.
+        """
+        if self._field_map is None:
+            with fitz.open(stream=self.load_template(), filetype="pdf") as template:
+                widget_names = {widget.field_name for widget in template.load_page(0).widgets()}
+            self._field_map = load_field_map(widget_names, self.field_map_path)
+        return self._field_map
+
+    def render_fingerprint(self) -> str:
+        """Identifies the template bytes and field map a fill uses (part of the render cache key)."""
+        if self._render_fingerprint is None:
+            template_digest = hashlib.sha256(self.load_template()).hexdigest()[:16]
+            self._render_fingerprint = f"{template_digest}:{self.load_field_map().key}"
+        return self._render_fingerprint
+
+    @staticmethod
+    def fill_page(page: fitz.Page, values: Dict[str, str], suffix: str = "") -> int:
+        """
+        Set the page's widgets from values and return how many were filled.
+
+        A non-empty suffix renames every widget on the page, so the fields of
+        continuation pages stay independent of the same fields on page 1.
+        """
+        filled = 0
+        for widget in page.widgets():
+            if widget.field_name in values:
+                try:
+                    widget.field_value = values[widget.field_name]
+                    widget.update()
+                    filled += 1
+                except Exception as e:
+                    print(f"Error updating field {widget.field_name}: {e}")
+        if suffix:
+            # Renamed after filling: widgets of one field share the name, which lives on their parent
+            doc = page.parent
+            renamed = set()
+            for widget in page.widgets():
+                kind, parent = doc.xref_get_key(widget.xref, "Parent")
+                xref = int(parent.split()[0]) if kind == "xref" else widget.xref
+                if xref not in renamed:
+                    doc.xref_set_key(xref, "T", fitz.get_pdf_str(widget.field_name + suffix))
+                    renamed.add(xref)
+        return filled
+
+    def save_document(self, doc: fitz.Document, save_profile: str, path: Optional[str] = None) -> None:
+        """Write a filled document to path (default output_path) using the named save profile."""
+        options = SAVE_PROFILES[save_profile]
+        if options.get("incremental"):
+            # Appends to the file the document was opened from
+            doc.save(doc.name, **options, encryption=fitz.PDF_ENCRYPT_KEEP)
+            return
+        if save_profile == "archive":
+            # Turn the widgets into plain page content so the archived copy cannot be altered
+            doc.bake(annots=False, widgets=True)
+        doc.save(path or self.output_path, **options)
 
     def _run(self, claim_data: Dict[Any, Any]) -> str:
         try:
@@ -23,106 +151,61 @@ class PDFFormFillerTool(BaseTool):
             # Ensure the output directory exists
             os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
 
+            save_profile = self.save_profile
+            if save_profile not in SAVE_PROFILES:
+                return f"Error: Unknown save profile '{save_profile}'. Use one of {sorted(SAVE_PROFILES)}"
+
+            working_path = self.working_path()
+            try:
+                return self._fill(claim_data, save_profile, working_path)
+            finally:
+                if os.path.exists(working_path):
+                    os.remove(working_path)
+
+        except Exception as e:
+            print(f"Error in PDF filling tool: {e}")
+            return f"An error occurred while filling the PDF: {e}"
+
+    def _fill(self, claim_data: Dict[Any, Any], save_profile: str, working_path: str) -> str:
+        """Fill and save to working_path, then move the finished PDF onto output_path."""
+        with memory_profiler.stage("pdf_fill"):
+            # One {field: value} dict per form page; claims with more service
+            # lines than the template holds continue on copies of page 1
+            pages = self.load_field_map().flatten(claim_data)
+
             # Open the PDF template
-            doc = fitz.open(self.template_path)
+            doc = self.open_template(save_profile, working_path)
             if not doc:
                 return f"Error: Could not open template at {self.template_path}"
-                
-            page = doc.load_page(0)  # Load the first page
-            
-            # Debug: Print available fields in PDF
-            print("Available form fields:")
-            for widget in page.widgets():
-                print(f"Field name: {widget.field_name}, Type: {widget.field_type}")
 
-            # --- Create the mapping from PDF fields to our data ---
-            # This dictionary maps the PDF's internal field names to the values from the claim data.
-            value_mapping = {}
-            
-            # Map facility data
-            if "facility" in claim_data:
-                value_mapping['FacilityName'] = claim_data["facility"].get("name", "")
-                value_mapping['FacilityAddress'] = claim_data["facility"].get("address", "")
-            
-            # Map patient data
-            if "patient" in claim_data:
-                value_mapping['PatientFirstName'] = claim_data["patient"].get("first_name", "")
-                value_mapping['PatientLastName'] = claim_data["patient"].get("last_name", "")
-                value_mapping['PatientDOB'] = claim_data["patient"].get("dob", "")
-                value_mapping['PatientSex'] = claim_data["patient"].get("sex", "")
-                value_mapping['MedicalRecordNumber'] = claim_data["patient"].get("mrn", "")
-            
-            # Map visit data
-            if "visit" in claim_data:
-                value_mapping['PatientControlNumber'] = claim_data["visit"].get("patient_control_number", "")
-                value_mapping['AdmissionDate'] = claim_data["visit"].get("admission_date", "")
-                value_mapping['DischargeDate'] = claim_data["visit"].get("discharge_date", "")
-            
-            # Map payer data
-            if "payer" in claim_data:
-                value_mapping['PrimaryPayerName'] = claim_data["payer"].get("name", "")
-                value_mapping['PrimaryPayerID'] = claim_data["payer"].get("id", "")
-            
-            # Map billing data
-            if "bill_type" in claim_data:
-                value_mapping['BillType'] = claim_data.get("bill_type", "")
-            
-            # Map diagnoses data
-            if "diagnoses" in claim_data:
-                value_mapping['PrimaryDiagnosisCode'] = claim_data["diagnoses"].get("primary", "")
-                value_mapping['SecondaryDiagnosisCode1'] = claim_data["diagnoses"].get("secondary", "")
-            
-            # Map physician data
-            if "physicians" in claim_data and "attending" in claim_data["physicians"]:
-                value_mapping['AttendingPhysicianNPI'] = claim_data["physicians"]["attending"].get("npi", "")
-            
-            # Map total charge
-            if "total_charge" in claim_data:
-                value_mapping['TotalCharge'] = str(claim_data.get("total_charge", 0.0))
-            
-            # Map revenue lines
-            if "revenue_lines" in claim_data and len(claim_data["revenue_lines"]) > 0:
-                if len(claim_data["revenue_lines"]) > 0:
-                    value_mapping['RevenueCode1'] = str(claim_data["revenue_lines"][0].get("revenue_code", ""))
-                    value_mapping['HCPCSCode1'] = str(claim_data["revenue_lines"][0].get("hcpcs_code", "") or "")
-                    value_mapping['Units1'] = str(claim_data["revenue_lines"][0].get("units", 0))
-                    value_mapping['Charges1'] = str(claim_data["revenue_lines"][0].get("charge", 0.0))
-                
-                if len(claim_data["revenue_lines"]) > 1:
-                    value_mapping['RevenueCode2'] = str(claim_data["revenue_lines"][1].get("revenue_code", ""))
-                    value_mapping['HCPCSCode2'] = str(claim_data["revenue_lines"][1].get("hcpcs_code", "") or "")
-                    value_mapping['Units2'] = str(claim_data["revenue_lines"][1].get("units", 0))
-                    value_mapping['Charges2'] = str(claim_data["revenue_lines"][1].get("charge", 0.0))
-            
-            # Debug: Print our mapping
-            print("Value mapping:")
-            for key, value in value_mapping.items():
-                print(f"{key}: {value}")
-            
-            # --- Fill the PDF ---
-            successful_updates = 0
-            for widget in page.widgets():
-                if widget.field_name in value_mapping:
-                    try:
-                        # Set the field's value
-                        widget.field_value = value_mapping[widget.field_name]
-                        # Apply the change
-                        widget.update()
-                        print(f"Updated field {widget.field_name} with value {value_mapping[widget.field_name]}")
-                        successful_updates += 1
-                    except Exception as e:
-                        print(f"Error updating field {widget.field_name}: {e}")
-
-            # Save the filled PDF
             try:
-                doc.save(self.output_path, garbage=4, deflate=True, clean=True)
-                print(f"PDF saved to {self.output_path}")
+                successful_updates = self.fill_page(doc.load_page(0), pages[0])
+                for number, values in enumerate(pages[1:], start=2):
+                    continuation = fitz.open(stream=self.load_template(), filetype="pdf")
+                    successful_updates += self.fill_page(continuation.load_page(0), values, suffix=f"_p{number}")
+                    # Continuation pages go after the previous claim page, before the template's back page
+                    doc.insert_pdf(continuation, from_page=0, to_page=0, start_at=number - 1)
+                    continuation.close()
+            except Exception:
                 doc.close()
-                return f"Successfully filled PDF ({successful_updates} fields updated) and saved to '{self.output_path}'"
+                raise
+            print(f"Filled {successful_updates} fields on {len(pages)} page(s)")
+
+        # Save the filled PDF
+        with memory_profiler.stage("pdf_save"):
+            try:
+                self.save_document(doc, save_profile, working_path)
             except Exception as e:
                 print(f"Error saving PDF: {e}")
                 return f"Error saving PDF: {e}"
-
-        except Exception as e:
-            print(f"Error in PDF filling tool: {e}")
-            return f"An error occurred while filling the PDF: {e}"
+            finally:
+                doc.close()
+            try:
+                os.replace(working_path, self.output_path)
+            except OSError as e:
+                print(f"Error moving PDF to {self.output_path}: {e}")
+                return f"Error saving PDF: {e}"
+        self._last_render = RenderRecord(self.output_path, time.time(), claim_data)
+        print(f"PDF saved to {self.output_path} ({save_profile} profile)")
+        return (f"Successfully filled PDF ({successful_updates} fields updated, {len(pages)} page(s)) "
+                f"and saved to '{self.output_path}'")
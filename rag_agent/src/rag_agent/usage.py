@@ -0,0 +1,230 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+
+class TokenUsage(BaseModel):
+    """Prompt/completion token counts for one task, agent or claim."""
+    prompt_tokens: int = Field(0, description="Tokens sent to the LLM")
+    completion_tokens: int = Field(0, description="Tokens generated by the LLM")
+    total_tokens: int = Field(0, description="Prompt plus completion tokens")
+    successful_requests: int = Field(0, description="Number of completed LLM calls")
+
+    @classmethod
+    def from_metrics(cls, metrics: Any) -> "TokenUsage":
+        """Build a TokenUsage from a crewAI UsageMetrics object."""
+        return cls(
+            prompt_tokens=metrics.prompt_tokens,
+            completion_tokens=metrics.completion_tokens,
+            total_tokens=metrics.total_tokens,
+            successful_requests=metrics.successful_requests,
+        )
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            completion_tokens=self.completion_tokens + other.completion_tokens,
+            total_tokens=self.total_tokens + other.total_tokens,
+            successful_requests=self.successful_requests + other.successful_requests,
+        )
+
+    def __sub__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            prompt_tokens=self.prompt_tokens - other.prompt_tokens,
+            completion_tokens=self.completion_tokens - other.completion_tokens,
+            total_tokens=self.total_tokens - other.total_tokens,
+            successful_requests=self.successful_requests - other.successful_requests,
+        )
+
+
+class RouteUsage(BaseModel):
+    """Calls, latency and tokens of one model route (see rag_agent.routing) during a claim."""
+    model: str = Field("", description="Model behind the route")
+    calls: int = Field(0, description="LLM calls made on the route")
+    errors: int = Field(0, description="Calls that raised")
+    seconds: float = Field(0.0, description="Time spent waiting on the route's calls")
+    tokens: TokenUsage = Field(default_factory=TokenUsage, description="Tokens of the agents using the route")
+
+
+class ClaimUsage(BaseModel):
+    """Token and latency record for a single claim run."""
+    patient_name: str = Field("", description="Patient the claim was built for")
+    started_at: float = Field(..., description="Unix timestamp of the kickoff")
+    elapsed_seconds: float = Field(0.0, description="Wall-clock duration of the run")
+    tasks: Dict[str, TokenUsage] = Field(default_factory=dict, description="Usage per task, in execution order")
+    agents: Dict[str, TokenUsage] = Field(default_factory=dict, description="Usage per agent role")
+    total: TokenUsage = Field(default_factory=TokenUsage, description="Usage for the whole claim")
+    routes: Dict[str, RouteUsage] = Field(default_factory=dict, description="Usage per model route")
+    conversions: int = Field(0, description="Task outputs that needed conversion to their model")
+    conversion_llm_calls: int = Field(0, description="LLM calls spent converting task outputs")
+    conversion_retries: int = Field(0, description="Conversion attempts after the first")
+    error: Optional[str] = Field(None, description="Failure reason when the run did not finish")
+
+
+def _agent_usage(agent: Any) -> TokenUsage:
+    """Read the cumulative token counters crewAI keeps on each agent."""
+    token_process = getattr(agent, "_token_process", None)
+    if token_process is None:
+        return TokenUsage()
+    return TokenUsage.from_metrics(token_process.get_summary())
+
+
+class ClaimUsageTracker:
+    """
+    Records prompt/completion tokens per task and per agent for each claim.
+
+    crewAI only keeps cumulative counters per agent, so the tracker snapshots
+    those counters when a task finishes. With a sequential process the
+    difference between two snapshots is exactly the usage of the task that
+    just completed. Finished records are appended to a JSONL log so token and
+    latency trends can be compared across runs.
+    """
+
+    def __init__(self, log_path: Optional[str] = None, conversion_stats: Any = None):
+        self.log_path = log_path
+        # Optional counters with snapshot() -> (conversions, llm_calls, retries), see rag_agent.structured_output
+        self.conversion_stats = conversion_stats
+        self._conversion_start = (0, 0, 0)
+        self.agents: List[Any] = []
+        self.current: Optional[ClaimUsage] = None
+        self._agent_start: Dict[str, TokenUsage] = {}
+        self._route_start: Dict[str, tuple] = {}
+        self._first_total = TokenUsage()
+        self._last_total = TokenUsage()
+        self._started = 0.0
+
+    def _snapshot(self) -> TokenUsage:
+        total = TokenUsage()
+        for agent in self.agents:
+            total = total + _agent_usage(agent)
+        return total
+
+    def start(self, inputs: Dict[str, Any], agents: List[Any]) -> None:
+        """Begin a new claim record. Call before the crew kicks off."""
+        self.agents = list(agents)
+        self._started = time.perf_counter()
+        # Agents may be reused across claims, so only count what this run adds
+        self._agent_start = {agent.role.strip(): _agent_usage(agent) for agent in self.agents}
+        self._first_total = self._snapshot()
+        self._last_total = self._first_total
+        self._route_start = {llm.route: llm.snapshot() for llm in self._routes().values()}
+        if self.conversion_stats is not None:
+            self._conversion_start = self.conversion_stats.snapshot()
+        self.current = ClaimUsage(
+            patient_name=str(inputs.get("patient_name", "")),
+            started_at=time.time(),
+        )
+
+    def _routes(self) -> Dict[str, Any]:
+        """Agent role -> routed LLM, for agents whose LLM is a RoutedLLM."""
+        return {
+            agent.role.strip(): agent.llm
+            for agent in self.agents
+            if hasattr(getattr(agent, "llm", None), "snapshot")
+        }
+
+    def record_task(self, task_output: Any) -> None:
+        """Crew task callback: attribute the tokens spent since the last task."""
+        if self.current is None:
+            return
+        total = self._snapshot()
+        name = task_output.name or f"task_{len(self.current.tasks) + 1}"
+        self.current.tasks[name] = total - self._last_total
+        self._last_total = total
+
+    def fail(self, error: Any) -> Optional[ClaimUsage]:
+        """Close the current record of a run that raised (e.g. DeadlineExceeded)."""
+        if self.current is not None:
+            self.current.error = f"{type(error).__name__}: {error}" if isinstance(error, Exception) else str(error)
+        return self.finish()
+
+    def finish(self) -> Optional[ClaimUsage]:
+        """Close the current record, append it to the log and return it."""
+        if self.current is None:
+            return None
+        record = self.current
+        record.elapsed_seconds = round(time.perf_counter() - self._started, 3)
+        record.agents = {
+            agent.role.strip(): _agent_usage(agent) - self._agent_start.get(agent.role.strip(), TokenUsage())
+            for agent in self.agents
+        }
+        record.total = self._snapshot() - self._first_total
+        for role, llm in self._routes().items():
+            route = record.routes.setdefault(llm.route, RouteUsage(model=llm.model))
+            if route.calls == 0 and route.seconds == 0.0:
+                calls, errors, seconds = llm.snapshot()
+                start_calls, start_errors, start_seconds = self._route_start.get(llm.route, (0, 0, 0.0))
+                route.calls, route.errors = calls - start_calls, errors - start_errors
+                route.seconds = round(seconds - start_seconds, 3)
+            route.tokens = route.tokens + record.agents.get(role, TokenUsage())
+        if self.conversion_stats is not None:
+            conversions, llm_calls, retries = (
+                now - start for now, start in zip(self.conversion_stats.snapshot(), self._conversion_start)
+            )
+            record.conversions, record.conversion_llm_calls, record.conversion_retries = conversions, llm_calls, retries
+        self.current = None
+
+        if self.log_path:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as log_file:
+                log_file.write(record.model_dump_json() + "\n")
+        return record
+
+
+def load_usage_log(log_path: str) -> List[ClaimUsage]:
+    """Read every claim record from a JSONL usage log."""
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, "r", encoding="utf-8") as log_file:
+        return [ClaimUsage(**json.loads(line)) for line in log_file if line.strip()]
+
+
+def latency_percentiles(seconds: Sequence[float], percentiles: Sequence[float] = (50, 95, 99)) -> Dict[str, float]:
+    """Latency percentiles ("p50", "p95", "p99", ...) and the maximum of a list of durations."""
+    if len(seconds) == 0:
+        return {}
+    values = np.percentile(np.asarray(seconds, dtype=float), percentiles)
+    summary = {f"p{percentile:g}": round(float(value), 3) for percentile, value in zip(percentiles, values)}
+    summary["max"] = round(float(max(seconds)), 3)
+    return summary
+
+
+def latency_report(records: List[ClaimUsage]) -> Dict[str, Any]:
+    """
+    Tail-latency summary of a batch of claim runs, with the calls, latency
+    and tokens of every model route so routing choices can be compared.
+
+    Failed runs (deadline exceeded included) are counted in the percentiles:
+    they are the tail a batch waits on.
+    """
+    routes: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        for name, route in record.routes.items():
+            summary = routes.setdefault(name, {"models": [], "claims": 0, "calls": 0, "errors": 0,
+                                               "seconds": 0.0, "tokens": TokenUsage()})
+            if route.model not in summary["models"]:
+                summary["models"].append(route.model)
+            summary["claims"] += 1
+            summary["calls"] += route.calls
+            summary["errors"] += route.errors
+            summary["seconds"] += route.seconds
+            summary["tokens"] = summary["tokens"] + route.tokens
+    for summary in routes.values():
+        tokens = summary.pop("tokens")
+        summary["seconds_per_call"] = round(summary["seconds"] / summary["calls"], 3) if summary["calls"] else 0.0
+        summary["tokens_per_claim"] = round(tokens.total_tokens / summary["claims"], 1)
+        summary["prompt_tokens"] = tokens.prompt_tokens
+        summary["completion_tokens"] = tokens.completion_tokens
+        summary["seconds"] = round(summary["seconds"], 3)
+    return {
+        "claims": len(records),
+        "failed": sum(1 for record in records if record.error),
+        "latency_seconds": latency_percentiles([record.elapsed_seconds for record in records]),
+        "conversion_retries": sum(record.conversion_retries for record in records),
+        "conversion_llm_calls": sum(record.conversion_llm_calls for record in records),
+        "routes": routes,
+    }
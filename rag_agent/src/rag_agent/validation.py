@@ -0,0 +1,243 @@
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from rag_agent.models import revenue_line_numbers
+
+# Source formats for the code columns in ub04_claims.csv
+ICD10_PATTERN = r"[A-TV-Z][0-9][0-9A-Z](?:\.[0-9A-Z]{1,4})?"
+HCPCS_PATTERN = r"[A-V][0-9]{4}|[0-9]{4}[0-9A-Z]"
+DATE_FORMAT = "%m/%d/%Y"
+
+# Tolerance for comparing TotalCharge with the sum of the line charges
+CHARGE_TOLERANCE = 0.005
+
+REPORT_COLUMNS = ["row", "column", "rule", "value", "message"]
+
+
+class ClaimValidationError(Exception):
+    """Raised by the validation gate when claim rows fail validation."""
+
+    def __init__(self, report: pd.DataFrame):
+        self.report = report
+        super().__init__(
+            f"{report['row'].nunique()} claim row(s) failed validation "
+            f"({len(report)} error(s)). First error: {report.iloc[0]['message']}"
+        )
+
+
+def _missing(series: pd.Series) -> pd.Series:
+    """True where a cell is blank (NaN or whitespace only)."""
+    if not pd.api.types.is_string_dtype(series):
+        return series.isna()
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    unique_blank = pd.Series(uniques, dtype=object).astype(str).str.strip().eq("").to_numpy(dtype=bool)
+    # Factorize code -1 marks NaN, which maps onto the trailing True
+    return pd.Series(np.append(unique_blank, True)[codes], index=series.index)
+
+
+def _number(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce")
+
+
+def _matches(series: pd.Series, pattern: str) -> pd.Series:
+    """
+    Vectorized regex check of the non-blank cells of a code column.
+
+    Code columns have few distinct values, so the pattern is evaluated once per
+    unique value and broadcast back to the rows.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    text = pd.Series(uniques, dtype=object).map(_code_text).str.upper()
+    unique_ok = (text.str.fullmatch(pattern).fillna(False) | (text == "")).to_numpy(dtype=bool)
+    # Append a slot for blanks (factorize code -1) so they pass the format check
+    ok = np.append(unique_ok, True)[codes]
+    return pd.Series(ok, index=series.index)
+
+
+def _code_text(value) -> str:
+    """Render one code cell as text, dropping the '.0' pandas adds to numeric codes."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _whole_numbers(series: pd.Series, low: int, high: int) -> pd.Series:
+    """True where a cell is an integer in [low, high] (numeric or digit string)."""
+    number = _number(series)
+    return (number == np.floor(number)) & (number >= low) & (number <= high)
+
+
+def _errors(df: pd.DataFrame, mask: pd.Series, column: str, rule: str, message: str) -> pd.DataFrame:
+    """Turn a boolean failure mask into report rows."""
+    mask = mask.fillna(False).to_numpy(dtype=bool)
+    if not mask.any():
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    index = df.index[mask]
+    values = df[column].to_numpy()[mask].astype(str) if column in df else ""
+    return pd.DataFrame({
+        "row": index,
+        "column": column,
+        "rule": rule,
+        "value": values,
+        "message": message,
+    })
+
+
+def npi_luhn_valid(npi: pd.Series) -> pd.Series:
+    """
+    Vectorized NPI check-digit validation.
+
+    An NPI is 10 digits whose last digit is the Luhn check digit computed over
+    the card-issuer prefix "80840" followed by the first nine digits.
+
+    Args:
+        npi: Series of NPIs (int or str).
+
+    Returns:
+        pd.Series: Boolean series, True where the NPI is well formed and valid.
+    """
+    well_formed = _whole_numbers(npi, 10**9, 10**10 - 1).to_numpy(dtype=bool)
+    valid = np.zeros(len(npi), dtype=bool)
+    if well_formed.any():
+        # One row of ten digits per NPI, most significant digit first
+        number = _number(npi).to_numpy()[well_formed].astype(np.int64)
+        digits = (number[:, None] // 10 ** np.arange(9, -1, -1)) % 10
+        body, check = digits[:, :9], digits[:, 9]
+        # Luhn doubles every second digit from the right of the payload
+        doubled = body[:, ::2] * 2
+        doubled = np.where(doubled > 9, doubled - 9, doubled)
+        total = 24 + doubled.sum(axis=1) + body[:, 1::2].sum(axis=1)  # 24 = Luhn sum of "80840"
+        valid[well_formed] = (10 - total % 10) % 10 == check
+    return pd.Series(valid, index=npi.index)
+
+
+def validate_claims(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Validate every claim row of a ub04_claims DataFrame in one vectorized pass.
+
+    Checks TotalCharge against the sum of ChargesN, NPI check digits, ICD-10,
+    revenue and HCPCS code formats, and DOB <= admission <= discharge.
+
+    Args:
+        df: The claims DataFrame as loaded from ub04_claims.csv.
+
+    Returns:
+        pd.DataFrame: One row per error with columns row, column, rule, value
+        and message. Empty when every row is valid.
+    """
+    reports: List[pd.DataFrame] = []
+
+    # --- Charges ---
+    line_numbers = revenue_line_numbers(df.columns)
+    charge_columns = [f"Charges{n}" for n in line_numbers if f"Charges{n}" in df]
+    line_sum = df[charge_columns].apply(_number).fillna(0).sum(axis=1) if charge_columns else 0
+    total = _number(df["TotalCharge"])
+    reports.append(_errors(df, total.isna(), "TotalCharge", "required", "TotalCharge is missing or not numeric"))
+    reports.append(_errors(
+        df, (total - line_sum).abs() > CHARGE_TOLERANCE, "TotalCharge", "total_mismatch",
+        "TotalCharge does not equal the sum of the line charges",
+    ))
+
+    # --- NPIs ---
+    for column in ("FacilityNPI", "AttendingPhysicianNPI"):
+        if column in df:
+            reports.append(_errors(df, ~npi_luhn_valid(df[column]), column, "npi_checksum", f"{column} is not a valid NPI"))
+
+    # --- Diagnosis codes ---
+    reports.append(_errors(
+        df, _missing(df["PrimaryDiagnosisCode"]), "PrimaryDiagnosisCode", "required",
+        "PrimaryDiagnosisCode is missing",
+    ))
+    for column in [c for c in df.columns if re.fullmatch(r"(Primary|Secondary)DiagnosisCode\d*", c)]:
+        bad = ~_matches(df[column], ICD10_PATTERN)
+        reports.append(_errors(df, bad, column, "icd10_format", f"{column} is not a valid ICD-10 code"))
+
+    # --- Revenue lines ---
+    for n in line_numbers:
+        revenue_missing = _missing(df[f"RevenueCode{n}"])
+        bad = ~revenue_missing & ~_whole_numbers(df[f"RevenueCode{n}"], 1, 9999)
+        reports.append(_errors(df, bad, f"RevenueCode{n}", "revenue_code_format", f"RevenueCode{n} is not a 4-digit revenue code"))
+
+        charges = _number(df[f"Charges{n}"]) if f"Charges{n}" in df else pd.Series(np.nan, index=df.index)
+        reports.append(_errors(
+            df, revenue_missing & (charges.fillna(0) != 0), f"RevenueCode{n}", "required",
+            f"Charges{n} is billed without a RevenueCode{n}",
+        ))
+
+        if f"HCPCSCode{n}" in df:
+            bad = ~_matches(df[f"HCPCSCode{n}"], HCPCS_PATTERN)
+            reports.append(_errors(df, bad, f"HCPCSCode{n}", "hcpcs_format", f"HCPCSCode{n} is not a valid HCPCS/CPT code"))
+
+        if f"Units{n}" in df:
+            units = _number(df[f"Units{n}"])
+            reports.append(_errors(
+                df, ~revenue_missing & ~(units > 0), f"Units{n}", "units_positive",
+                f"Units{n} must be a positive number for a billed line",
+            ))
+
+    # --- Dates ---
+    dates: Dict[str, pd.Series] = {}
+    for column in ("PatientDOB", "AdmissionDate", "DischargeDate"):
+        dates[column] = pd.to_datetime(df[column], format=DATE_FORMAT, errors="coerce")
+        reports.append(_errors(df, dates[column].isna(), column, "date_format", f"{column} is missing or not MM/DD/YYYY"))
+    reports.append(_errors(
+        df, dates["PatientDOB"] > dates["AdmissionDate"], "PatientDOB", "date_order",
+        "PatientDOB is after AdmissionDate",
+    ))
+    reports.append(_errors(
+        df, dates["AdmissionDate"] > dates["DischargeDate"], "AdmissionDate", "date_order",
+        "AdmissionDate is after DischargeDate",
+    ))
+
+    reports = [report for report in reports if not report.empty]
+    if not reports:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.concat(reports, ignore_index=True).sort_values(["row", "column"], kind="stable").reset_index(drop=True)
+
+
+def validate_csv(csv_path: str) -> pd.DataFrame:
+    """Load a claims CSV (or Parquet shard) and return its validation report (see validate_claims)."""
+    started = time.perf_counter()
+    df = pd.read_parquet(csv_path) if csv_path.lower().endswith(".parquet") else pd.read_csv(csv_path)
+    report = validate_claims(df)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"Validated {csv_path} in {elapsed_ms:.1f} ms: {len(report)} error(s) in {report['row'].nunique()} row(s)")
+    return report
+
+
+def patient_rows(df: pd.DataFrame, patient_name: str) -> pd.Index:
+    """Index labels of the rows whose full name matches exactly, in either name order."""
+    first = df["PatientFirstName"].astype(str).str.strip().str.lower()
+    last = df["PatientLastName"].astype(str).str.strip().str.lower()
+    name = " ".join(patient_name.lower().split())
+    return df.index[((first + " " + last) == name) | ((last + " " + first) == name)]
+
+
+def validation_gate(
+    df: pd.DataFrame,
+    rows: Optional[pd.Index] = None,
+    ignore_rules: Iterable[str] = (),
+) -> pd.DataFrame:
+    """
+    Fail fast before a crew run if the claim rows that will be billed are invalid.
+
+    Args:
+        df: The claims DataFrame.
+        rows: Optional index labels to restrict the gate to (e.g. one patient's rows).
+        ignore_rules: Rule names (e.g. "npi_checksum") that should not block the run.
+
+    Returns:
+        pd.DataFrame: The (empty) report when the gate passes.
+
+    Raises:
+        ClaimValidationError: If any of the selected rows has an error.
+    """
+    report = validate_claims(df if rows is None else df.loc[rows])
+    report = report[~report["rule"].isin(list(ignore_rules))]
+    if not report.empty:
+        raise ClaimValidationError(report)
+    return report
@@ -0,0 +1,436 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# (id, score) pairs, best first. Higher scores are closer matches.
+QueryHits = List[Tuple[str, float]]
+# Typed values stored with a vector (Chroma accepts str, int, float and bool)
+Metadata = Dict[str, Union[str, int, float, bool]]
+# A Chroma `where` clause, e.g. {"$and": [{"facility": "oak_valley"}, {"admission_day": {"$gte": 20000}}]}
+Where = Dict[str, Any]
+
+_RANGE_OPERATORS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+
+
+def metadata_columns(metadatas: List[Optional[Metadata]]) -> Dict[str, np.ndarray]:
+    """
+    Metadata rows as one array per key, for evaluating `where` clauses.
+
+    Keys whose values are all numbers become float arrays (NaN where a row
+    lacks the key), others object arrays (None where missing).
+    """
+    keys = sorted({key for metadata in metadatas if metadata for key in metadata})
+    columns = {}
+    for key in keys:
+        values = [metadata.get(key) if metadata else None for metadata in metadatas]
+        present = [value for value in values if value is not None]
+        if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+            columns[key] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        else:
+            columns[key] = np.array(values, dtype=object)
+    return columns
+
+
+def where_mask(where: Where, columns: Dict[str, np.ndarray], count: int) -> np.ndarray:
+    """
+    Rows matching a Chroma `where` clause, evaluated on metadata_columns().
+
+    Supports what Chroma does for scalar metadata: "$and", "$or", a bare
+    value (equality) and the operators "$eq", "$ne", "$gt", "$gte", "$lt",
+    "$lte", "$in" and "$nin". Rows lacking a key never match a condition on it.
+    """
+    mask = np.ones(count, dtype=bool)
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            masks = [where_mask(clause, columns, count) for clause in condition]
+            if masks:
+                mask &= np.logical_and.reduce(masks) if key == "$and" else np.logical_or.reduce(masks)
+            continue
+        column = columns.get(key)
+        if column is None:
+            return np.zeros(count, dtype=bool)
+        if column.dtype == object:
+            present = np.array([value is not None for value in column], dtype=bool)
+        else:
+            present = ~np.isnan(column)
+        operators = condition if isinstance(condition, dict) else {"$eq": condition}
+        for operator, operand in operators.items():
+            if operator == "$eq":
+                matched = column == operand
+            elif operator == "$ne":
+                matched = column != operand
+            elif operator in ("$in", "$nin"):
+                matched = np.array([value in operand for value in column.tolist()], dtype=bool)
+                if operator == "$nin":
+                    matched = ~matched
+            elif operator in _RANGE_OPERATORS:
+                if column.dtype == object:
+                    raise ValueError(f"'{operator}' needs numeric metadata, but '{key}' is not numeric")
+                with np.errstate(invalid="ignore"):
+                    matched = _RANGE_OPERATORS[operator](column, operand)
+            else:
+                raise ValueError(f"Unsupported where operator '{operator}'")
+            mask &= np.asarray(matched, dtype=bool) & present
+    return mask
+
+
+def where_matches(where: Where, metadata: Metadata) -> bool:
+    """Whether one metadata row matches a Chroma `where` clause."""
+    return bool(where_mask(where, metadata_columns([metadata]), 1)[0])
+
+
+class VectorStore(ABC):
+    """Minimal interface CSVKnowledgeTool needs from a vector database."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored vectors."""
+
+    @abstractmethod
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[Metadata]] = None) -> None:
+        """Embed and store documents (and their metadata) under the given ids."""
+
+    @abstractmethod
+    def query(self, texts: List[str], n_results: int = 1, where: Optional[Where] = None) -> List[QueryHits]:
+        """Return the n_results closest ids for each query text, among the vectors matching `where`."""
+
+    @abstractmethod
+    def has_metadata(self) -> bool:
+        """Whether the stored vectors carry metadata (stores built before it was added do not)."""
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Metadata]) -> None:
+        """Set the metadata of already stored vectors, without re-embedding them."""
+
+
+_chroma_clients: Dict[str, Any] = {}
+_chroma_clients_lock = threading.Lock()
+
+
+def shared_chroma_client(db_path: str):
+    """
+    The process-wide PersistentClient for a database directory.
+
+    Every tool instance and shard opening the same directory shares one
+    client instead of each holding its own connection to the same files.
+    """
+    import chromadb
+
+    key = os.path.realpath(db_path)
+    with _chroma_clients_lock:
+        client = _chroma_clients.get(key)
+        if client is None:
+            os.makedirs(key, exist_ok=True)
+            client = _chroma_clients[key] = chromadb.PersistentClient(path=key)
+        return client
+
+
+class ReadOnlyVectorStoreError(RuntimeError):
+    """Raised when writing to a store opened read-only, or when a read-only store does not exist."""
+
+
+class ChromaVectorStore(VectorStore):
+    """VectorStore backed by a persistent ChromaDB collection."""
+
+    def __init__(self, db_path: str, collection_name: str, embedding_function: Callable,
+                 read_only: bool = False):
+        self.read_only = read_only
+        client = shared_chroma_client(db_path)
+        if read_only:
+            try:
+                self.collection = client.get_collection(name=collection_name, embedding_function=embedding_function)
+            except Exception as e:
+                raise ReadOnlyVectorStoreError(
+                    f"Collection '{collection_name}' not found in {db_path}; build the index before opening it read-only"
+                ) from e
+        else:
+            self.collection = client.get_or_create_collection(
+                name=collection_name,
+                embedding_function=embedding_function
+            )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[Metadata]] = None) -> None:
+        if self.read_only:
+            raise ReadOnlyVectorStoreError("Vector store was opened read-only")
+        self.collection.add(documents=documents, ids=ids, metadatas=metadatas)
+
+    def query(self, texts: List[str], n_results: int = 1, where: Optional[Where] = None) -> List[QueryHits]:
+        results = self.collection.query(query_texts=texts, n_results=n_results, where=where or None)
+        # Chroma returns distances (lower is closer); negate them so higher is better
+        return [
+            [(id_, -float(distance)) for id_, distance in zip(ids, distances)]
+            for ids, distances in zip(results["ids"], results["distances"])
+        ]
+
+    def has_metadata(self) -> bool:
+        if self.collection.count() == 0:
+            return True
+        return bool(self.collection.get(limit=1, include=["metadatas"])["metadatas"][0])
+
+    def update_metadata(self, ids: List[str], metadatas: List[Metadata]) -> None:
+        if self.read_only:
+            raise ReadOnlyVectorStoreError("Vector store was opened read-only")
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+
+class NumpyFlatVectorStore(VectorStore):
+    """
+    Exact (flat) cosine-similarity index kept in a memory-mapped float32 file.
+
+    Layout under `index_dir`:
+        vectors.f32     row-major float32 matrix, one L2-normalized row per document
+        ids.txt         one id per line, in row order
+        metadata.jsonl  one JSON object per row, in row order
+        meta.json       {"dim": int, "count": int, "metadata_count": int}, the
+                        number of committed rows and of those with metadata
+
+    Opening the store maps the matrix without reading it, so startup only
+    pays for reading the ids. Queries are scored with blocked matrix
+    products and a running top-k, so memory stays bounded even at millions
+    of rows. New documents are appended to the end of the file.
+
+    Metadata is read on the first filtered query and kept as one array per
+    key; a `where` clause is evaluated on those arrays (see where_mask) and
+    only the matching rows are scored.
+
+    With read_only=True the files are never modified (not even to drop the
+    leftovers of an interrupted append), so any number of processes can
+    share one index.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    IDS_FILE = "ids.txt"
+    META_FILE = "meta.json"
+    METADATA_FILE = "metadata.jsonl"
+
+    def __init__(self, index_dir: str, embedding_function: Callable, block_rows: int = 65536,
+                 embed_batch_size: int = 1000, read_only: bool = False):
+        self.index_dir = index_dir
+        self.read_only = read_only
+        self.embedding_function = embedding_function
+        self.block_rows = block_rows
+        self.embed_batch_size = embed_batch_size
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self.metadata_count = 0
+        self._metadata_columns: Optional[Dict[str, np.ndarray]] = None
+
+        meta_path = os.path.join(index_dir, self.META_FILE)
+        if read_only and not os.path.exists(meta_path):
+            raise ReadOnlyVectorStoreError(f"No index at {index_dir}; build it before opening it read-only")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            self.dim = meta["dim"]
+            ids_path = os.path.join(index_dir, self.IDS_FILE)
+            with open(ids_path, "r", encoding="utf-8") as ids_file:
+                ids = ids_file.read().splitlines()
+            self.ids = ids[:meta["count"]]
+            self.metadata_count = min(meta.get("metadata_count", 0), len(self.ids))
+            if len(ids) > len(self.ids) and not read_only:
+                # Lines past the committed count belong to an interrupted append
+                with open(ids_path, "w", encoding="utf-8") as ids_file:
+                    ids_file.write("".join(f"{id_}\n" for id_ in self.ids))
+            if not read_only:
+                self._drop_uncommitted_metadata()
+            self._map()
+
+    def _map(self) -> None:
+        vectors_path = os.path.join(self.index_dir, self.VECTORS_FILE)
+        if self.ids and os.path.exists(vectors_path):
+            self._matrix = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+        else:
+            self._matrix = None
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embedding_function(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def has_metadata(self) -> bool:
+        return self.metadata_count == len(self.ids)
+
+    def _load_metadata(self) -> Dict[str, np.ndarray]:
+        if self._metadata_columns is None:
+            metadatas: List[Optional[Metadata]] = []
+            metadata_path = os.path.join(self.index_dir, self.METADATA_FILE)
+            if self.metadata_count and os.path.exists(metadata_path):
+                with open(metadata_path, "r", encoding="utf-8") as metadata_file:
+                    for line in metadata_file:
+                        if len(metadatas) == self.metadata_count:
+                            break
+                        metadatas.append(json.loads(line))
+            # Rows without metadata match no filter
+            metadatas.extend([None] * (len(self.ids) - len(metadatas)))
+            self._metadata_columns = metadata_columns(metadatas)
+        return self._metadata_columns
+
+    def _commit(self) -> None:
+        # meta.json is replaced atomically and is the commit point for new rows and metadata
+        meta_path = os.path.join(self.index_dir, self.META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as meta_file:
+            json.dump({"dim": self.dim, "count": len(self.ids), "metadata_count": self.metadata_count}, meta_file)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[Metadata]] = None) -> None:
+        # Embedding APIs cap the inputs per request, so embed and append in batches
+        for start in range(0, len(ids), self.embed_batch_size):
+            end = start + self.embed_batch_size
+            self.add_vectors(ids[start:end], self._embed(documents[start:end]),
+                             metadatas[start:end] if metadatas is not None else None)
+
+    def add_vectors(self, ids: List[str], vectors: np.ndarray, metadatas: Optional[List[Metadata]] = None) -> None:
+        """
+        Append already-embedded vectors (rows are normalized here). Metadata is
+        only appended while every earlier row has some; otherwise the store
+        stays without it until update_metadata() fills it in.
+        """
+        if self.read_only:
+            raise ReadOnlyVectorStoreError("Vector store was opened read-only")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._matrix = None  # release the old mapping before growing the file
+        committed = len(self.ids)
+        ids = [str(id_) for id_ in ids]
+        # Truncate leftovers of an interrupted append before writing after the committed rows
+        with open(os.path.join(self.index_dir, self.VECTORS_FILE), "ab") as vectors_file:
+            vectors_file.truncate(committed * self.dim * 4)
+            vectors_file.write(np.ascontiguousarray(vectors).tobytes())
+        with open(os.path.join(self.index_dir, self.IDS_FILE), "w" if committed == 0 else "a", encoding="utf-8") as ids_file:
+            ids_file.write("".join(f"{id_}\n" for id_ in ids))
+        if metadatas is not None and self.metadata_count == committed:
+            self._write_metadata(metadatas, append=committed > 0)
+            self.metadata_count = committed + len(ids)
+        self.ids.extend(ids)
+        self._metadata_columns = None
+        self._commit()
+        self._map()
+
+    def _write_metadata(self, metadatas: List[Optional[Metadata]], append: bool) -> None:
+        with open(os.path.join(self.index_dir, self.METADATA_FILE), "a" if append else "w", encoding="utf-8") as metadata_file:
+            metadata_file.write("".join(json.dumps(metadata) + "\n" for metadata in metadatas))
+
+    def _drop_uncommitted_metadata(self) -> None:
+        """Cut metadata.jsonl back to the committed rows, dropping the lines of an interrupted append."""
+        metadata_path = os.path.join(self.index_dir, self.METADATA_FILE)
+        if not os.path.exists(metadata_path):
+            return
+        with open(metadata_path, "rb+") as metadata_file:
+            for _ in range(self.metadata_count):
+                if not metadata_file.readline():
+                    break
+            metadata_file.truncate(metadata_file.tell())
+
+    def update_metadata(self, ids: List[str], metadatas: List[Metadata]) -> None:
+        if self.read_only:
+            raise ReadOnlyVectorStoreError("Vector store was opened read-only")
+        rows = {id_: row for row, id_ in enumerate(self.ids)}
+        current: List[Optional[Metadata]] = [None] * len(self.ids)
+        metadata_path = os.path.join(self.index_dir, self.METADATA_FILE)
+        if self.metadata_count and os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as metadata_file:
+                for row, line in zip(range(self.metadata_count), metadata_file):
+                    current[row] = json.loads(line)
+        for id_, metadata in zip(ids, metadatas):
+            if str(id_) not in rows:
+                raise KeyError(f"No vector with id '{id_}'")
+            current[rows[str(id_)]] = metadata
+        # Keep the leading rows that have metadata; the rest waits for another update
+        complete = next((row for row, metadata in enumerate(current) if metadata is None), len(current))
+        with open(metadata_path + ".tmp", "w", encoding="utf-8") as metadata_file:
+            metadata_file.write("".join(json.dumps(metadata) + "\n" for metadata in current[:complete]))
+        os.replace(metadata_path + ".tmp", metadata_path)
+        self.metadata_count = complete
+        self._metadata_columns = None
+        self._commit()
+
+    def query(self, texts: List[str], n_results: int = 1, where: Optional[Where] = None) -> List[QueryHits]:
+        if self._matrix is None or not texts:
+            return [[] for _ in texts]
+        return self.query_vectors(self._embed(texts), n_results, where=where)
+
+    def query_vectors(self, queries: np.ndarray, n_results: int = 1, where: Optional[Where] = None) -> List[QueryHits]:
+        """Top-k search for already-embedded (normalized) query vectors, among the rows matching `where`."""
+        if self._matrix is None:
+            return [[] for _ in range(len(queries))]
+        rows = None
+        if where:
+            rows = np.flatnonzero(where_mask(where, self._load_metadata(), len(self.ids)))
+            if len(rows) == 0:
+                return [[] for _ in range(len(queries))]
+        queries = np.asarray(queries, dtype=np.float32)
+        total = len(self.ids) if rows is None else len(rows)
+        k = min(n_results, total)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+
+        for start in range(0, total, self.block_rows):
+            if rows is None:
+                block = self._matrix[start:start + self.block_rows]
+                block_rows = np.arange(start, start + len(block))
+            else:
+                block_rows = rows[start:start + self.block_rows]
+                block = self._matrix[block_rows]
+            scores = queries @ block.T  # (queries, block rows)
+            take = min(k, scores.shape[1])
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            # Merge this block's winners with the running top-k
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, block_rows[top]], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [
+            [(self.ids[row], float(score)) for row, score in zip(rows, scores)]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+
+
+def flat_index_dir(csv_path: str, collection_name: str) -> str:
+    """Directory of the NumPy flat index saved next to a CSV file."""
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), f".{stem}_{collection_name}")
+
+
+def create_vector_store(backend: str, csv_path: str, db_path: str, collection_name: str,
+                        embedding_function: Callable, read_only: bool = False) -> VectorStore:
+    """
+    Build the configured vector store backend.
+
+    Args:
+        backend: "chroma" (persistent ChromaDB) or "numpy" (flat memory-mapped index).
+        csv_path: Source CSV; the NumPy index is saved next to it.
+        db_path: ChromaDB directory.
+        collection_name: Collection / index name (encodes the embedding model).
+        embedding_function: Callable mapping a list of texts to embeddings.
+        read_only: Open an existing index without creating or modifying anything.
+    """
+    if backend == "chroma":
+        return ChromaVectorStore(db_path, collection_name, embedding_function, read_only=read_only)
+    if backend == "numpy":
+        return NumpyFlatVectorStore(flat_index_dir(csv_path, collection_name), embedding_function,
+                                    read_only=read_only)
+    raise ValueError(f"Unknown vector backend '{backend}'. Use 'chroma' or 'numpy'.")
@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from rag_agent.knowledge_base import ShardedKnowledgeBase, ShardInfo
+from rag_agent.usage import latency_percentiles
+
+
+class NewClaim(NamedTuple):
+    """A claim row that arrived in a dropped or grown knowledge file."""
+    global_id: int
+    patient_name: str
+    claim_id: str     # PatientControlNumber
+    file: str
+    dropped_at: float   # the file's last write (mtime), when it became complete
+    ingested_at: float
+
+
+def file_is_complete(path: str) -> bool:
+    """
+    Whether a file looks fully written: a CSV ends with a newline (no half
+    written last row), a Parquet file ends with its footer magic.
+    """
+    try:
+        with open(path, "rb") as data:
+            data.seek(0, os.SEEK_END)
+            size = data.tell()
+            if size == 0:
+                return False
+            if path.lower().endswith(".parquet"):
+                data.seek(size - 4)
+                return data.read(4) == b"PAR1"
+            data.seek(size - 1)
+            return data.read(1) in (b"\n", b"\r")
+    except OSError:
+        return False
+
+
+class KnowledgeWatcher:
+    """
+    Polls a knowledge base's files and ingests new or grown ones.
+
+    A file is only picked up once its size and modification time have not
+    changed for `settle_seconds` and it ends cleanly (see file_is_complete),
+    so extracts that are still being copied in are left alone. Ingesting
+    goes through ShardedKnowledgeBase.ingest: only rows the index does not
+    have yet are embedded. Files present when the watcher starts are taken
+    as already handled; ones the knowledge base does not know yet (extracts
+    ingested by an earlier watch session) are loaded without generating
+    their claims again.
+    """
+
+    def __init__(self, knowledge_base: ShardedKnowledgeBase, settle_seconds: float = 2.0):
+        self.knowledge_base = knowledge_base
+        self.settle_seconds = settle_seconds
+        self._handled: Dict[str, Tuple[int, int]] = {}          # path -> (size, mtime_ns) last ingested
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}  # path -> (signature, unchanged since)
+        known = {info.path for info in knowledge_base.shard_infos}
+        for info in knowledge_base.discover():
+            signature = self._signature(info.path)
+            if not signature:
+                continue
+            self._handled[info.path] = signature
+            if info.path not in known:
+                try:
+                    knowledge_base.ingest(info)
+                except Exception as e:
+                    print(f"Watch: could not load {os.path.basename(info.path)}: {type(e).__name__}: {e}")
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def poll(self, now: Optional[float] = None) -> List[NewClaim]:
+        """Check the files once; returns the claims of every file ingested by this poll."""
+        now = time.time() if now is None else now
+        new_claims: List[NewClaim] = []
+        for info in self.knowledge_base.discover():
+            signature = self._signature(info.path)
+            if signature is None or signature == self._handled.get(info.path):
+                self._pending.pop(info.path, None)
+                continue
+            pending = self._pending.get(info.path)
+            if pending is None or pending[0] != signature:
+                # New or still changing: wait until it has been quiet for settle_seconds
+                self._pending[info.path] = (signature, now)
+                continue
+            if now - pending[1] < self.settle_seconds or not file_is_complete(info.path):
+                continue
+            del self._pending[info.path]
+            new_claims.extend(self._ingest(info, signature))
+        return new_claims
+
+    def _ingest(self, info: ShardInfo, signature: Tuple[int, int]) -> List[NewClaim]:
+        try:
+            global_ids = self.knowledge_base.ingest(info)
+        except Exception as e:
+            # Handled either way: a broken file is retried only once it changes again
+            print(f"Watch: could not ingest {os.path.basename(info.path)}: {type(e).__name__}: {e}")
+            self._handled[info.path] = signature
+            return []
+        self._handled[info.path] = signature
+        ingested_at = time.time()
+        dropped_at = signature[1] / 1e9
+        claims = []
+        for global_id in global_ids:
+            record = self.knowledge_base.record(global_id)
+            claims.append(NewClaim(
+                global_id=global_id,
+                patient_name=f"{record['PatientFirstName'] or ''} {record['PatientLastName'] or ''}".strip(),
+                claim_id=record['PatientControlNumber'] or "",
+                file=info.path,
+                dropped_at=dropped_at,
+                ingested_at=ingested_at,
+            ))
+        return claims
+
+
+class RenderGenerator:
+    """
+    Renders each micro-batch straight from the ingested rows into one
+    combined PDF (no agents, no LLM calls): watch_<timestamp>_<batch>.pdf.
+    """
+
+    def __init__(self, knowledge_base: ShardedKnowledgeBase, output_dir: str, template_path: str):
+        from rag_agent.batch_pdf import load_template_and_map
+
+        self.knowledge_base = knowledge_base
+        self.output_dir = output_dir
+        self.template_bytes, self.field_map = load_template_and_map(template_path)
+
+    def __call__(self, batch: List[NewClaim], batch_number: int) -> List[Tuple[Optional[str], Optional[float]]]:
+        from rag_agent.batch_pdf import BatchPDFWriter
+        from rag_agent.models import UB04Claim
+
+        output_path = os.path.join(self.output_dir, f"watch_{datetime.now():%Y%m%d_%H%M%S}_{batch_number}.pdf")
+        rendered = []
+        with BatchPDFWriter(output_path, self.template_bytes, self.field_map) as writer:
+            for claim in batch:
+                try:
+                    writer.add_claim(UB04Claim.from_csv_row(self.knowledge_base.record(claim.global_id)).model_dump(mode="json"))
+                    rendered.append(True)
+                except (ValueError, TypeError) as e:
+                    print(f"Watch: skipping {claim.patient_name} ({claim.claim_id}): {e}")
+                    rendered.append(False)
+        finished_at = time.time()
+        return [(output_path, finished_at) if ok else (None, None) for ok in rendered]
+
+
+class WorkerGenerator:
+    """
+    Sends each micro-batch to a claim worker (the full agent crew) and
+    waits for the whole batch, so at most one batch is in flight. Jobs are
+    submitted by patient name, so the crew builds each patient's latest
+    claim, which is the new one for a regular monthly extract.
+    """
+
+    def __init__(self, worker, poll_interval: float = 0.2):
+        self.worker = worker
+        self.poll_interval = poll_interval
+
+    def __call__(self, batch: List[NewClaim], batch_number: int) -> List[Tuple[Optional[str], Optional[float]]]:
+        job_ids = [self.worker.submit(claim.patient_name).job_id for claim in batch]
+        finished: Dict[str, Tuple[Optional[str], Optional[float]]] = {}
+        while len(finished) < len(job_ids):
+            for job in self.worker.get_many([job_id for job_id in job_ids if job_id not in finished]):
+                if job.done:
+                    finished[job.job_id] = (job.pdf_path, time.time()) if job.status == "succeeded" else (None, None)
+            if len(finished) < len(job_ids):
+                time.sleep(self.poll_interval)
+        return [finished[job_id] for job_id in job_ids]
+
+
+def run_watch(watcher: KnowledgeWatcher, generate: Callable[[List[NewClaim], int], List[Tuple[Optional[str], Optional[float]]]],
+              batch_size: int = 10, poll_seconds: float = 1.0, latency_log_path: Optional[str] = None,
+              stop: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    Watch for new knowledge files and generate their claims in micro-batches.
+
+    Args:
+        watcher: Detects and ingests new files.
+        generate: Produces the PDFs of one batch: returns (pdf_path, finished_at) per claim, None for failures.
+        batch_size: Claims generated per batch; a big file is split, small files are grouped.
+        poll_seconds: Interval between file checks when nothing is queued.
+        latency_log_path: JSONL file that gets one record per claim (drop-to-PDF timings).
+        stop: Set to end the loop (otherwise it runs until interrupted).
+
+    Returns:
+        Summary: claims, failed, batches and drop-to-PDF latency percentiles.
+    """
+    stop = stop or threading.Event()
+    queue: List[NewClaim] = []
+    latencies: List[float] = []
+    failed = batches = 0
+    print(f"Watching {watcher.knowledge_base.path} (batches of {batch_size}, "
+          f"files must be unchanged for {watcher.settle_seconds:g}s)")
+    try:
+        while not stop.is_set():
+            new_claims = watcher.poll()
+            if new_claims:
+                print(f"Watch: queued {len(new_claims)} claim(s) from "
+                      f"{', '.join(sorted({os.path.basename(claim.file) for claim in new_claims}))}")
+            queue.extend(new_claims)
+            if not queue:
+                stop.wait(poll_seconds)
+                continue
+            # Drain one batch, then look for new files again so new drops are not starved
+            batch, queue = queue[:batch_size], queue[batch_size:]
+            batches += 1
+            results = generate(batch, batches)
+            batch_latencies = []
+            for claim, (pdf_path, finished_at) in zip(batch, results):
+                record = {
+                    "claim_id": claim.claim_id,
+                    "patient": claim.patient_name,
+                    "file": os.path.basename(claim.file),
+                    "batch": batches,
+                    "pdf": pdf_path,
+                    "ingest_seconds": round(claim.ingested_at - claim.dropped_at, 3),
+                    "drop_to_pdf_seconds": round(finished_at - claim.dropped_at, 3) if finished_at else None,
+                }
+                if finished_at:
+                    batch_latencies.append(finished_at - claim.dropped_at)
+                else:
+                    failed += 1
+                if latency_log_path:
+                    os.makedirs(os.path.dirname(os.path.abspath(latency_log_path)), exist_ok=True)
+                    with open(latency_log_path, "a", encoding="utf-8") as log_file:
+                        log_file.write(json.dumps(record) + "\n")
+            latencies.extend(batch_latencies)
+            summary = latency_percentiles(batch_latencies)
+            print(f"Watch: batch {batches}: {len(batch_latencies)}/{len(batch)} claim(s) generated, drop to PDF "
+                  + ("  ".join(f"{name} {value:.2f}s" for name, value in summary.items()) or "n/a")
+                  + (f", {len(queue)} still queued" if queue else ""))
+    except KeyboardInterrupt:
+        pass
+    return {"claims": len(latencies) + failed, "failed": failed, "batches": batches,
+            "drop_to_pdf_seconds": latency_percentiles(latencies)}
+
+
+def start_watch_thread(watcher: KnowledgeWatcher, generate, **kwargs) -> Tuple[threading.Thread, threading.Event]:
+    """Run run_watch on a daemon thread; set the returned event to stop it."""
+    stop = threading.Event()
+    thread = threading.Thread(target=run_watch, args=(watcher, generate), kwargs={**kwargs, "stop": stop},
+                              name="knowledge-watch", daemon=True)
+    thread.start()
+    return thread, stop
+
+
+def main():
+    """
+    Watch the knowledge folder and generate claims for new extracts as they land.
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description="Ingest new claim extracts as they land and generate their claims.")
+    parser.add_argument("--mode", choices=("render", "crew"), default="render",
+                        help="render: fill the PDFs straight from the rows; crew: run the agent crew per claim")
+    parser.add_argument("--knowledge", default=os.getenv("RAG_KNOWLEDGE_PATH",
+                                                         os.path.join(project_root, "knowledge", "ub04_claims.csv")),
+                        help="Render mode: knowledge CSV (sibling files are watched) or shard directory. "
+                             "Crew mode watches the crew's RAG_KNOWLEDGE_PATH")
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--poll-seconds", type=float, default=1.0)
+    parser.add_argument("--settle-seconds", type=float, default=2.0,
+                        help="How long a file must stay unchanged before it is ingested")
+    parser.add_argument("--output-dir", default=os.path.join(project_root, "src", "output", "watch"))
+    parser.add_argument("--template", default=os.path.join(project_root, "template", "ub-40-.pdf"))
+    args = parser.parse_args()
+
+    if args.mode == "crew":
+        # The worker's own knowledge base is the one the crew searches
+        from rag_agent.worker import ClaimWorker
+
+        worker = ClaimWorker(jobs_dir=os.path.join(args.output_dir, "jobs"))
+        worker.start()
+        from rag_agent.crew import csv_tool
+
+        knowledge_base = csv_tool.knowledge_base
+        generate = WorkerGenerator(worker)
+    else:
+        # Rendering needs no embeddings: rows only go into the claim tables and indexes
+        knowledge_base = ShardedKnowledgeBase(args.knowledge, embedding_function=None, build_vectors=False)
+        knowledge_base.load_active()
+        generate = RenderGenerator(knowledge_base, args.output_dir, args.template)
+
+    watcher = KnowledgeWatcher(knowledge_base, settle_seconds=args.settle_seconds)
+    summary = run_watch(watcher, generate, batch_size=args.batch_size, poll_seconds=args.poll_seconds,
+                        latency_log_path=os.path.join(args.output_dir, "watch_latency.jsonl"))
+    latency = summary["drop_to_pdf_seconds"]
+    print(f"\n{summary['claims']} claim(s) in {summary['batches']} batch(es), {summary['failed']} failed; drop to PDF "
+          + ("  ".join(f"{name} {value:.2f}s" for name, value in latency.items()) or "n/a"))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+import argparse
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import parse_qs, quote
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+# Where thin clients (Streamlit, CLI) look for the worker
+DEFAULT_WORKER_URL = os.getenv("CLAIM_WORKER_URL", "http://127.0.0.1:8765")
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+class ClaimJob(BaseModel):
+    """One claim-generation request handled by the worker."""
+    job_id: str = Field(..., description="Identifier returned on submission")
+    patient_name: str = Field(..., description="Patient the claim is built for")
+    save_profile: Optional[str] = Field(None, description="PDF save profile; None uses the tool default")
+    status: str = Field("queued", description="queued, running, succeeded or failed")
+    submitted_at: str = Field(..., description="ISO timestamp of submission")
+    queue_seconds: float = Field(0.0, description="Time spent waiting for the worker thread")
+    run_seconds: float = Field(0.0, description="Crew run time, excluding all setup")
+    pdf_path: Optional[str] = Field(None, description="Per-job copy of the filled UB-04")
+    result: Optional[str] = Field(None, description="Final crew output")
+    error: Optional[str] = Field(None, description="Failure reason when status is failed")
+    usage: Optional[Dict[str, Any]] = Field(None, description="ClaimUsage record of the run")
+    stage: Optional[str] = Field(None, description="What a running job is doing (validation or the crew run)")
+    completed_tasks: List[str] = Field(default_factory=list, description="Crew tasks finished so far")
+    partial_output: Optional[str] = Field(None, description="Raw output of the last finished task")
+    claim: Optional[Dict[str, Any]] = Field(None, description="Structured claim JSON once it has been gathered")
+    from_cache: bool = Field(False, description="PDF was served from the render cache without running the crew")
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+
+class ClaimWorker:
+    """
+    Long-running claim builder that pays all setup cost once.
+
+    Importing the crew module builds the CSV tool (data, name index, vector
+    store), the PDF tool and the LLM clients; `warm_up` does that at startup
+    and pre-loads the UB-04 template, so a job only pays for the crew run.
+    Jobs are queued and executed one at a time on a background thread
+    because the crew writes its PDF to a single shared output path; each
+    finished PDF is copied to `jobs_dir/<job_id>.pdf`.
+    """
+
+    def __init__(self, jobs_dir: str, max_finished_jobs: int = 1000):
+        self.jobs_dir = jobs_dir
+        self.max_finished_jobs = max_finished_jobs
+        self.warm = False
+        self.warm_up_error: Optional[str] = None
+        self._jobs: "OrderedDict[str, ClaimJob]" = OrderedDict()
+        self._submitted: Dict[str, float] = {}  # job id -> perf_counter at submission
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def warm_up(self) -> float:
+        """Load the crew module, tools and template. Returns the seconds it took."""
+        started = time.perf_counter()
+        from rag_agent import crew as crew_module
+
+        crew_module.pdf_tool.load_template()
+        # Compiling the field map checks it against the template's widgets
+        crew_module.pdf_tool.load_field_map()
+        # Parse the YAML configs once so a broken config fails at startup, not on the first job
+        crew_module.UB04ClaimBuilderCrew()
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.warm = True
+        return time.perf_counter() - started
+
+    def start(self, wait_for_warm_up: bool = True) -> None:
+        """
+        Start the job thread. With wait_for_warm_up=False the warm-up runs on
+        that thread instead, so the caller (e.g. a web page) never blocks on
+        it; jobs submitted meanwhile simply queue.
+        """
+        if wait_for_warm_up and not self.warm:
+            self.warm_up()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run_loop, name="claim-worker", daemon=True)
+            self._thread.start()
+
+    # ---------------- Jobs ---------------- #
+    def submit(self, patient_name: str, save_profile: Optional[str] = None) -> ClaimJob:
+        job = ClaimJob(
+            job_id=uuid.uuid4().hex,
+            patient_name=patient_name,
+            save_profile=save_profile,
+            submitted_at=datetime.now().isoformat(timespec="seconds"),
+        )
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._submitted[job.job_id] = time.perf_counter()
+            self._forget_old_jobs()
+        self._queue.put(job.job_id)
+        return job
+
+    def get(self, job_id: str) -> Optional[ClaimJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy(deep=True) if job else None
+
+    def get_many(self, job_ids: List[str]) -> List[ClaimJob]:
+        """The known jobs among job_ids, in the same order."""
+        with self._lock:
+            return [self._jobs[job_id].model_copy(deep=True) for job_id in job_ids if job_id in self._jobs]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {status: 0 for status in JOB_STATUSES}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        stats = {"status": "ok", "warm": self.warm, "warm_up_error": self.warm_up_error, "jobs": counts}
+        if self.warm:
+            from rag_agent.crew import hedged_llm, render_cache
+
+            stats["llm"] = hedged_llm.stats()
+            stats["render_cache"] = render_cache.stats() if render_cache is not None else None
+        return stats
+
+    def _forget_old_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+            self._submitted.pop(job_id, None)
+
+    def _run_loop(self) -> None:
+        if not self.warm:
+            try:
+                self.warm_up()
+            except Exception as e:
+                self.warm_up_error = f"{type(e).__name__}: {e}"
+                print(f"Claim worker warm-up failed: {self.warm_up_error}")
+        while True:
+            job_id = self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            if self.warm_up_error:
+                with self._lock:
+                    job.error = f"Claim worker is not available: {self.warm_up_error}"
+                    job.status = "failed"
+                continue
+            self._run_job(job)
+
+    def _task_finished(self, job: ClaimJob, task_output: Any) -> None:
+        """Publish a finished crew task as the job's progress and partial result."""
+        with self._lock:
+            job.completed_tasks.append(task_output.name or f"task_{len(job.completed_tasks) + 1}")
+            job.partial_output = str(task_output.raw)
+            if job.claim is None and task_output.pydantic is not None:
+                job.claim = task_output.pydantic.model_dump(mode="json")
+
+    def _run_job(self, job: ClaimJob) -> None:
+        from rag_agent.crew import UB04ClaimBuilderCrew, pdf_tool
+        from rag_agent.main import gate_patient
+
+        started = time.perf_counter()
+        started_wall = time.time()
+        with self._lock:
+            job.status = "running"
+            job.stage = "validating source rows"
+            job.queue_seconds = round(started - self._submitted.get(job.job_id, started), 3)
+        status, error, updates = "failed", None, {}
+        crew_instance = None
+        default_profile = pdf_tool.save_profile
+        try:
+            # Jobs run one at a time, so switching the shared tool's profile is safe
+            pdf_tool.save_profile = job.save_profile or default_profile
+            gate_patient(job.patient_name)
+            # A fresh crew keeps task outputs separate; tools and LLM clients are module-level and stay warm
+            crew_instance = UB04ClaimBuilderCrew()
+            crew_instance.task_listeners.append(lambda task_output: self._task_finished(job, task_output))
+            with self._lock:
+                job.stage = "running crew"
+            result = crew_instance.build_claim({"patient_name": job.patient_name})
+
+            pdf_path = None
+            if os.path.exists(pdf_tool.output_path) and os.path.getmtime(pdf_tool.output_path) >= started_wall:
+                pdf_path = os.path.join(self.jobs_dir, f"{job.job_id}.pdf")
+                shutil.copy2(pdf_tool.output_path, pdf_path)
+            updates = {
+                "result": str(result),
+                "pdf_path": pdf_path,
+                "usage": crew_instance.last_usage.model_dump() if crew_instance.last_usage else None,
+                "from_cache": crew_instance.served_from_cache,
+            }
+            if crew_instance.cached_claim is not None:
+                updates["claim"] = crew_instance.cached_claim.model_dump(mode="json")
+            status, error = ("succeeded", None) if pdf_path else ("failed", "PDF not generated")
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if crew_instance is not None and crew_instance.last_usage:
+                updates["usage"] = crew_instance.last_usage.model_dump()
+        finally:
+            pdf_tool.save_profile = default_profile
+            # Status is set last so pollers never see a finished job without its results
+            with self._lock:
+                for key, value in updates.items():
+                    setattr(job, key, value)
+                job.run_seconds = round(time.perf_counter() - started, 3)
+                job.error = error
+                job.stage = None
+                job.status = status
+            print(f"Job {job.job_id} for {job.patient_name}: {status} in {job.run_seconds:.2f}s")
+
+
+class _WorkerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    worker: ClaimWorker = None
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        parts = [part for part in path.split("/") if part]
+        if parts == ["health"]:
+            self._reply_json(200, self.worker.stats())
+            return
+        if parts == ["jobs"]:
+            job_ids = [job_id for job_id in parse_qs(query).get("ids", [""])[0].split(",") if job_id]
+            self._reply_json(200, {"jobs": [job.model_dump() for job in self.worker.get_many(job_ids)]})
+            return
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.worker.get(parts[1])
+            if job is None:
+                self._reply_json(404, {"error": f"Unknown job '{parts[1]}'"})
+            elif len(parts) == 2:
+                self._reply_json(200, job.model_dump())
+            elif parts[2] == "pdf" and job.pdf_path and os.path.exists(job.pdf_path):
+                with open(job.pdf_path, "rb") as pdf_file:
+                    self._reply(200, pdf_file.read(), "application/pdf")
+            else:
+                self._reply_json(404, {"error": f"No PDF for job '{parts[1]}' ({job.status})"})
+            return
+        self._reply_json(404, {"error": f"Unknown path '{self.path}'"})
+
+    def do_POST(self):
+        from rag_agent.tools.pdf_tool import SAVE_PROFILES
+
+        if self.path.rstrip("/") != "/jobs":
+            self._reply_json(404, {"error": f"Unknown path '{self.path}'"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            patient_name = str(body["patient_name"]).strip()
+            save_profile = body.get("save_profile")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self._reply_json(400, {"error": "Body must be JSON with a 'patient_name'"})
+            return
+        if not patient_name:
+            self._reply_json(400, {"error": "'patient_name' must not be empty"})
+            return
+        if save_profile is not None and save_profile not in SAVE_PROFILES:
+            self._reply_json(400, {"error": f"Unknown save_profile '{save_profile}'. Use one of {sorted(SAVE_PROFILES)}"})
+            return
+        self._reply_json(202, self.worker.submit(patient_name, save_profile).model_dump())
+
+    def _reply_json(self, status: int, body: Dict[str, Any]):
+        self._reply(status, json.dumps(body).encode("utf-8"), "application/json")
+
+    def _reply(self, status: int, payload: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Job progress is printed by the worker itself
+        pass
+
+
+def start_worker_server(worker: ClaimWorker, host: str = "127.0.0.1",
+                        port: int = 8765) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the worker's HTTP API in a daemon thread.
+
+    Args:
+        worker: Warmed-up (or about to be warmed) ClaimWorker.
+        host: Interface to bind; keep it on loopback, the API has no authentication.
+        port: Port to bind; 0 picks a free one.
+
+    Returns:
+        (server, base_url): Call server.shutdown() when done.
+    """
+    worker.start()
+    handler = type("WorkerHandler", (_WorkerHandler,), {"worker": worker})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+class WorkerClient:
+    """
+    Thin client for the claim worker. Only uses the standard library, so
+    importing it never loads the crew.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_WORKER_URL, timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> bytes:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={"Content-Type": "application/json"} if data else {},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"Claim worker returned HTTP {e.code}: {detail}") from e
+
+    def is_available(self) -> bool:
+        """True when a worker answers the health check."""
+        try:
+            return bool(json.loads(self._request("GET", "/health")).get("warm"))
+        except (OSError, RuntimeError, ValueError):
+            return False
+
+    def submit(self, patient_name: str, save_profile: Optional[str] = None) -> ClaimJob:
+        body = {"patient_name": patient_name}
+        if save_profile:
+            body["save_profile"] = save_profile
+        return ClaimJob(**json.loads(self._request("POST", "/jobs", body)))
+
+    def job(self, job_id: str) -> ClaimJob:
+        return ClaimJob(**json.loads(self._request("GET", f"/jobs/{job_id}")))
+
+    def jobs(self, job_ids: List[str]) -> List[ClaimJob]:
+        """Several jobs in one request; jobs the worker no longer knows are left out."""
+        if not job_ids:
+            return []
+        body = json.loads(self._request("GET", f"/jobs?ids={quote(','.join(job_ids))}"))
+        return [ClaimJob(**job) for job in body["jobs"]]
+
+    def pdf(self, job_id: str) -> bytes:
+        return self._request("GET", f"/jobs/{job_id}/pdf")
+
+    def wait(self, job_id: str, poll_interval: float = 0.5, timeout: Optional[float] = None,
+             on_status=None) -> ClaimJob:
+        """
+        Poll a job until it finishes.
+
+        Args:
+            job_id: Job to wait for.
+            poll_interval: Seconds between polls.
+            timeout: Give up (TimeoutError) after this many seconds; None waits forever.
+            on_status: Optional callback receiving the ClaimJob whenever its status changes.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        last_status = None
+        while True:
+            job = self.job(job_id)
+            if on_status and job.status != last_status:
+                on_status(job)
+                last_status = job.status
+            if job.done:
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Job {job_id} still {job.status} after {timeout}s")
+            time.sleep(poll_interval)
+
+    def run_claim(self, patient_name: str, save_profile: Optional[str] = None, **wait_kwargs) -> ClaimJob:
+        """Submit a claim and block until it is done."""
+        return self.wait(self.submit(patient_name, save_profile).job_id, **wait_kwargs)
+
+
+def serve():
+    """
+    Run the warm claim worker until interrupted.
+    """
+    from rag_agent.crew import project_root
+
+    parser = argparse.ArgumentParser(description="Run the warm UB-04 claim worker on localhost.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--jobs-dir", default=os.path.join(project_root, "src", "output", "jobs"))
+    parser.add_argument("--watch", action="store_true",
+                        help="Ingest new knowledge files as they land and build their claims")
+    parser.add_argument("--watch-batch-size", type=int, default=10)
+    args = parser.parse_args()
+
+    worker = ClaimWorker(jobs_dir=args.jobs_dir)
+    print(f"Warmed up in {worker.warm_up():.2f}s")
+    server, url = start_worker_server(worker, host=args.host, port=args.port)
+    print(f"Claim worker listening on {url}")
+    if args.watch:
+        from rag_agent.crew import csv_tool
+        from rag_agent.watch import KnowledgeWatcher, WorkerGenerator, start_watch_thread
+
+        # New rows go into the same knowledge base the worker's crew searches, so no restart is needed
+        start_watch_thread(KnowledgeWatcher(csv_tool.knowledge_base), WorkerGenerator(worker),
+                           batch_size=args.watch_batch_size,
+                           latency_log_path=os.path.join(args.jobs_dir, "watch_latency.jsonl"))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+def submit():
+    """
+    Send one claim to a running worker and wait for the PDF.
+    """
+    parser = argparse.ArgumentParser(description="Build a UB-04 claim through the running claim worker.")
+    parser.add_argument("patient_name")
+    parser.add_argument("--url", default=DEFAULT_WORKER_URL)
+    parser.add_argument("--save-profile", default=None, help="fast, compact or archive")
+    parser.add_argument("--timeout", type=float, default=None)
+    args = parser.parse_args()
+
+    client = WorkerClient(args.url)
+    if not client.is_available():
+        raise SystemExit(f"No claim worker at {args.url}. Start one with 'worker'.")
+    job = client.run_claim(args.patient_name, save_profile=args.save_profile, timeout=args.timeout,
+                           on_status=lambda job: print(f"{job.job_id}: {job.status}"))
+    if job.status != "succeeded":
+        raise SystemExit(f"Claim for {job.patient_name} failed: {job.error}")
+    print(f"PDF: {job.pdf_path} (queued {job.queue_seconds:.2f}s, ran {job.run_seconds:.2f}s)")
+    return job
+
+
+if __name__ == "__main__":
+    serve()
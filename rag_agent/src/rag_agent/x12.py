@@ -0,0 +1,266 @@
+import re
+from datetime import datetime
+from itertools import islice
+from typing import IO, Iterable, Iterator, List, Optional
+
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from rag_agent.models import UB04Claim
+
+# Delimiters used in every interchange we write
+SEGMENT_TERMINATOR = "~"
+ELEMENT_SEPARATOR = "*"
+COMPONENT_SEPARATOR = ":"
+REPETITION_SEPARATOR = "^"
+
+IMPLEMENTATION_GUIDE = "005010X223A2"  # 837 Institutional
+
+# HIPAA guidance caps a single 837 transaction set at 5000 claims
+MAX_CLAIMS_PER_TRANSACTION = 5000
+
+# Claim filing indicator (SBR09) by primary payer name
+CLAIM_FILING_INDICATORS = {
+    "medicare": "MA",
+    "medicaid": "MC",
+}
+DEFAULT_CLAIM_FILING_INDICATOR = "CI"
+
+_RESERVED_CHARACTERS = re.compile(r"[~*:^\r\n]")
+_ADDRESS_PATTERN = re.compile(r"^(?P<street>.+?),\s*(?P<city>[^,]+),\s*(?P<state>[A-Z]{2})\s+(?P<zip>[0-9]{5}(?:-?[0-9]{4})?)$")
+
+
+class X12Envelope(BaseModel):
+    """Sender/receiver identifiers and submitter details for the 837I envelope."""
+    sender_id: str = Field("SUBMITTER", description="ISA06/GS02 interchange sender ID")
+    receiver_id: str = Field("CLEARINGHOUSE", description="ISA08/GS03 interchange receiver ID")
+    sender_qualifier: str = Field("ZZ", description="ISA05 sender ID qualifier")
+    receiver_qualifier: str = Field("ZZ", description="ISA07 receiver ID qualifier")
+    submitter_name: str = Field("SUBMITTER", description="Loop 1000A submitter name")
+    submitter_contact: str = Field("BILLING OFFICE", description="Loop 1000A contact name")
+    submitter_phone: str = Field("5555555555", description="Loop 1000A contact phone")
+    receiver_name: str = Field("CLEARINGHOUSE", description="Loop 1000B receiver name")
+    billing_tax_id: str = Field("000000000", description="Billing provider EIN (REF*EI)")
+    usage_indicator: str = Field("T", description="ISA15: T for test, P for production")
+    first_control_number: int = Field(1, description="ISA13/GS06 of the first interchange")
+
+
+class X12WriteStats(BaseModel):
+    """Counts reported after a bulk write."""
+    interchanges: int = 0
+    claims: int = 0
+    segments: int = 0
+    last_control_number: int = 0
+
+
+def _clean(value: object) -> str:
+    """Strip delimiter characters so free text cannot break the segment structure."""
+    if value is None:
+        return ""
+    return _RESERVED_CHARACTERS.sub(" ", str(value)).strip().upper()
+
+
+def _amount(value: float) -> str:
+    """X12 decimal: no trailing zeros, no trailing decimal point."""
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return text or "0"
+
+
+def _date(value: str) -> str:
+    """Convert the CSV's M/D/YYYY dates to CCYYMMDD."""
+    month, day, year = value.strip().split("/")
+    if not (month.isdigit() and day.isdigit() and year.isdigit() and len(year) == 4):
+        raise ValueError(f"Expected a M/D/YYYY date, got '{value}'")
+    return f"{year}{int(month):02d}{int(day):02d}"
+
+
+def _split_address(address: str) -> List[str]:
+    """Split '123 Elm St, Springfield, NY 10001' into street, city, state and ZIP."""
+    match = _ADDRESS_PATTERN.match(address.strip())
+    if not match:
+        return [address, "", "", ""]
+    return [match["street"], match["city"], match["state"], match["zip"].replace("-", "")]
+
+
+class X12_837IWriter:
+    """
+    Deterministic streaming writer for 837 Institutional (005010X223A2) files.
+
+    Claims are consumed one at a time from any iterable and written straight
+    to the output stream, so memory use does not depend on the number of
+    claims. Every `batch_size` claims close the current interchange
+    (ISA/GS/ST ... SE/GE/IEA) and open the next one with the following
+    control number. Segment counts (SE01) are tracked while writing, so no
+    claim is ever held back.
+    """
+
+    def __init__(self, envelope: Optional[X12Envelope] = None, batch_size: int = MAX_CLAIMS_PER_TRANSACTION):
+        if not 1 <= batch_size <= MAX_CLAIMS_PER_TRANSACTION:
+            raise ValueError(f"batch_size must be between 1 and {MAX_CLAIMS_PER_TRANSACTION}")
+        self.envelope = envelope or X12Envelope()
+        self.batch_size = batch_size
+
+    # ---------------- Public API ---------------- #
+    def write(self, claims: Iterable[UB04Claim], output: IO[str], now: Optional[datetime] = None) -> X12WriteStats:
+        """
+        Stream claims to an open text stream, one interchange per batch.
+
+        Args:
+            claims: Any iterable of UB04Claim objects (may be a generator).
+            output: Writable text stream.
+            now: Timestamp for the envelopes; defaults to the current time.
+
+        Returns:
+            X12WriteStats: Number of interchanges, claims and segments written.
+        """
+        now = now or datetime.now()
+        stats = X12WriteStats(last_control_number=self.envelope.first_control_number - 1)
+        iterator = iter(claims)
+        while True:
+            batch = islice(iterator, self.batch_size)
+            first = next(batch, None)
+            if first is None:
+                break
+            control_number = stats.last_control_number + 1
+            segments, count = self._write_interchange(output, control_number, now, first, batch)
+            stats.interchanges += 1
+            stats.claims += count
+            stats.segments += segments
+            stats.last_control_number = control_number
+        return stats
+
+    def write_file(self, claims: Iterable[UB04Claim], path: str, now: Optional[datetime] = None) -> X12WriteStats:
+        """Stream claims to a file on disk (see write)."""
+        with open(path, "w", encoding="ascii", errors="replace", newline="") as output:
+            return self.write(claims, output, now=now)
+
+    # ---------------- Envelope ---------------- #
+    def _write_interchange(self, output: IO[str], control_number: int, now: datetime,
+                           first: UB04Claim, rest: Iterator[UB04Claim]):
+        env = self.envelope
+        isa_control = f"{control_number:09d}"
+        # One transaction set per functional group, so ST02 only has to be unique within it
+        transaction_control = "0001"
+        segment = _SegmentSink(output)
+
+        # ISA is fixed width, so pad every element to its required length
+        segment.write_raw(ELEMENT_SEPARATOR.join([
+            "ISA", "00", " " * 10, "00", " " * 10,
+            env.sender_qualifier, _clean(env.sender_id).ljust(15)[:15],
+            env.receiver_qualifier, _clean(env.receiver_id).ljust(15)[:15],
+            now.strftime("%y%m%d"), now.strftime("%H%M"), REPETITION_SEPARATOR, "00501",
+            isa_control, "0", env.usage_indicator, COMPONENT_SEPARATOR,
+        ]))
+        segment.write_raw(ELEMENT_SEPARATOR.join([
+            "GS", "HC", _clean(env.sender_id), _clean(env.receiver_id),
+            now.strftime("%Y%m%d"), now.strftime("%H%M"), str(control_number), "X", IMPLEMENTATION_GUIDE,
+        ]))
+
+        # Everything from ST to SE counts towards SE01
+        segment.reset_count()
+        segment("ST", "837", transaction_control, IMPLEMENTATION_GUIDE)
+        segment("BHT", "0019", "00", isa_control, now.strftime("%Y%m%d"), now.strftime("%H%M"), "CH")
+        segment("NM1", "41", "2", _clean(env.submitter_name), "", "", "", "", "46", _clean(env.sender_id))
+        segment("PER", "IC", _clean(env.submitter_contact), "TE", _clean(env.submitter_phone))
+        segment("NM1", "40", "2", _clean(env.receiver_name), "", "", "", "", "46", _clean(env.receiver_id))
+
+        hl_counter = 0
+        claims = 0
+        for claim in _chain(first, rest):
+            hl_counter = self._write_claim(segment, claim, hl_counter)
+            claims += 1
+
+        segment("SE", str(segment.count + 1), transaction_control)
+        segment.write_raw(ELEMENT_SEPARATOR.join(["GE", "1", str(control_number)]))
+        segment.write_raw(ELEMENT_SEPARATOR.join(["IEA", "1", isa_control]))
+        return segment.total, claims
+
+    # ---------------- Claim loops ---------------- #
+    def _write_claim(self, segment: "_SegmentSink", claim: UB04Claim, hl_counter: int) -> int:
+        env = self.envelope
+        billing_hl = hl_counter + 1
+        subscriber_hl = hl_counter + 2
+        street, city, state, zip_code = _split_address(claim.facility.address)
+
+        # 2000A/2010AA billing provider (the facility)
+        segment("HL", str(billing_hl), "", "20", "1")
+        segment("NM1", "85", "2", _clean(claim.facility.name), "", "", "", "", "XX", _clean(claim.facility.npi))
+        segment("N3", _clean(street))
+        segment("N4", _clean(city), _clean(state), _clean(zip_code))
+        segment("REF", "EI", _clean(env.billing_tax_id))
+
+        # 2000B/2010BA subscriber (the patient is the insured), 2010BB payer
+        filing_indicator = CLAIM_FILING_INDICATORS.get(claim.payer.name.strip().lower(), DEFAULT_CLAIM_FILING_INDICATOR)
+        segment("HL", str(subscriber_hl), str(billing_hl), "22", "0")
+        segment("SBR", "P", "18", "", "", "", "", "", "", filing_indicator)
+        segment("NM1", "IL", "1", _clean(claim.patient.last_name), _clean(claim.patient.first_name),
+                "", "", "", "MI", _clean(claim.patient.mrn))
+        segment("DMG", "D8", _date(claim.patient.dob), _clean(claim.patient.sex) or "U")
+        segment("NM1", "PR", "2", _clean(claim.payer.name), "", "", "", "", "PI", _clean(claim.payer.id))
+
+        # 2300 claim information; bill type 111 -> facility code 11, frequency 1
+        bill_type = claim.bill_type.strip().lstrip("0").rjust(3, "0")
+        segment("CLM", _clean(claim.visit.patient_control_number), _amount(claim.total_charge), "", "",
+                COMPONENT_SEPARATOR.join([bill_type[:2], "A", bill_type[2]]), "Y", "A", "Y", "Y")
+        admission = _date(claim.visit.admission_date)
+        discharge = _date(claim.visit.discharge_date)
+        segment("DTP", "434", "RD8", f"{admission}-{discharge}")
+        segment("DTP", "435", "D8", admission)
+        segment("CL1", "1", "1", "01")
+        segment("HI", f"ABK{COMPONENT_SEPARATOR}{_clean(claim.diagnoses.primary).replace('.', '')}")
+        if claim.diagnoses.secondary:
+            segment("HI", f"ABF{COMPONENT_SEPARATOR}{_clean(claim.diagnoses.secondary).replace('.', '')}")
+
+        # 2310A attending provider
+        segment("NM1", "71", "1", "ATTENDING", "", "", "", "", "XX", _clean(claim.physicians.attending.npi))
+
+        # 2400 service lines
+        for line_number, line in enumerate(claim.revenue_lines, start=1):
+            procedure = f"HC{COMPONENT_SEPARATOR}{_clean(line.hcpcs_code)}" if line.hcpcs_code else ""
+            segment("LX", str(line_number))
+            segment("SV2", _clean(line.revenue_code).zfill(4), procedure, _amount(line.charge), "UN", str(line.units))
+
+        return subscriber_hl
+
+
+class _SegmentSink:
+    """Writes segments to a stream and counts them for SE01."""
+
+    def __init__(self, output: IO[str]):
+        self.output = output
+        self.count = 0
+        self.total = 0
+
+    def __call__(self, segment_id: str, *elements: str) -> None:
+        # Trailing empty elements must be omitted in X12
+        values = list(elements)
+        while values and values[-1] == "":
+            values.pop()
+        self.output.write(ELEMENT_SEPARATOR.join([segment_id, *values]) + SEGMENT_TERMINATOR + "\n")
+        self.count += 1
+        self.total += 1
+
+    def write_raw(self, segment: str) -> None:
+        self.output.write(segment + SEGMENT_TERMINATOR + "\n")
+        self.total += 1
+
+    def reset_count(self) -> None:
+        self.count = 0
+
+
+def _chain(first: UB04Claim, rest: Iterator[UB04Claim]) -> Iterator[UB04Claim]:
+    yield first
+    yield from rest
+
+
+def iter_claims_from_csv(csv_path: str, chunksize: int = 10000) -> Iterator[UB04Claim]:
+    """
+    Stream UB04Claim objects from a claims CSV without loading the whole file.
+
+    Args:
+        csv_path: Path to a file with the ub04_claims.csv column schema.
+        chunksize: Number of rows pandas reads per chunk.
+    """
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        for row in chunk.to_dict(orient="records"):
+            yield UB04Claim.from_csv_row(row)